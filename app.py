@@ -7,10 +7,14 @@ from service.resources.contributions.contribution import (ContributionsGet,
                                                           ContributionPost,
                                                           ContributionGet,
                                                           ContributionPatch,
-                                                          ContributionDelete)
+                                                          ContributionDelete,
+                                                          ContributionsStatsGet,
+                                                          ContributionsLeaderboardGet,
+                                                          ContributionsExport)
 from service.resources.languages.languages import LanguageGet, LanguagesGet
 from service.resources.wikidata.lexeme import (LexemesGet, LexemesDescriptionAdd,
                                                LexemeGlossesGet,
+                                               LexemesGlossesGet,
                                                LexemeFormsAudiosLackGet,
                                                LexemeAudioAdd,
                                                LexemesMissingAudioGet,
@@ -19,6 +23,8 @@ from service.resources.wikidata.lexeme import (LexemesGet, LexemesDescriptionAdd
 
 from service.resources.commons.commons import CommonsFIleUrLPost
 from service.resources.auth.auth import AuthGet, AuthCallBackPost, AuthLogout
+from service.resources.metrics.metrics import MetricsGet
+from service.resources.batch.batch import BatchPost
 
 api.add_resource(SwaggerConfig, '/swagger-config')
 
@@ -34,6 +40,9 @@ api.add_resource(UserDelete, '/users/<int:id>')
 
 api.add_resource(ContributionsGet, '/contributions')
 api.add_resource(ContributionPost, '/contributions')
+api.add_resource(ContributionsStatsGet, '/contributions/stats')
+api.add_resource(ContributionsLeaderboardGet, '/contributions/leaderboard')
+api.add_resource(ContributionsExport, '/contributions/export')
 api.add_resource(ContributionGet, '/contribution/<int:id>')
 api.add_resource(ContributionPatch, '/contribution/<int:id>')
 api.add_resource(ContributionDelete, '/contribution/<int:id>')
@@ -44,6 +53,7 @@ api.add_resource(LanguageGet, '/languages/<string:lang_code>')
 api.add_resource(LexemesGet, '/lexemes')
 api.add_resource(LexemesDescriptionAdd, '/lexemes/description/add')
 api.add_resource(LexemeGlossesGet, '/lexemes/<string:id>/descriptions')
+api.add_resource(LexemesGlossesGet, '/lexemes/descriptions')
 api.add_resource(LexemeFormsAudiosLackGet, '/lexeme/language/forms')
 api.add_resource(LexemeAudioAdd, '/lexeme/audio/add')
 api.add_resource(LexemesMissingAudioGet, '/lexemes/missing/audio')
@@ -52,6 +62,10 @@ api.add_resource(LexemeTranslateAdd, '/lexemes/translation/add')
 
 api.add_resource(CommonsFIleUrLPost, '/file/url/<string:titles>')
 
+api.add_resource(MetricsGet, '/metrics')
+
+api.add_resource(BatchPost, '/batch')
+
 
 @app.route('/')
 def redirect_to_prefix():
@@ -0,0 +1,7 @@
+from service import app, db
+from service.resources.contributions.utils import rebuild_contribution_stats
+
+with app.app_context():
+    db.create_all()
+    groups = rebuild_contribution_stats()
+    print(f'Contribution statistics rebuilt: {groups} groups')
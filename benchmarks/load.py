@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+"""
+Load benchmark of the API against the local stand-ins of benchmarks/standin.py.
+
+Starts the stand-ins and the API on a threaded HTTP server in this process
+(with a throwaway SQLite database), then sends --requests requests per
+scenario at --concurrency and reports throughput, p50/p95/p99 latency,
+errors and the upstream calls per request of each service.
+
+    python benchmarks/load.py --latency wikidata=80 --latency wdqs=400 \\
+        --latency commons=60 --json after.json --baseline before.json
+
+Scenarios cycle through --distinct-ids lexemes, so caches see the same
+ids again after that many requests.
+"""
+import argparse
+import base64
+import json
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import requests
+from standin import (SERVICES, add_arguments, get_environment, get_latencies,
+                     start_standins)
+
+SECRET = 'benchmark-secret-of-the-load-test-only'
+
+
+def lexeme(index, args):
+    return f'L{3625 + index % args.distinct_ids}'
+
+
+def make_scenarios(args):
+    """
+    (name, method, path, request keyword arguments, needs a token) of one
+    request per scenario, given the index of the request.
+    """
+    def glosses(index):
+        lexeme_id = lexeme(index, args)
+        return 'POST', f'/lexemes/{lexeme_id}/descriptions', {'json': {
+            'id': lexeme_id, 'src_lang': 'de', 'lang_1': 'en', 'lang_2': 'fr'}}
+
+    def bulk_glosses(index):
+        ids = [lexeme(index * 20 + offset, args) for offset in range(20)]
+        return 'POST', '/lexemes/descriptions', {'json': {
+            'ids': ids, 'src_lang': 'de', 'lang_1': 'en', 'lang_2': 'fr'}}
+
+    def translations(index):
+        lexeme_id = lexeme(index, args)
+        return 'POST', f'/lexemes/{lexeme_id}/translations', {'json': {
+            'id': lexeme_id, 'src_lang': 'de', 'lang_1': 'en', 'lang_2': 'fr'}}
+
+    def search(index):
+        return 'POST', '/lexemes', {'json': {
+            'search': f'Mutter{index % args.distinct_ids}', 'src_lang': 'de',
+            'ismatch': 0, 'with_sense': 1}}
+
+    def missing_audio(index):
+        return 'POST', '/lexemes/missing/audio', {'json': {
+            'lang_wdqid': 'Q188', 'lang_code': 'de', 'page_size': 15,
+            'page': 1 + index % args.distinct_ids}}
+
+    def file_url(index):
+        title = f'File:{lexeme(index, args)}-de-Mutter.ogg'
+        return 'POST', f'/file/url/{title}', {'json': {'titles': title}}
+
+    def gloss_add(index):
+        lexeme_id = lexeme(index, args)
+        return 'POST', '/lexemes/description/add', {'json': [{
+            'language': 'ig', 'sense_id': f'{lexeme_id}-S1', 'value': 'nne',
+            'lexeme_id': lexeme_id}]}
+
+    def audio_add(index):
+        lexeme_id = lexeme(index, args)
+        return 'POST', '/lexeme/audio/add', {'json': [{
+            'lang_wdqid': 'Q188', 'lang_label': 'German', 'formid': f'{lexeme_id}-F1',
+            'filename': f'{lexeme_id}-de-Mutter.ogg',
+            'file_content': base64.b64encode(b'OggS' + bytes(4096)).decode()}]}
+
+    def translation_add(index):
+        lexeme_id = lexeme(index, args)
+        return 'POST', '/lexemes/translation/add', {'json': [{
+            'base_lexeme': f'{lexeme_id}-S1', 'translation_language': 'en',
+            'translation_sense_id': 'L1-S1', 'is_new': False, 'value': 'mother',
+            'categoryId': 'Q1084'}]}
+
+    def get(path):
+        return lambda index: ('GET', path, {})
+
+    return [
+        ('search', search, False),
+        ('glosses', glosses, False),
+        ('bulk_glosses', bulk_glosses, False),
+        ('translations', translations, False),
+        ('missing_audio', missing_audio, False),
+        ('file_url', file_url, False),
+        ('languages', get('/languages'), False),
+        ('language', lambda index: ('POST', '/languages/de', {'json': {'lang_code': 'de'}}),
+         False),
+        ('swagger_config', get('/swagger-config'), False),
+        ('contributions', get('/contributions'), False),
+        ('contribution_stats', get('/contributions/stats'), False),
+        ('leaderboard', get('/contributions/leaderboard'), False),
+        ('users', get('/users/'), True),
+        ('gloss_add', gloss_add, True),
+        ('audio_add', audio_add, True),
+        ('translation_add', translation_add, True),
+    ]
+
+
+def start_api(environment, database_path):
+    """
+    Imports the API with `environment` and serves it on a free port.
+    Returns its base URL and a bearer token of a benchmark user.
+    """
+    os.environ.update(environment)
+    os.environ['DATABASE_URI'] = f'sqlite:///{database_path}'
+    os.environ['CACHE_PATH'] = os.path.join(os.path.dirname(database_path), 'cache.sqlite')
+    # The load comes from one address
+    os.environ['RATE_LIMITS'] = ''
+    os.environ['CONSUMER_KEY'] = 'benchmark-consumer'
+    os.environ['COMSUMER_SECRET'] = SECRET
+
+    import jwt
+    from werkzeug.serving import make_server
+    from app import app
+    from common import prefix
+    from service import db
+    from service.models import UserModel
+
+    with app.app_context():
+        db.create_all()
+        db.session.add(UserModel(username='benchmark', pref_langs='de,en',
+                                 temp_token='benchmark-token'))
+        db.session.commit()
+
+    token = jwt.encode({'token': 'benchmark-token',
+                        'access_token': {'key': 'key', 'secret': 'secret'},
+                        'exp': int(time.time()) + 24 * 3600}, SECRET, 'HS256')
+
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f'http://127.0.0.1:{server.server_port}{prefix or ""}', token
+
+
+def percentile(values, share):
+    index = min(len(values) - 1, max(0, round(share * len(values)) - 1))
+    return values[index]
+
+
+def run_scenario(base, token, make_request, needs_token, count, concurrency, offset=0):
+    sessions = threading.local()
+    headers = {'Authorization': f'Bearer {token}'} if needs_token else {}
+
+    def send(index):
+        if not hasattr(sessions, 'session'):
+            sessions.session = requests.Session()
+        method, path, kwargs = make_request(index)
+        start = time.perf_counter()
+        response = sessions.session.request(method, base + path, headers=headers, **kwargs)
+        return time.perf_counter() - start, response.status_code
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        results = list(pool.map(send, range(offset, offset + count)))
+    return time.perf_counter() - start, results
+
+
+def measure(args, base, token, standins, scenario):
+    name, make_request, needs_token = scenario
+    run_scenario(base, token, make_request, needs_token, args.warmup, args.concurrency,
+                 offset=args.requests)
+    for standin in standins.values():
+        standin.reset()
+
+    elapsed, results = run_scenario(base, token, make_request, needs_token,
+                                    args.requests, args.concurrency)
+    latencies = sorted(duration * 1000 for duration, _ in results)
+    calls = {service: sum(standin.reset().values()) / args.requests
+             for service, standin in standins.items()}
+    return {
+        'scenario': name,
+        'requests': args.requests,
+        'throughput': args.requests / elapsed,
+        'p50_ms': percentile(latencies, 0.50),
+        'p95_ms': percentile(latencies, 0.95),
+        'p99_ms': percentile(latencies, 0.99),
+        'errors': sum(1 for _, status in results if status >= 400),
+        'upstream_calls': calls,
+    }
+
+
+def print_results(results, baseline):
+    print(f'{"scenario":<20}{"req/s":>9}{"p50 ms":>9}{"p95 ms":>9}{"p99 ms":>9}{"errors":>8}'
+          + ''.join(f'{service:>10}' for service in SERVICES)
+          + ('   p50 vs baseline' if baseline else ''))
+    for result in results:
+        line = (f'{result["scenario"]:<20}{result["throughput"]:>9.1f}{result["p50_ms"]:>9.1f}'
+                f'{result["p95_ms"]:>9.1f}{result["p99_ms"]:>9.1f}{result["errors"]:>8}'
+                + ''.join(f'{result["upstream_calls"][service]:>10.2f}' for service in SERVICES))
+        before = baseline.get(result['scenario'])
+        if before:
+            line += f'   {before["p50_ms"] / result["p50_ms"]:.2f}x'
+        print(line)
+    print('Upstream columns are calls per request.')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    add_arguments(parser)
+    parser.add_argument('--requests', type=int, default=200, help='Requests per scenario')
+    parser.add_argument('--concurrency', type=int, default=16, help='Requests in flight')
+    parser.add_argument('--warmup', type=int, default=16, help='Unmeasured requests per scenario')
+    parser.add_argument('--distinct-ids', type=int, default=50,
+                        help='Number of different lexemes, pages and searches')
+    parser.add_argument('--scenario', action='append',
+                        help='Only run these scenarios (default: all)')
+    parser.add_argument('--json', help='Write the results to this file')
+    parser.add_argument('--baseline', help='Compare with the results of an earlier --json run')
+    args = parser.parse_args()
+
+    scenarios = [scenario for scenario in make_scenarios(args)
+                 if not args.scenario or scenario[0] in args.scenario]
+    standins = start_standins(get_latencies(args), args.jitter, args.fixtures)
+
+    with tempfile.TemporaryDirectory() as directory:
+        base, token = start_api(get_environment(standins), os.path.join(directory, 'app.sqlite'))
+        results = [measure(args, base, token, standins, scenario) for scenario in scenarios]
+
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            baseline = {result['scenario']: result for result in json.load(baseline_file)}
+    print_results(results, baseline)
+
+    if args.json:
+        with open(args.json, 'w') as output:
+            json.dump(results, output, indent=2)
+
+
+if __name__ == '__main__':
+    main()
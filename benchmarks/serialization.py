@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Serialization microbenchmark.
+
+Compares flask_restful.marshal followed by json.dumps (the previous
+response path) with the compiled plans and encoder of service.serializer
+on payloads shaped like the API's largest responses.
+
+    python benchmarks/serialization.py --number 200
+"""
+import argparse
+import json
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import flask_restful
+from service.serializer import marshal, dumps, orjson
+from service.models import ContributionModel
+from service.resources.contributions.contribution import contributionFields
+from service.resources.wikidata.lexeme import lexeme_response_fields, lexeMissingAudioFields
+
+
+def make_payloads():
+    contributions = [ContributionModel(id=index, wd_item=f'L{index}', username='Eugene233',
+                                       lang_code='de', edit_type='audio',
+                                       data=f'L{index}-F1-L{index}-de-Mutter.ogg',
+                                       form_id=f'L{index}-F1', revision_id=2245853421,
+                                       file_name=f'L{index}-de-Mutter.ogg')
+                     for index in range(2000)]
+    glosses = {
+        'lexeme': {'id': 'L3625', 'lexicalCategoryId': 'Q1084',
+                   'lexicalCategoryLabel': 'Substantiv', 'image': None},
+        'glosses': [{'senseId': f'L3625-S{index}',
+                     'gloss': {'language': 'de', 'value': 'Mutter',
+                               'audio': 'https://upload.wikimedia.org/a.ogg',
+                               'formId': 'L3625-F1'}}
+                    for index in range(3)]
+    }
+    missing_audio = [{'lexeme_id': f'L{index}', 'sense_id': f'L{index}-S1',
+                      'lemma': 'Mutter', 'categoryId': 'Q1084',
+                      'categoryLabel': 'Substantiv', 'formId': f'L{index}-F1'}
+                     for index in range(15)]
+    return [
+        ('contributions x2000', contributions, contributionFields),
+        ('lexeme glosses', glosses, lexeme_response_fields),
+        ('missing audio page', missing_audio, lexeMissingAudioFields),
+    ]
+
+
+def flask_restful_path(data, fields):
+    return json.dumps(flask_restful.marshal(data, fields)).encode('utf-8')
+
+
+def serializer_path(data, fields):
+    return dumps(marshal(data, fields))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--number', type=int, default=200, help='Calls per measurement')
+    parser.add_argument('--repeat', type=int, default=5, help='Measurements per payload')
+    args = parser.parse_args()
+
+    print(f'JSON backend: {"orjson" if orjson is not None else "json"}')
+    print(f'{"payload":<22}{"marshal_with":>16}{"serializer":>16}{"speedup":>10}')
+    for name, data, fields in make_payloads():
+        timings = []
+        for path in [flask_restful_path, serializer_path]:
+            best = min(timeit.repeat(lambda: path(data, fields),
+                                     number=args.number, repeat=args.repeat))
+            timings.append(best / args.number * 1e6)
+        print(f'{name:<22}{timings[0]:>13.1f} us{timings[1]:>13.1f} us'
+              f'{timings[0] / timings[1]:>9.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,378 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the Wikidata API, the Commons API and the Wikidata Query
+Service.
+
+Each service listens on its own port and answers the calls the API makes
+(wbgetentities, wbsearchentities, query imageinfo/tokens, upload,
+wbcreateclaim, wbsetqualifier, wbeditentity and the two SPARQL queries)
+after an injected delay. Lexemes are generated from their id, or read from
+<fixtures>/<id>.json when a captured wbgetentities entity is there. Every
+call is counted by service and action.
+
+    python benchmarks/standin.py --latency wikidata=80 --latency wdqs=400
+
+prints the environment variables that point the API at the stand-ins.
+"""
+import argparse
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+SERVICES = ['wikidata', 'commons', 'wdqs']
+# Kept apart from service.utils.languages: importing `service` builds the app
+LANGUAGE_QIDS = {'de': 'Q188', 'en': 'Q1860', 'fr': 'Q150', 'ig': 'Q33578',
+                 'yo': 'Q34329', 'ha': 'Q56475', 'sw': 'Q33511'}
+LEXEME_LANGUAGES = list(LANGUAGE_QIDS)
+NOUN = 'Q1084'
+
+
+def lemma(lexeme_id, lang):
+    return f'{lang}-word-{lexeme_id[1:]}'
+
+
+def make_lexeme(lexeme_id):
+    """
+    A lexeme shaped like a wbgetentities entity, with a lemma, a form with
+    audio and a sense gloss in every LEXEME_LANGUAGES language, an image
+    and two P5972 translations, and a gender and a pronunciation the API
+    does not read. L3625 is German, its translations L103625
+    and L203625 are English and French, and so on.
+    """
+    number = int(lexeme_id[1:])
+    audio_claims = [{
+        'mainsnak': {'snaktype': 'value', 'property': 'P443',
+                     'datavalue': {'value': f'{lexeme_id}-{lang}-{lemma(lexeme_id, lang)}.ogg',
+                                   'type': 'string'}},
+        'qualifiers': {'P407': [{'datavalue': {'value': {'entity-type': 'item',
+                                                         'id': LANGUAGE_QIDS[lang]},
+                                               'type': 'wikibase-entityid'}}]},
+        'type': 'statement', 'rank': 'normal',
+    } for lang in LEXEME_LANGUAGES[:2]]
+    translation_claims = [{
+        'mainsnak': {'snaktype': 'value', 'property': 'P5972',
+                     'datavalue': {'value': {'entity-type': 'sense',
+                                             'id': f'L{number + offset}-S1'},
+                                   'type': 'wikibase-entityid'}},
+        'type': 'statement', 'rank': 'normal',
+    } for offset in [100000, 200000]]
+
+    return {
+        'type': 'lexeme',
+        'id': lexeme_id,
+        'lastrevid': 2000000000 + number,
+        'lemmas': {lang: {'language': lang, 'value': lemma(lexeme_id, lang)}
+                   for lang in LEXEME_LANGUAGES},
+        'lexicalCategory': NOUN,
+        'language': LANGUAGE_QIDS[LEXEME_LANGUAGES[number // 100000 % len(LEXEME_LANGUAGES)]],
+        'claims': {'P5185': [{'mainsnak': {'snaktype': 'value', 'property': 'P5185',
+                                           'datavalue': {'value': {'id': 'Q1775415'},
+                                                         'type': 'wikibase-entityid'}}}]},
+        'forms': [{
+            'id': f'{lexeme_id}-F1',
+            'representations': {lang: {'language': lang, 'value': lemma(lexeme_id, lang)}
+                                for lang in LEXEME_LANGUAGES},
+            'grammaticalFeatures': [],
+            'claims': {
+                'P443': audio_claims,
+                'P898': [{'mainsnak': {'snaktype': 'value', 'property': 'P898',
+                                       'datavalue': {'value': lemma(lexeme_id, 'en'),
+                                                     'type': 'string'}}}],
+            },
+        }],
+        'senses': [{
+            'id': f'{lexeme_id}-S1',
+            'glosses': {lang: {'language': lang, 'value': f'gloss of {lemma(lexeme_id, lang)}'}
+                        for lang in LEXEME_LANGUAGES},
+            'claims': {
+                'P18': [{'mainsnak': {'snaktype': 'value', 'property': 'P18',
+                                      'datavalue': {'value': f'{lexeme_id}.jpg',
+                                                    'type': 'string'}}}],
+                'P5972': translation_claims,
+            },
+        }],
+    }
+
+
+def filter_languages(entity, languages):
+    """
+    The entity with the lemmas, representations and glosses of `languages`
+    only, as wbgetentities returns it with `languages`.
+    """
+    def terms(values):
+        return {lang: value for lang, value in values.items() if lang in languages}
+
+    if 'lemmas' not in entity:
+        return entity
+    return dict(entity, lemmas=terms(entity['lemmas']),
+                forms=[dict(form, representations=terms(form['representations']))
+                       for form in entity.get('forms', [])],
+                senses=[dict(sense, glosses=terms(sense['glosses']))
+                        for sense in entity.get('senses', [])])
+
+
+class StandIn:
+    """
+    One stand-in service (wikidata, commons or wdqs) on 127.0.0.1.
+    `latency` is the delay of every response in seconds, `jitter` the share
+    of it that is randomised. While `unavailable` is set it answers 503.
+    """
+
+    def __init__(self, service, latency=0.0, jitter=0.0, fixtures_dir=None, port=0):
+        self.service = service
+        self.latency = latency
+        self.jitter = jitter
+        self.fixtures_dir = fixtures_dir
+        self.unavailable = False
+        self.calls = Counter()
+        self.lock = threading.Lock()
+        self.revision = 2100000000
+        self.server = ThreadingHTTPServer(('127.0.0.1', port), self.make_handler())
+        self.server.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address
+        if self.service == 'wdqs':
+            return f'http://{host}:{port}/sparql'
+        return f'http://{host}:{port}/w/api.php'
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def count(self, action):
+        with self.lock:
+            self.calls[action] += 1
+
+    def reset(self):
+        with self.lock:
+            calls = dict(self.calls)
+            self.calls.clear()
+        return calls
+
+    def next_revision(self):
+        with self.lock:
+            self.revision += 1
+            return self.revision
+
+    def delay(self):
+        if self.latency:
+            time.sleep(self.latency * (1 + random.uniform(-self.jitter, self.jitter)))
+
+    def get_entity(self, entity_id):
+        if self.fixtures_dir:
+            path = os.path.join(self.fixtures_dir, f'{entity_id}.json')
+            if os.path.exists(path):
+                with open(path) as fixture:
+                    return json.load(fixture)
+        if re.fullmatch(r'L\d+', entity_id):
+            return make_lexeme(entity_id)
+        return {'id': entity_id, 'missing': ''}
+
+    # MediaWiki actions #
+
+    def wbgetentities(self, params):
+        ids = params.get('ids', '').split('|')
+        entities = {entity_id: self.get_entity(entity_id) for entity_id in ids}
+        if params.get('languages'):
+            languages = set(params['languages'].split('|'))
+            entities = {entity_id: filter_languages(entity, languages)
+                        for entity_id, entity in entities.items()}
+        return {'entities': entities, 'success': 1}
+
+    def wbsearchentities(self, params):
+        search, lang = params.get('search', ''), params.get('language', 'en')
+        results = [{
+            'id': f'L{number}',
+            'label': search,
+            'description': f'{lang}, noun',
+            'match': {'type': 'label', 'language': lang, 'text': search},
+            'display': {'label': {'value': search, 'language': lang}},
+        } for number in range(3625, 3625 + min(int(params.get('limit', 7)), 7))]
+        return {'searchinfo': {'search': search}, 'search': results, 'success': 1}
+
+    def query(self, params):
+        if params.get('meta') == 'tokens':
+            return {'batchcomplete': '', 'query': {'tokens': {'csrftoken': 'standin+\\'}}}
+
+        pages, normalized = {}, []
+        for index, title in enumerate(params.get('titles', '').split('|')):
+            name = title.split(':', 1)[-1].replace(' ', '_')
+            if '_' in title:
+                normalized.append({'from': title, 'to': title.replace('_', ' ')})
+            pages[str(-1 - index)] = {
+                'ns': 6, 'title': title.replace('_', ' '), 'imagerepository': 'local',
+                'imageinfo': [{'url': f'https://upload.wikimedia.org/wikipedia/commons/a/ab/{name}'}],
+            }
+        query = {'pages': pages}
+        if normalized:
+            query['normalized'] = normalized
+        return {'batchcomplete': '', 'query': query}
+
+    def upload(self, params):
+        return {'upload': {'result': 'Success', 'filename': params.get('filename')}}
+
+    def wbcreateclaim(self, params):
+        return {'pageinfo': {'lastrevid': self.next_revision()}, 'success': 1,
+                'claim': {'id': f"{params.get('entity')}$standin-{self.next_revision()}"}}
+
+    def wbsetqualifier(self, params):
+        return {'pageinfo': {'lastrevid': self.next_revision()}, 'success': 1}
+
+    def wbeditentity(self, params):
+        entity_id = params.get('id') or f'L{self.next_revision()}'
+        return {'entity': {'id': entity_id, 'lastrevid': self.next_revision()}, 'success': 1}
+
+    # SPARQL #
+
+    def sparql(self, query):
+        if 'VALUES ?item' in query:
+            items = re.findall(r'wd:(Q\d+)', query)
+            return 'label', {'head': {'vars': ['item', 'itemLabel']}, 'results': {'bindings': [{
+                'item': {'type': 'uri', 'value': f'http://www.wikidata.org/entity/{item}'},
+                'itemLabel': {'type': 'literal', 'value': f'label of {item}'},
+            } for item in items]}}
+
+        limit = int(re.search(r'LIMIT (\d+)', query).group(1))
+        offset = int(re.search(r'OFFSET (\d+)', query).group(1))
+        entity = 'http://www.wikidata.org/entity/'
+        bindings = [{
+            'l': {'type': 'uri', 'value': f'{entity}L{number}'},
+            'sense': {'type': 'uri', 'value': f'{entity}L{number}-S1'},
+            'form': {'type': 'uri', 'value': f'{entity}L{number}-F1'},
+            'formRepresentation': {'type': 'literal', 'value': f'word-{number}'},
+            'category': {'type': 'uri', 'value': f'{entity}{NOUN}'},
+            'categoryLabel': {'type': 'literal', 'value': 'noun'},
+        } for number in range(offset + 1, offset + limit + 1)]
+        return 'missing_audio', {'head': {'vars': list(bindings[0]) if bindings else []},
+                                 'results': {'bindings': bindings}}
+
+    def make_handler(self):
+        standin = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, format, *args):
+                pass
+
+            def read_params(self):
+                params = {key: values[0] for key, values in
+                          parse_qs(urlparse(self.path).query).items()}
+                length = int(self.headers.get('Content-Length') or 0)
+                body = self.rfile.read(length) if length else b''
+                content_type = self.headers.get('Content-Type', '')
+                if content_type.startswith('multipart/form-data'):
+                    # Only the text fields are needed, the file is skipped
+                    for name, value in re.findall(rb'name="([^"]+)"\r\n\r\n(.*?)\r\n--', body, re.S):
+                        if name != b'file':
+                            params[name.decode()] = value.decode('utf-8', 'replace')
+                elif body:
+                    params.update({key: values[0] for key, values in
+                                   parse_qs(body.decode('utf-8')).items()})
+                return params
+
+            def send_json(self, data, content_type='application/json', status=200):
+                body = json.dumps(data).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def handle_call(self):
+                params = self.read_params()
+                standin.delay()
+
+                if standin.unavailable:
+                    standin.count('unavailable')
+                    return self.send_json({'error': 'Service Unavailable'}, status=503)
+
+                if standin.service == 'wdqs':
+                    action, result = standin.sparql(params.get('query', ''))
+                    standin.count(action)
+                    return self.send_json(result, 'application/sparql-results+json')
+
+                action = params.get('action', '')
+                handler = getattr(standin, action, None)
+                standin.count(action)
+                if handler is None:
+                    return self.send_json({'error': {'code': 'badvalue',
+                                                     'info': f'Unrecognized action {action}'}})
+                return self.send_json(handler(params))
+
+            do_GET = handle_call
+            do_POST = handle_call
+
+        return Handler
+
+
+def parse_latency(value):
+    service, _, milliseconds = value.partition('=')
+    if service not in SERVICES or not milliseconds:
+        raise argparse.ArgumentTypeError(f'Expected SERVICE=MS with SERVICE one of {SERVICES}')
+    return service, float(milliseconds) / 1000
+
+
+def get_latencies(args):
+    return dict(dict.fromkeys(SERVICES, 0.0), **dict(args.latency or []))
+
+
+def start_standins(latencies, jitter=0.0, fixtures_dir=None):
+    return {service: StandIn(service, latencies.get(service, 0.0), jitter, fixtures_dir).start()
+            for service in SERVICES}
+
+
+def get_environment(standins):
+    """
+    The settings of common.py that send the API's upstream calls to `standins`.
+    """
+    return {
+        'BASE_URL': standins['wikidata'].url,
+        'WM_COMMONS_URL': standins['commons'].url,
+        'SPARQL_ENDPOINT_URL': standins['wdqs'].url,
+    }
+
+
+def add_arguments(parser):
+    parser.add_argument('--latency', action='append', type=parse_latency, metavar='SERVICE=MS',
+                        help=f'Delay of every response of one of {", ".join(SERVICES)}')
+    parser.add_argument('--jitter', type=float, default=0.1,
+                        help='Randomised share of the latency (default 0.1)')
+    parser.add_argument('--fixtures', help='Directory of captured <entity id>.json entities')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    standins = start_standins(get_latencies(args), args.jitter, args.fixtures)
+    for name, value in get_environment(standins).items():
+        print(f'export {name}={value}')
+    try:
+        while True:
+            time.sleep(60)
+            for service, standin in standins.items():
+                print(service, dict(standin.calls), file=sys.stderr)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
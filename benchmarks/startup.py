@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Worker startup benchmark.
+
+Imports app.py in fresh interpreters with `python -X importtime`, then
+reports the import time of the app, the slowest modules and any heavy
+upstream library that got imported before the first request.
+
+    python benchmarks/startup.py --runs 5 --max-ms 800
+
+Exits with status 1 when the median import time is above --max-ms or a
+lazy library is imported at startup, so it can run in CI.
+"""
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Libraries that must only be imported by the request that needs them
+LAZY_MODULES = ['SPARQLWrapper', 'wikidata', 'jsonschema', 'mwoauth', 'requests_oauthlib']
+
+IMPORT_LINE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)$')
+
+
+def import_app():
+    """
+    Imports app.py in a new interpreter and returns the parsed importtime
+    lines as (self_us, cumulative_us, depth, module) and the wall time.
+    """
+    started = time.perf_counter()
+    process = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import app'],
+                             cwd=ROOT, capture_output=True, text=True)
+    wall_ms = (time.perf_counter() - started) * 1000
+    if process.returncode != 0:
+        sys.exit(process.stderr)
+
+    modules = []
+    for line in process.stderr.splitlines():
+        match = IMPORT_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, module = match.groups()
+            modules.append((int(self_us), int(cumulative_us), len(indent), module))
+    return modules, wall_ms
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5, help='Number of fresh interpreters')
+    parser.add_argument('--top', type=int, default=15, help='Number of slowest modules shown')
+    parser.add_argument('--max-ms', type=float, help='Fail above this median import time')
+    args = parser.parse_args()
+
+    import_times, wall_times = [], []
+    for _ in range(args.runs):
+        modules, wall_ms = import_app()
+        app_us = next(cumulative for _, cumulative, _, module in modules if module == 'app')
+        import_times.append(app_us / 1000)
+        wall_times.append(wall_ms)
+
+    median_ms = statistics.median(import_times)
+    print(f'import app:       median {median_ms:.1f} ms, '
+          f'min {min(import_times):.1f} ms, max {max(import_times):.1f} ms')
+    print(f'interpreter wall: median {statistics.median(wall_times):.1f} ms')
+
+    print(f'\nSlowest top level imports of the last run (cumulative ms):')
+    top_level = [entry for entry in modules if entry[2] <= 3 and entry[3] != 'app']
+    for _, cumulative, _, module in sorted(top_level, reverse=True, key=lambda e: e[1])[:args.top]:
+        print(f'  {cumulative / 1000:8.1f}  {module}')
+
+    imported = {module.split('.')[0] for _, _, _, module in modules}
+    eager = [module for module in LAZY_MODULES if module in imported]
+    if eager:
+        print(f'\nImported at startup but should be lazy: {", ".join(eager)}')
+
+    if eager or (args.max_ms and median_ms > args.max_ms):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
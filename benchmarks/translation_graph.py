@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Translation graph benchmark.
+
+Builds a random graph of --edges P5972 translations between senses of
+lexemes in --languages languages, saves and loads it, then reports the
+p50/p99 latency of the translations of a sense in three languages, with and
+without one-hop suggestions, before and after overlay writes.
+
+    python benchmarks/translation_graph.py --edges 3000000 --queries 20000
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from array import array
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from service.translation_graph import TranslationGraph, SENSE_BITS, decode_sense_id
+
+
+def make_graph(args):
+    """
+    A graph of args.edges translations: every sense has 1 to 5 of them.
+    """
+    rng = random.Random(args.seed)
+    senses = args.edges // 3
+    graph = TranslationGraph()
+    language_indexes = [graph.get_language_index(f'Q{index}')
+                        for index in range(args.languages)]
+    keys = [(number + 1) << SENSE_BITS | 1 for number in range(senses)]
+
+    edges, languages, remaining = {}, {}, args.edges
+    for key in keys:
+        languages[key] = rng.choice(language_indexes)
+        count = min(remaining, rng.randint(1, 5))
+        if count:
+            edges[key] = array('q', (rng.choice(keys) for _ in range(count)))
+            remaining -= count
+    graph.build(edges, languages)
+    return graph, keys
+
+
+def percentiles(timings):
+    timings.sort()
+    return timings[len(timings) // 2] * 1e6, timings[int(len(timings) * 0.99)] * 1e6
+
+
+def measure(graph, sense_ids, languages, suggestions):
+    timings = []
+    for sense_id in sense_ids:
+        start = time.perf_counter()
+        graph.get_translations(sense_id, languages, suggestions=suggestions)
+        timings.append(time.perf_counter() - start)
+    return percentiles(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--edges', type=int, default=3000000, help='Translations in the graph')
+    parser.add_argument('--languages', type=int, default=50, help='Languages of the lexemes')
+    parser.add_argument('--queries', type=int, default=20000, help='Queries per measurement')
+    parser.add_argument('--writes', type=int, default=10000, help='Overlay writes')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    graph, keys = make_graph(args)
+    print(f'built {graph.sense_count} senses, {graph.edge_count} translations '
+          f'in {time.perf_counter() - start:.1f} s')
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'graph.bin')
+        start = time.perf_counter()
+        graph.save(path)
+        saved = time.perf_counter() - start
+        start = time.perf_counter()
+        graph = TranslationGraph.load(path)
+        print(f'saved in {saved:.2f} s, loaded in {time.perf_counter() - start:.2f} s, '
+              f'{os.path.getsize(path) / 1e6:.0f} MB')
+
+    rng = random.Random(args.seed)
+    sense_ids = [decode_sense_id(rng.choice(keys)) for _ in range(args.queries)]
+    languages = ['Q0', 'Q1', 'Q2']
+
+    print(f'{"query":<34}{"p50 us":>9}{"p99 us":>9}')
+    for name in ['rows', 'rows + overlay']:
+        for suggestions in [False, True]:
+            p50, p99 = measure(graph, sense_ids, languages, suggestions)
+            label = f'{name}{", suggestions" if suggestions else ""}'
+            print(f'{label:<34}{p50:>9.1f}{p99:>9.1f}')
+        for _ in range(args.writes):
+            graph.add_translation(decode_sense_id(rng.choice(keys)),
+                                  decode_sense_id(rng.choice(keys)))
+
+
+if __name__ == '__main__':
+    main()
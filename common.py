@@ -1,4 +1,5 @@
 import dotenv
+import functools
 import os
 import json
 
@@ -23,11 +24,53 @@ class ENVIRONMENT:
         self.commons_image_base_url = os.getenv("WM_COMMONS_IMAGE_BASE_URL")
         self.wm_commons_audio_base_url = os.getenv("WM_COMMONS_AUDIO_BASE_URL")
         self.sparql_endpoint_url = os.getenv("SPARQL_ENDPOINT_URL")
+        self.database_uri = os.getenv("DATABASE_URI")
+        self.db_pool_size = os.getenv("DB_POOL_SIZE", "5")
+        self.db_max_overflow = os.getenv("DB_MAX_OVERFLOW", "10")
+        self.db_pool_timeout = os.getenv("DB_POOL_TIMEOUT", "30")
+        self.db_pool_recycle = os.getenv("DB_POOL_RECYCLE", "1800")
+        self.sqlite_busy_timeout = os.getenv("SQLITE_BUSY_TIMEOUT", "5000")
+        self.sqlite_mmap_size = os.getenv("SQLITE_MMAP_SIZE", "268435456")
+        self.token_cache_ttl = os.getenv("TOKEN_CACHE_TTL", "300")
+        self.token_cache_size = os.getenv("TOKEN_CACHE_SIZE", "10000")
+        self.compression_min_size = os.getenv("COMPRESSION_MIN_SIZE", "1024")
+        self.compression_level = os.getenv("COMPRESSION_LEVEL", "6")
+        self.slow_request_threshold_ms = os.getenv("SLOW_REQUEST_THRESHOLD_MS", "1000")
+        self.cache_path = os.getenv("CACHE_PATH", "")
+        self.cache_local_size = os.getenv("CACHE_LOCAL_SIZE", "10000")
+        self.cache_sync_interval = os.getenv("CACHE_SYNC_INTERVAL", "1")
+        self.cache_entity_ttl = os.getenv("CACHE_ENTITY_TTL", "300")
+        self.cache_label_ttl = os.getenv("CACHE_LABEL_TTL", "86400")
+        self.cache_search_ttl = os.getenv("CACHE_SEARCH_TTL", "600")
+        self.cache_commons_url_ttl = os.getenv("CACHE_COMMONS_URL_TTL", "86400")
+        self.upstream_timeout = os.getenv("UPSTREAM_TIMEOUT", "10")
+        self.sparql_timeout = os.getenv("SPARQL_TIMEOUT", "30")
+        self.circuit_failure_threshold = os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5")
+        self.circuit_reset_timeout = os.getenv("CIRCUIT_RESET_TIMEOUT", "30")
+        self.cache_stale_ttl = os.getenv("CACHE_STALE_TTL", "86400")
+        self.cache_missing_audio_ttl = os.getenv("CACHE_MISSING_AUDIO_TTL", "300")
+        self.background_workers = os.getenv("BACKGROUND_WORKERS", "4")
+        self.background_max_pending = os.getenv("BACKGROUND_MAX_PENDING", "100")
+        self.rate_limits = os.getenv("RATE_LIMITS", "search=60/60,read=120/60,missing_audio=30/60,edit=30/60")
+        self.rate_limit_shared = os.getenv("RATE_LIMIT_SHARED", "")
+        self.rate_limit_max_keys = os.getenv("RATE_LIMIT_MAX_KEYS", "100000")
+        self.proxy_count = os.getenv("PROXY_COUNT", "0")
+        self.bulk_glosses_max_ids = os.getenv("BULK_GLOSSES_MAX_IDS", "100")
+        self.translation_graph_path = os.getenv("TRANSLATION_GRAPH_PATH", "")
+        self.cache_max_size_mb = os.getenv("CACHE_MAX_SIZE_MB", "512")
+        self.prefetch_max_per_user = os.getenv("PREFETCH_MAX_PER_USER", "2")
+        self.prefetch_max_pending = os.getenv("PREFETCH_MAX_PENDING", "20")
+        self.warmup_pages = os.getenv("WARMUP_PAGES", "1")
+        self.form_lease_ttl = os.getenv("FORM_LEASE_TTL", "900")
+        self.form_lease_scan_pages = os.getenv("FORM_LEASE_SCAN_PAGES", "3")
+        self.credentials_key = os.getenv("CREDENTIALS_KEY", "")
+        self.batch_max_requests = os.getenv("BATCH_MAX_REQUESTS", "10")
+        self.batch_workers = os.getenv("BATCH_WORKERS", "8")
+        self.upstream_workers = os.getenv("UPSTREAM_WORKERS", "16")
+        self.translation_graph_max_overlay = os.getenv("TRANSLATION_GRAPH_MAX_OVERLAY", "100000")
 
     def get_instance(self):
-        if not hasattr(self, "_instance"):
-            self._instance = ENVIRONMENT()
-        return self._instance
+        return get_config()
 
     def getDomain(self):
         return self.domain
@@ -77,26 +120,215 @@ class ENVIRONMENT:
     def getSparqlEndpointUrl(self):
         return self.sparql_endpoint_url
 
+    def getDatabaseUri(self):
+        return self.database_uri
 
-domain = ENVIRONMENT().get_instance().getDomain()
-port = ENVIRONMENT().get_instance().getPort()
-prefix = ENVIRONMENT().get_instance().getPrefix()
-base_url = ENVIRONMENT().get_instance().getBaseUrl()
-commons_url = ENVIRONMENT().get_instance().getCommonsAPIUrl()
-consumer_key = ENVIRONMENT().get_instance().getConsumerKey()
-consumer_secret = ENVIRONMENT().get_instance().getConsumerSecret()
-app_version = ENVIRONMENT().get_instance().getAppVersion()
-app_secret = ENVIRONMENT().get_instance().getAppSecret()
-is_dev = ENVIRONMENT().get_instance().getIsDev()
-dev_fe_url = ENVIRONMENT().get_instance().getDevFEUrl()
-prod_fe_url = ENVIRONMENT().get_instance().getProdFEUrl()
-auth_base_url = ENVIRONMENT().get_instance().getAuthBaseUrl()
-wm_commons_image_base_url = ENVIRONMENT().get_instance().getCommonsImageBaseUrl()
-wm_commons_audio_base_url = ENVIRONMENT().get_instance().getCommonsAudioBaseUrl()
-sparql_endpoint_url = ENVIRONMENT().get_instance().getSparqlEndpointUrl()
-
-
-def build_swagger_config_json():
+    def getDbPoolSize(self):
+        return int(self.db_pool_size)
+
+    def getDbMaxOverflow(self):
+        return int(self.db_max_overflow)
+
+    def getDbPoolTimeout(self):
+        return int(self.db_pool_timeout)
+
+    def getDbPoolRecycle(self):
+        return int(self.db_pool_recycle)
+
+    def getSqliteBusyTimeout(self):
+        return int(self.sqlite_busy_timeout)
+
+    def getSqliteMmapSize(self):
+        return int(self.sqlite_mmap_size)
+
+    def getTokenCacheTtl(self):
+        return int(self.token_cache_ttl)
+
+    def getTokenCacheSize(self):
+        return int(self.token_cache_size)
+
+    def getCompressionMinSize(self):
+        return int(self.compression_min_size)
+
+    def getCompressionLevel(self):
+        return int(self.compression_level)
+
+    def getSlowRequestThresholdMs(self):
+        return float(self.slow_request_threshold_ms)
+
+    def getCachePath(self):
+        return self.cache_path
+
+    def getCacheLocalSize(self):
+        return int(self.cache_local_size)
+
+    def getCacheSyncInterval(self):
+        return float(self.cache_sync_interval)
+
+    def getCacheEntityTtl(self):
+        return int(self.cache_entity_ttl)
+
+    def getCacheLabelTtl(self):
+        return int(self.cache_label_ttl)
+
+    def getCacheSearchTtl(self):
+        return int(self.cache_search_ttl)
+
+    def getCacheCommonsUrlTtl(self):
+        return int(self.cache_commons_url_ttl)
+
+    def getUpstreamTimeout(self):
+        return float(self.upstream_timeout)
+
+    def getSparqlTimeout(self):
+        return float(self.sparql_timeout)
+
+    def getCircuitFailureThreshold(self):
+        return int(self.circuit_failure_threshold)
+
+    def getCircuitResetTimeout(self):
+        return float(self.circuit_reset_timeout)
+
+    def getCacheStaleTtl(self):
+        return int(self.cache_stale_ttl)
+
+    def getCacheMissingAudioTtl(self):
+        return int(self.cache_missing_audio_ttl)
+
+    def getBackgroundWorkers(self):
+        return int(self.background_workers)
+
+    def getBackgroundMaxPending(self):
+        return int(self.background_max_pending)
+
+    def getRateLimits(self):
+        return self.rate_limits
+
+    def getRateLimitShared(self):
+        return bool(self.rate_limit_shared)
+
+    def getRateLimitMaxKeys(self):
+        return int(self.rate_limit_max_keys)
+
+    def getProxyCount(self):
+        return int(self.proxy_count)
+
+    def getBulkGlossesMaxIds(self):
+        return int(self.bulk_glosses_max_ids)
+
+    def getTranslationGraphPath(self):
+        return self.translation_graph_path
+
+    def getCacheMaxSizeMb(self):
+        return int(self.cache_max_size_mb)
+
+    def getPrefetchMaxPerUser(self):
+        return int(self.prefetch_max_per_user)
+
+    def getPrefetchMaxPending(self):
+        return int(self.prefetch_max_pending)
+
+    def getWarmupPages(self):
+        return int(self.warmup_pages)
+
+    def getFormLeaseTtl(self):
+        return int(self.form_lease_ttl)
+
+    def getFormLeaseScanPages(self):
+        return int(self.form_lease_scan_pages)
+
+    def getCredentialsKey(self):
+        return self.credentials_key
+
+    def getBatchMaxRequests(self):
+        return int(self.batch_max_requests)
+
+    def getBatchWorkers(self):
+        return int(self.batch_workers)
+
+    def getUpstreamWorkers(self):
+        return int(self.upstream_workers)
+
+    def getTranslationGraphMaxOverlay(self):
+        return int(self.translation_graph_max_overlay)
+
+
+@functools.lru_cache(maxsize=None)
+def get_config():
+    """
+    Returns the one ENVIRONMENT of the process, .venv is only loaded once.
+    """
+    return ENVIRONMENT()
+
+
+config = get_config()
+domain = config.getDomain()
+port = config.getPort()
+prefix = config.getPrefix()
+base_url = config.getBaseUrl()
+commons_url = config.getCommonsAPIUrl()
+consumer_key = config.getConsumerKey()
+consumer_secret = config.getConsumerSecret()
+app_version = config.getAppVersion()
+app_secret = config.getAppSecret()
+is_dev = config.getIsDev()
+dev_fe_url = config.getDevFEUrl()
+prod_fe_url = config.getProdFEUrl()
+auth_base_url = config.getAuthBaseUrl()
+wm_commons_image_base_url = config.getCommonsImageBaseUrl()
+wm_commons_audio_base_url = config.getCommonsAudioBaseUrl()
+sparql_endpoint_url = config.getSparqlEndpointUrl()
+database_uri = config.getDatabaseUri()
+db_pool_size = config.getDbPoolSize()
+db_max_overflow = config.getDbMaxOverflow()
+db_pool_timeout = config.getDbPoolTimeout()
+db_pool_recycle = config.getDbPoolRecycle()
+sqlite_busy_timeout = config.getSqliteBusyTimeout()
+sqlite_mmap_size = config.getSqliteMmapSize()
+token_cache_ttl = config.getTokenCacheTtl()
+token_cache_size = config.getTokenCacheSize()
+compression_min_size = config.getCompressionMinSize()
+compression_level = config.getCompressionLevel()
+slow_request_threshold_ms = config.getSlowRequestThresholdMs()
+cache_path = config.getCachePath()
+cache_local_size = config.getCacheLocalSize()
+cache_sync_interval = config.getCacheSyncInterval()
+cache_entity_ttl = config.getCacheEntityTtl()
+cache_label_ttl = config.getCacheLabelTtl()
+cache_search_ttl = config.getCacheSearchTtl()
+cache_commons_url_ttl = config.getCacheCommonsUrlTtl()
+upstream_timeout = config.getUpstreamTimeout()
+sparql_timeout = config.getSparqlTimeout()
+circuit_failure_threshold = config.getCircuitFailureThreshold()
+circuit_reset_timeout = config.getCircuitResetTimeout()
+cache_stale_ttl = config.getCacheStaleTtl()
+cache_missing_audio_ttl = config.getCacheMissingAudioTtl()
+background_workers = config.getBackgroundWorkers()
+background_max_pending = config.getBackgroundMaxPending()
+rate_limits = config.getRateLimits()
+rate_limit_shared = config.getRateLimitShared()
+rate_limit_max_keys = config.getRateLimitMaxKeys()
+proxy_count = config.getProxyCount()
+bulk_glosses_max_ids = config.getBulkGlossesMaxIds()
+translation_graph_path = config.getTranslationGraphPath()
+cache_max_size_mb = config.getCacheMaxSizeMb()
+prefetch_max_per_user = config.getPrefetchMaxPerUser()
+prefetch_max_pending = config.getPrefetchMaxPending()
+warmup_pages = config.getWarmupPages()
+form_lease_ttl = config.getFormLeaseTtl()
+form_lease_scan_pages = config.getFormLeaseScanPages()
+credentials_key = config.getCredentialsKey()
+batch_max_requests = config.getBatchMaxRequests()
+batch_workers = config.getBatchWorkers()
+upstream_workers = config.getUpstreamWorkers()
+translation_graph_max_overlay = config.getTranslationGraphMaxOverlay()
+
+
+def build_swagger_config():
+    """
+    Returns the swagger config with the server URL of this deployment.
+    The file on disk is only read, workers must never rewrite it.
+    """
     config_file_path = os.path.dirname(__file__) + '/swagger/config.json'
 
     with open(config_file_path, 'r') as file:
@@ -106,8 +338,4 @@ def build_swagger_config_json():
         {"url": f"https://{domain}{prefix}"} if not is_dev else \
             {"url": f"http://{domain}:{port}{prefix}"},
     ]
-
-    new_config_file_path = os.path.dirname(__file__) + '/swagger/config.json'
-
-    with open(new_config_file_path, 'w') as new_file:
-        json.dump(config_data, new_file, indent=2)
+    return config_data
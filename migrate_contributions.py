@@ -0,0 +1,79 @@
+import re
+from sqlalchemy import inspect, text
+from service import app, db
+from service.models import ContributionModel
+from service.resources.contributions.utils import rebuild_contribution_stats
+
+# Formats of ContributionModel.data written before the structured columns
+AUDIO_DATA = re.compile(r'^(L\d+-F\d+)-(.+)$')
+TRANSLATION_DATA = re.compile(r'^(L\d+-S\d+)- P5927 -')
+GLOSS_DATA = 'Added: '
+# Contributions updated per transaction
+BATCH_SIZE = 1000
+
+
+def add_missing_columns():
+    table = ContributionModel.__table__
+    existing = {column['name'] for column in inspect(db.engine).get_columns(table.name)}
+    with db.engine.begin() as connection:
+        for column in table.columns:
+            if column.name not in existing:
+                column_type = column.type.compile(dialect=db.engine.dialect)
+                connection.execute(text(
+                    f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'))
+                print(f'Added column {table.name}.{column.name}')
+
+        for index in table.indexes:
+            index.create(connection, checkfirst=True)
+
+
+def backfill_contribution(contribution):
+    """
+    Fills the structured columns of `contribution` from its data. Returns
+    whether it was changed.
+    """
+    data = contribution.data or ''
+    if contribution.edit_type == 'audio' and data.startswith(GLOSS_DATA):
+        # Glosses used to be recorded as audio edits
+        contribution.edit_type = 'gloss'
+    elif contribution.edit_type == 'audio' and AUDIO_DATA.match(data):
+        form_id, file_name = AUDIO_DATA.match(data).groups()
+        contribution.form_id = form_id
+        contribution.file_name = file_name
+    elif contribution.edit_type == 'translation' and TRANSLATION_DATA.match(data):
+        contribution.sense_id = TRANSLATION_DATA.match(data).group(1)
+        contribution.wd_item = contribution.sense_id.split('-')[0]
+    else:
+        return False
+    return True
+
+
+def backfill_structured_data():
+    """
+    Backfills the contributions in batches of BATCH_SIZE ordered by id, each
+    in a transaction of its own, so that the writers of the database are
+    only held for a batch at a time and an interrupted run can be resumed:
+    the contributions done no longer match the query.
+    """
+    updated = 0
+    last_id = 0
+    query = ContributionModel.query.filter(ContributionModel.form_id.is_(None),
+                                           ContributionModel.sense_id.is_(None))
+    while True:
+        batch = query.filter(ContributionModel.id > last_id) \
+            .order_by(ContributionModel.id).limit(BATCH_SIZE).all()
+        if not batch:
+            break
+        last_id = batch[-1].id
+        updated += sum(map(backfill_contribution, batch))
+        db.session.commit()
+        db.session.expunge_all()
+        print(f'Contributions up to id {last_id} done, {updated} updated')
+    return updated
+
+
+with app.app_context():
+    db.create_all()
+    add_missing_columns()
+    print(f'Contributions updated: {backfill_structured_data()}')
+    print(f'Contribution statistics rebuilt: {rebuild_contribution_stats()} groups')
@@ -3,51 +3,93 @@ import os
 from flask import Flask, jsonify
 from flask_sqlalchemy import SQLAlchemy
 from flask_restful import Api, MethodNotAllowed, NotFound
-from flask_swagger_ui import get_swaggerui_blueprint
 from flask_cors import CORS
 
-from common import (domain, port, prefix, build_swagger_config_json,
-                    app_secret, is_dev)
+from common import (domain, port, prefix, app_secret, is_dev, proxy_count)
+from service.database import get_database_uri, get_engine_options
+from service.serializer import output_json
+from service.cache import init_cache
+from service.compression import init_compression
+from service.metrics import init_metrics
+from service.rate_limit import init_rate_limit
+from service.timing import init_timing
 
-app = Flask(__name__, template_folder='../templates')
+basedir = os.path.abspath(os.path.dirname(__file__))
 
-# Configure CORS for token-based authentication
-CORS(app, supports_credentials=True, resources={r"/api/*": {"origins": "*"}})
+db = SQLAlchemy()
+api = Api(prefix=prefix, catch_all_404s=True)
+api.representation('application/json')(output_json)
+
+
+def create_app(config=None):
+    """
+    Builds the Flask application.
+
+    `config` overrides the settings read from the environment, e.g. the
+    database URI in tests. Resources added to `api` before or after this
+    call are served by the app.
+    """
+    app = Flask(__name__, template_folder='../templates')
+    if proxy_count:
+        # The client address is the one added by the last of our proxies
+        from werkzeug.middleware.proxy_fix import ProxyFix
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=proxy_count)
+
+    # Configure CORS for token-based authentication
+    CORS(app, supports_credentials=True, resources={r"/api/*": {"origins": "*"}},
+         expose_headers=['Retry-After', 'X-Next-Page'])
+
+    app.config['SQLALCHEMY_DATABASE_URI'] = get_database_uri(os.path.join(basedir, 'app.sqlite'))
+    app.config.update(config or {})
+    app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS',
+                          get_engine_options(app.config['SQLALCHEMY_DATABASE_URI']))
+    app.secret_key = app_secret
+    db.init_app(app)
+    api.init_app(app)
+    # Like Api(app): resources added from now on go straight to this app
+    api.app = app
+
+    register_swagger_ui(app)
+    register_error_handlers(app)
+    init_metrics(app)
+    init_timing(app)
+    init_rate_limit(app)
+    init_compression(app)
+    init_cache(app)
+    return app
+
+
+def register_swagger_ui(app):
+    # flask_swagger_ui is only needed to build the blueprint
+    from flask_swagger_ui import get_swaggerui_blueprint
+
+    swaggerui_blueprint = get_swaggerui_blueprint(
+        prefix,
+        f'http://{domain}:{port}{prefix}/swagger-config' if is_dev else \
+            f'https://{domain}{prefix}/swagger-config' ,
+        config={
+            'app_name': "AGPB API",
+            "layout": "BaseLayout",
+            "docExpansion": "none"
+        },
+    )
+
+    app.register_blueprint(swaggerui_blueprint, url_prefix=prefix)
+
+
+def register_error_handlers(app):
+    @app.errorhandler(NotFound)
+    def handle_method_not_found(e):
+        response = jsonify({"message": str(e)})
+        response.status_code = 404
+        return response
+
+    @app.errorhandler(MethodNotAllowed)
+    def handle_method_not_allowed_error(e):
+        response = jsonify({"message": str(e)})
+        response.status_code = 405
+        return response
 
-basedir = os.path.abspath(os.path.dirname(__file__))
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + os.path.join(basedir, 'app.sqlite')
-app.secret_key = app_secret
-db = SQLAlchemy(app)
-api = Api(app, prefix=prefix, catch_all_404s=True)
-
-# Swagger
-build_swagger_config_json()
-swaggerui_blueprint = get_swaggerui_blueprint(
-    prefix,
-    f'http://{domain}:{port}{prefix}/swagger-config' if is_dev else \
-        f'https://{domain}{prefix}/swagger-config' ,
-    config={
-        'app_name': "AGPB API",
-        "layout": "BaseLayout",
-        "docExpansion": "none"
-    },
-)
-
-app.register_blueprint(swaggerui_blueprint, url_prefix=prefix)
-
-
-# Errors
-@app.errorhandler(NotFound)
-def handle_method_not_found(e):
-    response = jsonify({"message": str(e)})
-    response.status_code = 404
-    return response
-
-
-@app.errorhandler(MethodNotAllowed)
-def handle_method_not_allowed_error(e):
-    response = jsonify({"message": str(e)})
-    response.status_code = 405
-    return response
 
+app = create_app()
 app.app_context().push()
@@ -0,0 +1,69 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from common import (background_workers, background_max_pending, prefetch_max_per_user,
+                    prefetch_max_pending)
+
+logger = logging.getLogger('agpb.background')
+
+executor = ThreadPoolExecutor(max_workers=background_workers,
+                              thread_name_prefix='agpb-background')
+pending = set()
+pending_lock = threading.Lock()
+# Pending prefetches per user or client address
+prefetching = {}
+
+
+def submit_background(key, task):
+    """
+    Runs `task` in a worker thread unless a task of the same `key` is
+    pending or the queue is full. Returns whether it was submitted.
+    """
+    with pending_lock:
+        if key in pending or len(pending) >= background_max_pending:
+            return False
+        pending.add(key)
+
+    def run():
+        try:
+            task()
+        except Exception as e:
+            logger.warning('Background task %s failed: %s', key, e)
+        finally:
+            with pending_lock:
+                pending.discard(key)
+
+    executor.submit(run)
+    return True
+
+
+def release_prefetch(owner):
+    with pending_lock:
+        prefetching[owner] -= 1
+        if not prefetching[owner]:
+            del prefetching[owner]
+
+
+def submit_prefetch(key, owner, task):
+    """
+    submit_background of work done ahead of a request of `owner`, the user
+    or client address it is for. At most PREFETCH_MAX_PER_USER prefetches
+    of an owner and PREFETCH_MAX_PENDING in all are pending at a time.
+    Returns whether it was submitted.
+    """
+    with pending_lock:
+        if (sum(prefetching.values()) >= prefetch_max_pending
+                or prefetching.get(owner, 0) >= prefetch_max_per_user):
+            return False
+        prefetching[owner] = prefetching.get(owner, 0) + 1
+
+    def run():
+        try:
+            task()
+        finally:
+            release_prefetch(owner)
+
+    if not submit_background(key, run):
+        release_prefetch(owner)
+        return False
+    return True
@@ -0,0 +1,389 @@
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from flask import g, has_request_context
+from common import (cache_path, cache_local_size, cache_sync_interval, cache_stale_ttl,
+                    cache_max_size_mb)
+from service.background import submit_background
+from service.circuit_breaker import is_upstream_available
+from service.metrics import record_cache_lookup
+from service.serializer import dumps, loads
+
+MISS = object()
+
+# Values longer than this are stored zlib compressed
+COMPRESS_MIN_SIZE = 1024
+# Entries expired for longer than the stale TTL are purged from the shared
+# store once every this many writes
+PURGE_INTERVAL = 1000
+
+STALE_WARNING = '110 - "Response is Stale"'
+
+
+def encode_value(value):
+    """
+    Compact bytes of a JSON serializable value: JSON, compressed when long,
+    behind a one byte format marker.
+    """
+    data = dumps(value)
+    if len(data) >= COMPRESS_MIN_SIZE:
+        return b'z' + zlib.compress(data)
+    return b'j' + data
+
+
+def decode_value(data):
+    if data[:1] == b'z':
+        return loads(zlib.decompress(data[1:]))
+    return loads(data[1:])
+
+
+def get_prefix_end(prefix):
+    """
+    The smallest string above all the strings starting with `prefix`, so a
+    prefix is the key range [prefix, end) of the primary key index.
+    """
+    return prefix + '\U0010ffff'
+
+
+class LocalCache:
+    """
+    Least recently used (key: (encoded value, expiry)) of one process.
+    Values stay encoded so callers always get their own copy.
+    """
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+            return entry
+
+    def set(self, key, data, expires_at):
+        with self.lock:
+            self.entries[key] = (data, expires_at)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def delete_prefix(self, prefix):
+        with self.lock:
+            for key in [key for key in self.entries if key.startswith(prefix)]:
+                del self.entries[key]
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+class SharedStore:
+    """
+    SQLite file shared by the workers of a node. Every thread has its own
+    connection; WAL lets readers run alongside the writer.
+    Invalidated prefixes are logged so that the workers can drop them from
+    their local caches too. Above `max_size` bytes of values, the entries
+    that expire first are evicted when purging.
+    """
+
+    def __init__(self, path, max_size=None):
+        self.path = path
+        self.max_size = max_size
+        self.connections = threading.local()
+
+    def get_connection(self):
+        connection = getattr(self.connections, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None,
+                                         check_same_thread=False)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=OFF')
+            connection.execute('CREATE TABLE IF NOT EXISTS cache '
+                               '(key TEXT PRIMARY KEY, value BLOB, expires_at REAL)')
+            connection.execute('CREATE INDEX IF NOT EXISTS cache_expires_at '
+                               'ON cache (expires_at)')
+            connection.execute('CREATE TABLE IF NOT EXISTS invalidations '
+                               '(id INTEGER PRIMARY KEY AUTOINCREMENT, prefix TEXT)')
+            self.connections.connection = connection
+        return connection
+
+    def get(self, key):
+        return self.get_connection().execute(
+            'SELECT value, expires_at FROM cache WHERE key = ?', (key,)).fetchone()
+
+    def set(self, key, data, expires_at):
+        self.get_connection().execute(
+            'INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, ?)',
+            (key, data, expires_at))
+
+    def delete_prefix(self, prefix):
+        connection = self.get_connection()
+        connection.execute('DELETE FROM cache WHERE key >= ? AND key < ?',
+                           (prefix, get_prefix_end(prefix)))
+        connection.execute('INSERT INTO invalidations (prefix) VALUES (?)', (prefix,))
+
+    def get_invalidations(self, after):
+        """
+        (id, prefix) of the prefixes invalidated since the invalidation `after`.
+        """
+        return self.get_connection().execute(
+            'SELECT id, prefix FROM invalidations WHERE id > ? ORDER BY id',
+            (after,)).fetchall()
+
+    def get_last_invalidation(self):
+        return self.get_connection().execute(
+            'SELECT COALESCE(MAX(id), 0) FROM invalidations').fetchone()[0]
+
+    def purge(self, before):
+        """
+        Deletes the entries that expired before `before`, the entries beyond
+        the size limit and old invalidations.
+        """
+        connection = self.get_connection()
+        connection.execute('DELETE FROM cache WHERE expires_at < ?', (before,))
+        if self.max_size is not None:
+            connection.execute('DELETE FROM cache WHERE key IN '
+                               '(SELECT key FROM (SELECT key, SUM(LENGTH(value)) OVER '
+                               '(ORDER BY expires_at DESC, key) AS total FROM cache) '
+                               'WHERE total > ?)', (self.max_size,))
+        connection.execute('DELETE FROM invalidations WHERE id < '
+                           '(SELECT MAX(id) FROM invalidations) - ?', (PURGE_INTERVAL,))
+
+    def clear(self):
+        connection = self.get_connection()
+        connection.execute('DELETE FROM cache')
+        connection.execute('DELETE FROM invalidations')
+
+
+class Cache:
+    """
+    Two level cache of JSON serializable values: the local cache of the
+    process in front of the store shared by the workers.
+    Keys are paths such as 'lexeme/L3625/entity', so that invalidating the
+    prefix 'lexeme/L3625/' drops everything cached about a lexeme.
+    Expired entries are kept for `stale_ttl` seconds more, to be served
+    while the upstream is down.
+    Lookups are counted in agpb_cache_lookups_total by the first part of
+    the key.
+    """
+
+    def __init__(self, local, shared=None, sync_interval=1.0, stale_ttl=0):
+        self.local = local
+        self.shared = shared
+        self.sync_interval = sync_interval
+        self.stale_ttl = stale_ttl
+        self.last_sync = 0.0
+        self.last_invalidation = None
+        self.writes = 0
+        self.lock = threading.Lock()
+
+    def sync(self, now):
+        """
+        Drops the prefixes invalidated by other workers from the local cache,
+        at most once per sync interval.
+        """
+        if self.shared is None or now - self.last_sync < self.sync_interval:
+            return
+        with self.lock:
+            if now - self.last_sync < self.sync_interval:
+                return
+            self.last_sync = now
+            if self.last_invalidation is None:
+                self.last_invalidation = self.shared.get_last_invalidation()
+                return
+            for invalidation_id, prefix in self.shared.get_invalidations(self.last_invalidation):
+                self.local.delete_prefix(prefix)
+                self.last_invalidation = invalidation_id
+
+    def get_entry(self, key):
+        """
+        (value, whether it is fresh) of `key`, or None when it is not cached.
+        """
+        now = time.time()
+        self.sync(now)
+
+        entry = self.local.get(key)
+        if (entry is None or entry[1] <= now) and self.shared is not None:
+            # Another worker may have refreshed it
+            shared_entry = self.shared.get(key)
+            if shared_entry is not None:
+                entry = shared_entry
+                self.local.set(key, *entry)
+        if entry is not None and entry[1] + self.stale_ttl <= now:
+            entry = None
+
+        fresh = entry is not None and entry[1] > now
+        record_cache_lookup(key.split('/', 1)[0], fresh, stale=entry is not None)
+        return None if entry is None else (decode_value(entry[0]), fresh)
+
+    def get(self, key, default=MISS):
+        """
+        The fresh value of `key`, or `default`.
+        """
+        entry = self.get_entry(key)
+        return entry[0] if entry is not None and entry[1] else default
+
+    def set(self, key, value, ttl):
+        data = encode_value(value)
+        expires_at = time.time() + ttl
+        self.local.set(key, data, expires_at)
+        if self.shared is None:
+            return
+
+        self.shared.set(key, data, expires_at)
+        self.writes += 1
+        if self.writes % PURGE_INTERVAL == 0:
+            self.shared.purge(time.time() - self.stale_ttl)
+
+    def invalidate(self, prefix):
+        """
+        Drops the keys starting with `prefix` here, from the shared store and,
+        within the sync interval, from the local caches of the other workers.
+        """
+        self.local.delete_prefix(prefix)
+        if self.shared is not None:
+            self.shared.delete_prefix(prefix)
+
+    def clear(self):
+        self.local.clear()
+        if self.shared is not None:
+            self.shared.clear()
+            self.last_invalidation = None
+
+
+def get_cache_path():
+    return cache_path or os.path.join(os.path.abspath(os.path.dirname(__file__)), 'cache.sqlite')
+
+
+cache = Cache(LocalCache(cache_local_size),
+              SharedStore(get_cache_path(), cache_max_size_mb * 1024 * 1024),
+              cache_sync_interval, cache_stale_ttl)
+
+
+def is_valid_result(result):
+    """
+    Whether a result may be cached: not the error of make_api_request.
+    """
+    return not (isinstance(result, dict) and 'status_code' in result)
+
+
+def serve_stale(key, refresh):
+    """
+    Marks the response as stale and runs `refresh` in the background.
+    """
+    if has_request_context():
+        g.stale_response = True
+    submit_background(key, refresh)
+
+
+def refresh_value(key, ttl, fetch, is_valid):
+    value = fetch()
+    if is_valid(value):
+        cache.set(key, value, ttl)
+
+
+def cached_read(key, ttl, url, fetch, is_valid=is_valid_result):
+    """
+    The cached value of `key`, or the result of `fetch()` that is then
+    cached for `ttl` seconds when valid.
+    While the upstream of `url` is unavailable (open circuit breaker, error
+    or invalid result) an expired value of `key` is served stale instead
+    and refreshed in the background. Without one, the error is returned or
+    raised.
+    """
+    entry = cache.get_entry(key)
+    if entry is not None and entry[1]:
+        return entry[0]
+
+    def refresh():
+        refresh_value(key, ttl, fetch, is_valid)
+
+    if entry is not None and not is_upstream_available(url):
+        serve_stale(key, refresh)
+        return entry[0]
+
+    try:
+        value = fetch()
+    except Exception:
+        if entry is None:
+            raise
+        serve_stale(key, refresh)
+        return entry[0]
+
+    if is_valid(value):
+        cache.set(key, value, ttl)
+    elif entry is not None:
+        serve_stale(key, refresh)
+        return entry[0]
+    return value
+
+
+def get_cached_entries(keys):
+    """
+    The fresh {id: value} of `keys` ({id: cache key}), the ids to fetch and
+    the expired {id: value} among them.
+    """
+    values, missing, stale = {}, [], {}
+    for item_id, key in keys.items():
+        entry = cache.get_entry(key)
+        if entry is not None and entry[1]:
+            values[item_id] = entry[0]
+        else:
+            missing.append(item_id)
+            if entry is not None:
+                stale[item_id] = entry[0]
+    return values, missing, stale
+
+
+def set_cached_entries(keys, values, ttl):
+    for item_id, value in values.items():
+        cache.set(keys[item_id], value, ttl)
+
+
+def cached_read_many(keys, ttl, url, fetch):
+    """
+    cached_read of several values at once. `keys` maps ids to cache keys,
+    `fetch(ids)` returns the {id: value} of the ids not in the cache.
+    Expired values are only served when all the missing ids have one.
+    """
+    values, missing, stale = get_cached_entries(keys)
+    if not missing:
+        return values
+
+    def refresh():
+        set_cached_entries(keys, fetch(missing), ttl)
+
+    can_serve_stale = len(stale) == len(missing)
+    if can_serve_stale and not is_upstream_available(url):
+        serve_stale('|'.join(keys[item_id] for item_id in missing), refresh)
+        return {**values, **stale}
+
+    try:
+        fetched = fetch(missing)
+    except Exception:
+        if not can_serve_stale:
+            raise
+        serve_stale('|'.join(keys[item_id] for item_id in missing), refresh)
+        return {**values, **stale}
+
+    set_cached_entries(keys, fetched, ttl)
+    return {**values, **fetched}
+
+
+def add_stale_warning(response):
+    if g.get('stale_response'):
+        response.headers['Warning'] = STALE_WARNING
+    return response
+
+
+def init_cache(app):
+    """
+    Adds a Warning header to the responses that used stale cache entries.
+    """
+    app.after_request(add_stale_warning)
@@ -0,0 +1,109 @@
+import math
+import threading
+import time
+from urllib.parse import urlparse
+from werkzeug.exceptions import ServiceUnavailable
+from common import circuit_failure_threshold, circuit_reset_timeout
+from service.metrics import CIRCUIT_STATE, UPSTREAM_REJECTED
+
+CLOSED = 'closed'
+HALF_OPEN = 'half_open'
+OPEN = 'open'
+
+STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class CircuitOpenError(ServiceUnavailable):
+    """
+    Raised instead of calling an upstream whose breaker is open. Renders
+    as a 503 with a Retry-After header.
+    """
+
+    def __init__(self, host, retry_after):
+        super().__init__(f'{host} is unavailable, please retry later.',
+                         retry_after=retry_after)
+        self.host = host
+
+
+class CircuitBreaker:
+    """
+    Stops the calls to an upstream for `reset_timeout` seconds after
+    `failure_threshold` failures in a row. Then a single trial call is let
+    through: its success closes the breaker, its failure opens it again.
+    """
+
+    def __init__(self, host, failure_threshold, reset_timeout):
+        self.host = host
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.trial_running = False
+        self.lock = threading.Lock()
+
+    def set_state(self, state):
+        self.state = state
+        CIRCUIT_STATE.set(STATE_VALUES[state], self.host)
+
+    def is_closed(self):
+        return self.state == CLOSED
+
+    def before_call(self):
+        """
+        Raises CircuitOpenError unless a call may be made now.
+        """
+        if self.state == CLOSED:
+            return
+        with self.lock:
+            now = time.monotonic()
+            if self.state == OPEN and now - self.opened_at >= self.reset_timeout:
+                self.set_state(HALF_OPEN)
+            if self.state == CLOSED or (self.state == HALF_OPEN and not self.trial_running):
+                self.trial_running = self.state == HALF_OPEN
+                return
+
+            UPSTREAM_REJECTED.inc(self.host)
+            retry_after = max(1, math.ceil(self.opened_at + self.reset_timeout - now))
+            raise CircuitOpenError(self.host, retry_after)
+
+    def record_success(self):
+        if self.state == CLOSED and not self.failures:
+            return
+        with self.lock:
+            self.failures = 0
+            self.trial_running = False
+            if self.state != CLOSED:
+                self.set_state(CLOSED)
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            self.trial_running = False
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+                self.set_state(OPEN)
+
+
+breakers = {}
+breakers_lock = threading.Lock()
+
+
+def get_host(url):
+    return urlparse(url).netloc or url if url else url
+
+
+def get_breaker(host):
+    """
+    The breaker of an upstream host (and port).
+    """
+    breaker = breakers.get(host)
+    if breaker is None:
+        with breakers_lock:
+            breaker = breakers.setdefault(
+                host, CircuitBreaker(host, circuit_failure_threshold, circuit_reset_timeout))
+    return breaker
+
+
+def is_upstream_available(url):
+    return get_breaker(get_host(url)).is_closed()
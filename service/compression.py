@@ -0,0 +1,55 @@
+import gzip
+from flask import request
+from common import compression_min_size, compression_level
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - depends on the deployment
+    brotli = None
+
+
+def choose_encoding(accept_encodings):
+    if brotli is not None and accept_encodings['br']:
+        return 'br'
+    if accept_encodings['gzip']:
+        return 'gzip'
+    return None
+
+
+def compress_body(body, encoding):
+    if encoding == 'br':
+        return brotli.compress(body, quality=min(compression_level, 11))
+    return gzip.compress(body, compresslevel=compression_level)
+
+
+def compress_response(response):
+    """
+    Compresses buffered responses of at least compression_min_size bytes
+    with brotli or gzip, depending on the client's Accept-Encoding.
+    """
+    if response.direct_passthrough or response.is_streamed \
+            or response.status_code < 200 or response.status_code in (204, 304) \
+            or 'Content-Encoding' in response.headers:
+        return response
+
+    response.vary.add('Accept-Encoding')
+    body = response.get_data()
+    if len(body) < compression_min_size:
+        return response
+
+    encoding = choose_encoding(request.accept_encodings)
+    if encoding is None:
+        return response
+
+    response.set_data(compress_body(body, encoding))
+    response.headers['Content-Encoding'] = encoding
+
+    # The compressed body is a different representation with its own ETag
+    etag, weak = response.get_etag()
+    if etag:
+        response.set_etag(f'{etag}-{encoding}', weak)
+    return response
+
+
+def init_compression(app):
+    app.after_request(compress_response)
@@ -0,0 +1,190 @@
+"""
+OAuth access tokens of the logged in users, kept server side.
+
+The tokens are stored encrypted in the credentials table under the digest
+of the temp_token of the login, so that the JWT handed to the client only
+references them. Each worker keeps the decrypted tokens of its recent
+users with a requests session signed with them, whose connections are
+reused by the edits of a user.
+
+They are encrypted with AES-256-GCM (cryptography) under CREDENTIALS_KEY,
+32 bytes in URL-safe base64, and bound to their digest. Without the key
+no credentials are stored, so logins are refused.
+"""
+import base64
+import binascii
+import functools
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+import requests
+from sqlalchemy import delete
+from common import (consumer_key, consumer_secret, credentials_key, token_cache_ttl,
+                    token_cache_size)
+from service import db
+from service.models import CredentialModel
+from service.serializer import dumps, loads
+
+FORMAT_VERSION = b'\x02'
+NONCE_SIZE = 12
+KEY_SIZE = 32
+
+
+class CredentialsError(Exception):
+    pass
+
+
+def get_token_digest(temp_token):
+    return hashlib.sha256(temp_token.encode('utf-8')).hexdigest()
+
+
+@functools.lru_cache(maxsize=2)
+def get_cipher(key):
+    from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+
+    if not key:
+        raise CredentialsError('CREDENTIALS_KEY is not set')
+    try:
+        secret = base64.urlsafe_b64decode(key)
+    except (binascii.Error, ValueError):
+        secret = b''
+    if len(secret) != KEY_SIZE:
+        raise CredentialsError(f'CREDENTIALS_KEY must be {KEY_SIZE} bytes in URL-safe base64')
+    return AESGCM(secret)
+
+
+def get_credentials_key_error():
+    """
+    Why no credentials can be stored, or None when CREDENTIALS_KEY is valid.
+    """
+    try:
+        get_cipher(credentials_key)
+    except CredentialsError as e:
+        return str(e)
+    return None
+
+
+def encrypt(plaintext, associated_data):
+    """
+    version | nonce | AES-GCM ciphertext and tag of `plaintext`, bound to
+    `associated_data` so that a record cannot be moved to another key.
+    """
+    nonce = os.urandom(NONCE_SIZE)
+    return FORMAT_VERSION + nonce + get_cipher(credentials_key).encrypt(
+        nonce, plaintext, FORMAT_VERSION + associated_data)
+
+
+def decrypt(data, associated_data):
+    from cryptography.exceptions import InvalidTag
+
+    if len(data) < 1 + NONCE_SIZE or data[:1] != FORMAT_VERSION:
+        raise CredentialsError('Unknown credentials format')
+    try:
+        return get_cipher(credentials_key).decrypt(data[1:1 + NONCE_SIZE],
+                                                   data[1 + NONCE_SIZE:],
+                                                   FORMAT_VERSION + associated_data)
+    except InvalidTag:
+        raise CredentialsError('Credentials do not match their key')
+
+
+def make_session(access_token, access_secret):
+    """
+    A requests session that signs its requests with the OAuth tokens.
+    """
+    from requests_oauthlib import OAuth1
+
+    session = requests.Session()
+    session.auth = OAuth1(consumer_key, consumer_secret, access_token, access_secret)
+    return session
+
+
+class CredentialCache:
+    """
+    Least recently used (token digest: (expiry, access token, access secret,
+    session)) of one worker.
+    """
+
+    def __init__(self, max_size, max_ttl):
+        self.max_size = max_size
+        self.max_ttl = max_ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, digest):
+        with self.lock:
+            entry = self.entries.get(digest)
+            if entry is None:
+                return None
+            if entry[0] <= time.time():
+                self._remove(digest)
+                return None
+            self.entries.move_to_end(digest)
+            return entry[1:]
+
+    def set(self, digest, access_token, access_secret, session):
+        with self.lock:
+            self._remove(digest)
+            self.entries[digest] = (time.time() + self.max_ttl, access_token, access_secret,
+                                    session)
+            while len(self.entries) > self.max_size:
+                self._remove(next(iter(self.entries)))
+
+    def invalidate(self, digest):
+        with self.lock:
+            self._remove(digest)
+
+    def _remove(self, digest):
+        # The session may still be in use by a request, it is not closed
+        self.entries.pop(digest, None)
+
+
+credential_cache = CredentialCache(token_cache_size, token_cache_ttl)
+
+
+def store_credentials(user, temp_token, access_token, access_secret):
+    """
+    Replaces the stored credentials of `user` with the access token of its
+    login `temp_token`. Nothing is committed here, the caller commits with
+    the new temp_token. Raises CredentialsError when CREDENTIALS_KEY is not
+    set or invalid.
+    """
+    digest = get_token_digest(temp_token)
+    plaintext = dumps({'key': access_token, 'secret': access_secret})
+    data = encrypt(plaintext, digest.encode('ascii'))
+    db.session.execute(delete(CredentialModel).where(CredentialModel.user_id == user.id))
+    db.session.add(CredentialModel(token_digest=digest, user_id=user.id, data=data))
+
+
+def delete_credentials(user, temp_token=None):
+    """
+    Drops the stored credentials of `user`, e.g. at logout, in the current
+    session, and those of `temp_token` from the cache of this worker.
+    """
+    db.session.execute(delete(CredentialModel).where(CredentialModel.user_id == user.id))
+    if temp_token:
+        credential_cache.invalidate(get_token_digest(temp_token))
+
+
+def get_credentials(temp_token):
+    """
+    (access token, access secret, signed session) of the login `temp_token`,
+    or None when no credentials are stored for it.
+    """
+    digest = get_token_digest(temp_token)
+    cached = credential_cache.get(digest)
+    if cached is not None:
+        return cached
+
+    record = db.session.get(CredentialModel, digest)
+    if record is None:
+        return None
+    try:
+        credentials = loads(decrypt(record.data, digest.encode('ascii')))
+    except CredentialsError:
+        return None
+
+    session = make_session(credentials['key'], credentials['secret'])
+    credential_cache.set(digest, credentials['key'], credentials['secret'], session)
+    return credentials['key'], credentials['secret'], session
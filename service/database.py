@@ -0,0 +1,69 @@
+import sqlite3
+from sqlalchemy import event
+from sqlalchemy.engine import Engine, make_url
+from common import (database_uri, db_pool_size, db_max_overflow, db_pool_timeout,
+                    db_pool_recycle, sqlite_busy_timeout, sqlite_mmap_size)
+
+
+def get_database_uri(default_path):
+    """
+    Returns the configured database URI, or a SQLite file at `default_path`.
+    """
+    if not database_uri:
+        return 'sqlite:///' + default_path
+
+    # Heroku/Toolforge style URIs are not accepted by SQLAlchemy 2
+    if database_uri.startswith('postgres://'):
+        return 'postgresql://' + database_uri[len('postgres://'):]
+    return database_uri
+
+
+def get_engine_options(uri):
+    """
+    Returns the SQLAlchemy engine options for the database backend of `uri`.
+
+    SQLite is tuned through connect pragmas (see set_sqlite_pragmas), server
+    databases get a bounded connection pool that is checked before use.
+    """
+    if make_url(uri).get_backend_name() == 'sqlite':
+        return {}
+
+    return {
+        'pool_size': db_pool_size,
+        'max_overflow': db_max_overflow,
+        'pool_timeout': db_pool_timeout,
+        'pool_recycle': db_pool_recycle,
+        'pool_pre_ping': True
+    }
+
+
+@event.listens_for(Engine, 'connect')
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    """
+    Lets concurrent workers share the SQLite file: readers no longer block
+    the writer (WAL) and a locked database is retried for busy_timeout ms
+    instead of failing straight away.
+    """
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+
+    cursor = dbapi_connection.cursor()
+    cursor.execute('PRAGMA journal_mode=WAL')
+    cursor.execute('PRAGMA synchronous=NORMAL')
+    cursor.execute(f'PRAGMA busy_timeout={int(sqlite_busy_timeout)}')
+    cursor.execute(f'PRAGMA mmap_size={int(sqlite_mmap_size)}')
+    cursor.close()
+
+
+def get_conflict_insert(dialect):
+    """
+    The insert() of the `dialect` backend, whose statements take the
+    ON CONFLICT clauses that SQLite and PostgreSQL share.
+    """
+    if dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+        return insert
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+        return insert
+    raise NotImplementedError(f'ON CONFLICT clauses are not supported on {dialect}')
@@ -0,0 +1,253 @@
+import bisect
+import threading
+import time
+from flask import current_app, g, has_request_context, request
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Seconds, from a cached token lookup to a slow WDQS query
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def escape_label(value):
+    return str(value).replace('\\', r'\\').replace('\n', r'\n').replace('"', r'\"')
+
+
+def format_labels(names, values):
+    if not names:
+        return ''
+    pairs = ','.join(f'{name}="{escape_label(value)}"' for name, value in zip(names, values))
+    return '{' + pairs + '}'
+
+
+def format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class Registry:
+    """
+    The metrics of this worker process, rendered in the Prometheus text
+    exposition format. Each gunicorn worker keeps its own registry.
+    """
+
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.append(f'# HELP {metric.name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name} {metric.type}')
+            lines.extend(metric.collect())
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+
+class Metric:
+    type = 'untyped'
+
+    def __init__(self, name, documentation, labelnames=(), registry=registry):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+        self.lock = threading.Lock()
+        registry.register(self)
+
+    def collect(self):
+        with self.lock:
+            values = list(self.values.items())
+        return [f'{self.name}{format_labels(self.labelnames, labels)} {format_value(value)}'
+                for labels, value in values]
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def inc(self, *labels, amount=1):
+        with self.lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+    def get(self, *labels):
+        return self.values.get(labels, 0)
+
+
+class Gauge(Metric):
+    type = 'gauge'
+
+    def inc(self, *labels, amount=1):
+        with self.lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+    def dec(self, *labels, amount=1):
+        self.inc(*labels, amount=-amount)
+
+    def set(self, value, *labels):
+        with self.lock:
+            self.values[labels] = value
+
+
+class Histogram(Metric):
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS,
+                 registry=registry):
+        super().__init__(name, documentation, labelnames, registry)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, *labels):
+        # bucket i counts values in (buckets[i-1], buckets[i]], the last one +Inf
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            series = self.values.get(labels)
+            if series is None:
+                series = self.values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def collect(self):
+        with self.lock:
+            values = [(labels, list(counts), total) for labels, (counts, total) in self.values.items()]
+
+        lines = []
+        names = self.labelnames + ('le',)
+        for labels, counts, total in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{format_labels(names, labels + (format_value(bound),))}'
+                             f' {cumulative}')
+            series = format_labels(self.labelnames, labels)
+            lines.append(f'{self.name}_sum{series} {format_value(total)}')
+            lines.append(f'{self.name}_count{series} {cumulative}')
+        return lines
+
+
+class HitRatio(Metric):
+    """
+    Hit ratio per cache, derived from a counter labeled (cache, result) when
+    scraped.
+    """
+    type = 'gauge'
+
+    def __init__(self, name, documentation, counter, registry=registry):
+        super().__init__(name, documentation, ('cache',), registry)
+        self.counter = counter
+
+    def collect(self):
+        with self.counter.lock:
+            values = list(self.counter.values.items())
+
+        lookups = {}
+        for (cache, result), count in values:
+            hits, total = lookups.get(cache, (0, 0))
+            lookups[cache] = (hits + (count if result == 'hit' else 0), total + count)
+        return [f'{self.name}{format_labels(self.labelnames, (cache,))} {format_value(hits / total)}'
+                for cache, (hits, total) in lookups.items() if total]
+
+
+REQUEST_LATENCY = Histogram('agpb_http_request_duration_seconds',
+                            'Time spent serving HTTP requests.',
+                            ('resource', 'method'))
+REQUESTS = Counter('agpb_http_requests_total',
+                   'HTTP requests served, by response status.',
+                   ('resource', 'method', 'status'))
+REQUESTS_IN_FLIGHT = Gauge('agpb_http_requests_in_flight',
+                           'HTTP requests being served.',
+                           ('resource',))
+
+UPSTREAM_LATENCY = Histogram('agpb_upstream_request_duration_seconds',
+                             'Time spent waiting on Wikidata, Commons and WDQS.',
+                             ('host', 'action'))
+UPSTREAM_ERRORS = Counter('agpb_upstream_errors_total',
+                          'Upstream calls that raised or returned a 5xx status.',
+                          ('host', 'action'))
+UPSTREAM_IN_FLIGHT = Gauge('agpb_upstream_requests_in_flight',
+                           'Upstream calls waiting for a response.',
+                           ('host',))
+UPSTREAM_BYTES = Counter('agpb_upstream_response_bytes_total',
+                         'Bytes received from Wikidata, Commons and WDQS, by resource '
+                         'of the request (background for refreshes).',
+                         ('resource', 'host', 'action'))
+UPSTREAM_REJECTED = Counter('agpb_upstream_rejected_total',
+                            'Upstream calls not made because the circuit breaker was open.',
+                            ('host',))
+CIRCUIT_STATE = Gauge('agpb_circuit_breaker_state',
+                      'State of the circuit breaker of an upstream: '
+                      '0 closed, 1 half open, 2 open.',
+                      ('host',))
+
+RATE_LIMITED = Counter('agpb_rate_limited_total',
+                       'Requests refused with a 429, by resource class.',
+                       ('resource_class',))
+
+CACHE_LOOKUPS = Counter('agpb_cache_lookups_total',
+                        'Cache lookups, by result (hit, stale or miss).',
+                        ('cache', 'result'))
+CACHE_HIT_RATIO = HitRatio('agpb_cache_hit_ratio',
+                           'Share of cache lookups that were hits.',
+                           CACHE_LOOKUPS)
+
+
+def record_cache_lookup(cache, hit, stale=False):
+    CACHE_LOOKUPS.inc(cache, 'hit' if hit else 'stale' if stale else 'miss')
+
+
+def get_resource_name():
+    """
+    Returns the resource class serving the request, or the endpoint name
+    for plain Flask views. Unrouted requests share one label.
+    """
+    if request.endpoint is None:
+        return 'unmatched'
+    view = current_app.view_functions.get(request.endpoint)
+    view_class = getattr(view, 'view_class', None)
+    return view_class.__name__ if view_class is not None else request.endpoint
+
+
+def get_metrics_resource():
+    """
+    The resource label of the current request, 'background' outside of one.
+    """
+    if has_request_context():
+        return g.get('metrics_resource', 'unmatched')
+    return 'background'
+
+
+def start_request_timer():
+    g.metrics_resource = get_resource_name()
+    g.metrics_start = time.perf_counter()
+    REQUESTS_IN_FLIGHT.inc(g.metrics_resource)
+
+
+def record_response_status(response):
+    g.metrics_status = response.status_code
+    return response
+
+
+def observe_request(exception=None):
+    start = g.pop('metrics_start', None)
+    if start is None:
+        return
+
+    resource = g.pop('metrics_resource')
+    status = g.pop('metrics_status', 500)
+    REQUEST_LATENCY.observe(time.perf_counter() - start, resource, request.method)
+    REQUESTS.inc(resource, request.method, str(status))
+    REQUESTS_IN_FLIGHT.dec(resource)
+
+
+def init_metrics(app):
+    app.before_request(start_request_timer)
+    app.after_request(record_response_status)
+    app.teardown_request(observe_request)
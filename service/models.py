@@ -13,14 +13,45 @@ class UserModel(db.Model):
         return f"User(username= {self.username}, pref_langs={self.pref_langs})"
 
 
+class CredentialModel(db.Model):
+    __tablename__ = 'credentials'
+    # SHA-256 of the temp_token of the login the credentials belong to
+    token_digest = db.Column(db.String(64), primary_key=True)
+    user_id = db.Column(db.Integer, nullable=False, index=True)
+    # The encrypted OAuth access token, see service.credentials
+    data = db.Column(db.LargeBinary, nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f"Credential(user_id= {self.user_id})"
+
+
+class FormLeaseModel(db.Model):
+    __tablename__ = 'form_leases'
+    form_id = db.Column(db.String(50), primary_key=True)
+    # The user or client address the form was handed out to
+    holder = db.Column(db.String(120), nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+
+    def __repr__(self):
+        return f"FormLease(form_id= {self.form_id}, holder={self.holder})"
+
+
 class ContributionModel(db.Model):
     __tablename__ = 'contributions'
+    __table_args__ = (
+        db.Index('ix_contributions_wd_item_revision_id', 'wd_item', 'revision_id'),
+    )
     id = db.Column(db.Integer, primary_key=True, index=True)
     wd_item = db.Column(db.String(150))
     username = db.Column(db.String(80))
     lang_code = db.Column(db.String(25))
     edit_type = db.Column(db.String(150))
     data = db.Column(db.Text)
+    form_id = db.Column(db.String(50), index=True)
+    sense_id = db.Column(db.String(50), index=True)
+    revision_id = db.Column(db.Integer)
+    file_name = db.Column(db.String(255), index=True)
     date = db.Column(db.Date, nullable=False,
                      default=datetime.now().strftime('%Y-%m-%d'))
 
@@ -30,3 +61,25 @@ class ContributionModel(db.Model):
                self.username,
                self.lang_code,
                self.date)
+
+
+class ContributionStatModel(db.Model):
+    __tablename__ = 'contribution_stats'
+    __table_args__ = (
+        db.UniqueConstraint('username', 'lang_code', 'edit_type', 'day',
+                            name='uq_contribution_stats_group'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    username = db.Column(db.String(80), nullable=False, index=True)
+    lang_code = db.Column(db.String(25), nullable=False, index=True)
+    edit_type = db.Column(db.String(150), nullable=False)
+    day = db.Column(db.Date, nullable=False, index=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return "ContributionStat({}, {}, {}, {}, {})".format(
+               self.username,
+               self.lang_code,
+               self.edit_type,
+               self.day,
+               self.count)
@@ -0,0 +1,168 @@
+import math
+import threading
+import time
+from collections import OrderedDict
+from flask import current_app, jsonify, request
+from common import rate_limits, rate_limit_shared, rate_limit_max_keys
+from service.cache import cache
+from service.metrics import RATE_LIMITED
+
+# Full buckets are purged from the shared store once every this many decisions
+PURGE_INTERVAL = 1000
+
+
+def parse_rate_limits(value):
+    """
+    {resource class: (burst, tokens per second)} of a setting such as
+    'search=60/60,edit=30/60': 60 search requests per 60 seconds. A count
+    of 0 leaves the class unlimited. Raises ValueError naming the item
+    that is not a valid limit.
+    """
+    limits = {}
+    for item in filter(None, (part.strip() for part in value.split(','))):
+        name, _, limit = item.partition('=')
+        count, _, seconds = limit.partition('/')
+        try:
+            count, seconds = int(count), float(seconds or 1)
+        except ValueError:
+            count = seconds = None
+        if not name.strip() or count is None or count < 0 or not seconds > 0:
+            raise ValueError(f'Invalid RATE_LIMITS item {item!r}, expected '
+                             f'<class>=<requests>/<seconds>')
+        if count:
+            limits[name.strip()] = (count, count / seconds)
+    return limits
+
+
+class TokenBuckets:
+    """
+    Token buckets of one process. A key may make `capacity` requests in a
+    burst and gets `rate` tokens back per second. Beyond `max_keys`, the least
+    recently used keys are dropped and start again with a full bucket.
+    """
+
+    def __init__(self, max_keys):
+        self.max_keys = max_keys
+        self.buckets = OrderedDict()
+        self.lock = threading.Lock()
+
+    def take(self, key, capacity, rate, now):
+        """
+        Takes a token of `key`. Returns 0 when there was one, otherwise the
+        seconds until there is.
+        """
+        with self.lock:
+            tokens, updated_at = self.buckets.pop(key, (capacity, now))
+            tokens = min(capacity, tokens + max(0, now - updated_at) * rate)
+            wait = 0.0
+            if tokens >= 1:
+                tokens -= 1
+            else:
+                wait = (1 - tokens) / rate
+            self.buckets[key] = (tokens, now)
+            if len(self.buckets) > self.max_keys:
+                self.buckets.popitem(last=False)
+            return wait
+
+
+class SharedTokenBuckets:
+    """
+    Token buckets in the SQLite store shared by the workers of a host, see
+    service.cache. Each decision is one upsert of the key's row.
+    """
+
+    def __init__(self, store, max_refill_time):
+        self.store = store
+        self.max_refill_time = max_refill_time
+        self.decisions = 0
+        self.threads = threading.local()
+
+    def take(self, key, capacity, rate, now):
+        connection = self.store.get_connection()
+        if not getattr(self.threads, 'ready', False):
+            connection.execute('CREATE TABLE IF NOT EXISTS rate_limits (key TEXT PRIMARY KEY, '
+                               'tokens REAL, updated_at REAL, granted INTEGER)')
+            self.threads.ready = True
+        # The expressions of SET read the row before the update
+        tokens, granted = connection.execute(
+            'INSERT INTO rate_limits (key, tokens, updated_at, granted) '
+            'VALUES (:key, :capacity - 1, :now, 1) '
+            'ON CONFLICT (key) DO UPDATE SET '
+            'tokens = MIN(:capacity, tokens + MAX(0, :now - updated_at) * :rate) '
+            '- (MIN(:capacity, tokens + MAX(0, :now - updated_at) * :rate) >= 1), '
+            'granted = MIN(:capacity, tokens + MAX(0, :now - updated_at) * :rate) >= 1, '
+            'updated_at = :now '
+            'RETURNING tokens, granted',
+            {'key': key, 'capacity': capacity, 'rate': rate, 'now': now}).fetchone()
+
+        self.decisions += 1
+        if self.decisions % PURGE_INTERVAL == 0:
+            connection.execute('DELETE FROM rate_limits WHERE updated_at < ?',
+                               (now - self.max_refill_time,))
+        return 0.0 if granted else (1 - tokens) / rate
+
+
+limits = parse_rate_limits(rate_limits)
+
+
+def make_buckets():
+    if rate_limit_shared and cache.shared is not None:
+        max_refill_time = max((capacity / rate for capacity, rate in limits.values()), default=0)
+        return SharedTokenBuckets(cache.shared, max_refill_time)
+    return TokenBuckets(rate_limit_max_keys)
+
+
+buckets = make_buckets()
+
+
+def get_rate_limit_class():
+    """
+    The `rate_limit` class of the resource serving the request, if any.
+    """
+    view = current_app.view_functions.get(request.endpoint) if request.endpoint else None
+    return getattr(getattr(view, 'view_class', None), 'rate_limit', None)
+
+
+def get_rate_limit_key():
+    """
+    The user of the request token, as token_required and optional_token
+    resolve it, or the client address.
+    """
+    # require_token needs the db of the service package
+    from service.require_token import TokenError, get_request_token, resolve_principal
+
+    token = get_request_token()
+    if token:
+        try:
+            _, user = resolve_principal(token)
+            return f'user:{user.id}'
+        except TokenError:
+            pass
+    return f'ip:{request.remote_addr}'
+
+
+def check_rate_limit():
+    resource_class = get_rate_limit_class()
+    limit = limits.get(resource_class)
+    if limit is None:
+        return None
+
+    capacity, rate = limit
+    wait = buckets.take(f'{resource_class}:{get_rate_limit_key()}', capacity, rate, time.time())
+    if not wait:
+        return None
+
+    RATE_LIMITED.inc(resource_class)
+    retry_after = max(1, math.ceil(wait))
+    response = jsonify({'message': f'Too many requests, please retry in {retry_after} seconds.'})
+    response.status_code = 429
+    response.headers['Retry-After'] = str(retry_after)
+    return response
+
+
+def init_rate_limit(app):
+    """
+    Limits the requests to the resources with a `rate_limit` class, per
+    user or client address, with the RATE_LIMITS of that class.
+    """
+    app.before_request(check_rate_limit)
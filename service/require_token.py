@@ -1,9 +1,14 @@
-from flask import request, jsonify, abort
+from flask import request, jsonify, abort, g, has_request_context
 from functools import wraps
+from collections import OrderedDict
+import hashlib
+import threading
+import time
 import jwt
-from service import app
-from common import consumer_secret
+from service import db
+from common import consumer_secret, token_cache_ttl, token_cache_size
 from service.models import UserModel
+from service.metrics import record_cache_lookup
 
 
 class TokenError(Exception):
@@ -28,60 +33,171 @@ class TokenDecodeError(TokenError):
         super().__init__(message, 500)
 
 
+class PrincipalCache:
+    """
+    Verified tokens keyed by their SHA-256 digest.
+
+    An entry holds the decoded claims and the id of the user they belong to,
+    and never outlives the `exp` claim of its token. Entries are per worker,
+    so callers still check the user's temp_token against the claims to catch
+    logouts that happened in another worker.
+    """
+
+    def __init__(self, max_size, max_ttl):
+        self.max_size = max_size
+        self.max_ttl = max_ttl
+        self.entries = OrderedDict()
+        self.user_digests = {}
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def digest(token):
+        return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+    def get(self, token):
+        key = self.digest(token)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= time.time():
+                self._remove(key)
+                return None
+            self.entries.move_to_end(key)
+            return entry[1], entry[2]
+
+    def set(self, token, claims, user_id):
+        key = self.digest(token)
+        expires_at = min(claims.get('exp', 0), time.time() + self.max_ttl)
+        with self.lock:
+            self._remove(key)
+            self.entries[key] = (expires_at, claims, user_id)
+            self.user_digests.setdefault(user_id, set()).add(key)
+            while len(self.entries) > self.max_size:
+                self._remove(next(iter(self.entries)))
+
+    def invalidate(self, token):
+        with self.lock:
+            self._remove(self.digest(token))
+
+    def invalidate_user(self, user_id):
+        with self.lock:
+            for key in list(self.user_digests.get(user_id, ())):
+                self._remove(key)
+
+    def _remove(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            return
+        digests = self.user_digests.get(entry[2])
+        if digests is not None:
+            digests.discard(key)
+            if not digests:
+                del self.user_digests[entry[2]]
+
+
+principal_cache = PrincipalCache(token_cache_size, token_cache_ttl)
+
+# The environ key of the principal a /batch request resolved for its sub-requests
+BATCH_PRINCIPAL = 'agpb.batch_principal'
+
+
+def get_request_token():
+    # Check for token in Authorization header (Bearer token)
+    auth_header = request.headers.get('Authorization')
+    if auth_header and auth_header.startswith('Bearer '):
+        return auth_header.split(' ')[1]
+    # Fallback to x-access-tokens header for backward compatibility
+    return request.headers.get('x-access-tokens')
+
+
+def get_batch_principal(token):
+    """
+    (claims, user id) of `token` when the request is a sub-request of a
+    /batch request that has resolved it already.
+    """
+    principal = request.environ.get(BATCH_PRINCIPAL) if has_request_context() else None
+    if principal is not None and principal[0] == token:
+        return principal[1:]
+    return None
+
+
+def resolve_principal(token):
+    """
+    Returns the decoded claims of `token` and the user it was issued to.
+
+    The JWT is decoded at most once per cache lifetime; each call costs one
+    primary key lookup on a cache hit and one temp_token lookup on a miss.
+    """
+    cached = get_batch_principal(token)
+    if cached is None:
+        cached = principal_cache.get(token)
+        record_cache_lookup('token', cached is not None)
+    if cached:
+        claims, user_id = cached
+        user = db.session.get(UserModel, user_id)
+        if user and user.temp_token == claims['token']:
+            return claims, user
+        principal_cache.invalidate(token)
+        raise PermissionDeniedError("User not found or token invalid.")
+
+    try:
+        claims = jwt.decode(token, consumer_secret, algorithms=["HS256"])
+    except jwt.ExpiredSignatureError:
+        raise TokenExpiredError("Token has expired.")
+    except jwt.InvalidTokenError:
+        raise InvalidTokenError("Invalid token.")
+    except Exception as e:
+        raise InvalidTokenError(f"Error decoding token: {str(e)}")
+
+    user = UserModel.query.filter_by(temp_token=claims.get('token')).first()
+    if not user:
+        raise PermissionDeniedError("User not found or token invalid.")
+
+    principal_cache.set(token, claims, user.id)
+    return claims, user
+
+
+def invalidate_user_tokens(user):
+    """
+    Drops every cached token of `user`, call it whenever temp_token changes.
+    """
+    principal_cache.invalidate_user(user.id)
+
+
 def token_required(f):
     @wraps(f)
     def inner(*args, **kwargs):
-        token = None
-        
-        # Check for token in Authorization header (Bearer token)
-        auth_header = request.headers.get('Authorization')
-        if auth_header and auth_header.startswith('Bearer '):
-            token = auth_header.split(' ')[1]
-        # Fallback to x-access-tokens header for backward compatibility
-        elif 'x-access-tokens' in request.headers:
-            token = request.headers['x-access-tokens']
-        
+        token = get_request_token()
         if token is None:
             abort(401, description="Token is required. Please provide Authorization header with Bearer token or x-access-tokens header.")
-        
+
         try:
-            data = jwt.decode(token, consumer_secret, algorithms=["HS256"])
-        except jwt.ExpiredSignatureError:
-            abort(401, description="Token has expired.")
-        except jwt.InvalidTokenError:
-            abort(401, description="Invalid token.")
-        except Exception as e:
-            abort(401, description=f"Error decoding token: {str(e)}")
-        
-        current_user = UserModel.query.filter_by(temp_token=data['token']).first()
-        if not current_user:
-            abort(401, description="User not found or token invalid.")
-        
-        return f(current_user, *args, **kwargs)
+            claims, current_user = resolve_principal(token)
+        except TokenError as e:
+            abort(e.status_code, description=str(e))
+
+        # Handlers read the claims from here instead of decoding the token again
+        g.token_claims = claims
+        g.current_user = current_user
+        # Decorated handlers are methods: pass the user after `self`
+        return f(*args[:1], current_user, *args[1:], **kwargs)
     return inner
 
 
 def optional_token(f):
     @wraps(f)
     def inner(*args, **kwargs):
-        token = None
-        
-        # Check for token in Authorization header (Bearer token)
-        auth_header = request.headers.get('Authorization')
-        if auth_header and auth_header.startswith('Bearer '):
-            token = auth_header.split(' ')[1]
-        # Fallback to x-access-tokens header for backward compatibility
-        elif 'x-access-tokens' in request.headers:
-            token = request.headers['x-access-tokens']
-        
+        token = get_request_token()
+
         current_user = None
         if token:
             try:
-                data = jwt.decode(token, consumer_secret, algorithms=["HS256"])
-                current_user = UserModel.query.filter_by(temp_token=data['token']).first()
-            except (jwt.ExpiredSignatureError, jwt.InvalidTokenError, Exception):
+                g.token_claims, current_user = resolve_principal(token)
+            except TokenError:
                 # Token is invalid but we don't fail the request
                 pass
-        
-        return f(current_user, *args, **kwargs)
+
+        g.current_user = current_user
+        return f(*args[:1], current_user, *args[1:], **kwargs)
     return inner
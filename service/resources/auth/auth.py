@@ -1,11 +1,15 @@
 from datetime import datetime, timedelta
-import mwoauth
 import json
 import jwt
 from flask import abort, jsonify, request, make_response
-from flask_restful import (Resource, reqparse, fields, marshal_with)
+from flask_restful import (Resource, reqparse, fields)
+from service.serializer import marshal_with
 from service.models import UserModel
 from service import db
+from service.credentials import (store_credentials, delete_credentials,
+                                 get_credentials_key_error)
+from service.require_token import invalidate_user_tokens
+from service.resources.wikidata.utils import warm_up_languages
 from common import (auth_base_url, consumer_key, dev_fe_url, prod_fe_url,
                     consumer_secret, is_dev)
 from .utils import generate_random_token
@@ -26,6 +30,8 @@ authGetFields = {
 class AuthGet(Resource):
     @marshal_with(authGetFields)
     def get(self):
+        import mwoauth
+
         consumer_token = mwoauth.ConsumerToken(
             consumer_key, consumer_secret)
         try:
@@ -45,12 +51,19 @@ class AuthGet(Resource):
 class AuthCallBackPost(Resource):
     @marshal_with(authFields)
     def post(self):
+        import mwoauth
+
         # Parse request data
         parser = reqparse.RequestParser()
         parser.add_argument('request_token', type=str, required=True, help='Request token is required')
         parser.add_argument('query_string', type=str, required=True, help='Query string is required')
         args = parser.parse_args()
         
+        # The access token can only be kept encrypted on the server
+        key_error = get_credentials_key_error()
+        if key_error:
+            abort(503, f'Logins are disabled: {key_error}')
+
         try:
             # Parse the request token from JSON
             request_token_dict = json.loads(args['request_token'])
@@ -81,13 +94,16 @@ class AuthCallBackPost(Resource):
         if user:
             # User already exists, update the temp token
             user.temp_token = generate_random_token()
+            store_credentials(user, user.temp_token, access_token.key, access_token.secret)
             db.session.commit()
+            invalidate_user_tokens(user)
+            # The access token stays on the server, the JWT only references it
             token = jwt.encode({
                 'token': user.temp_token,
-                'access_token': dict(zip(access_token._fields, access_token)),
                 'exp': datetime.utcnow() + timedelta(minutes=60*60)
             }, consumer_secret, "HS256")
-            
+
+            warm_up_languages(user.pref_langs.split(','), f'user:{user.id}')
             return {
                 'token': token,
                 'username': user.username,
@@ -102,6 +118,9 @@ class AuthCallBackPost(Resource):
             )
             db.session.add(new_user)
             try:
+                db.session.flush()
+                store_credentials(new_user, new_user.temp_token, access_token.key,
+                                  access_token.secret)
                 db.session.commit()
             except Exception as e:
                 db.session.rollback()
@@ -111,10 +130,10 @@ class AuthCallBackPost(Resource):
                 
             token = jwt.encode({
                 'token': new_user.temp_token,
-                'access_token': dict(zip(access_token._fields, access_token)),
                 'exp': datetime.utcnow() + timedelta(minutes=45)
             }, consumer_secret, "HS256")
-            
+
+            warm_up_languages(new_user.pref_langs.split(','), f'user:{new_user.id}')
             return {
                 'token': token,
                 'username': new_user.username,
@@ -136,8 +155,10 @@ class AuthLogout(Resource):
             
             if user:
                 # Invalidate the token by generating a new one
+                delete_credentials(user, data['token'])
                 user.temp_token = generate_random_token()
                 db.session.commit()
+                invalidate_user_tokens(user)
                 
             return make_response(jsonify({'message': 'Logged out successfully'}), 200)
         except jwt.InvalidTokenError:
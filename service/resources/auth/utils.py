@@ -1,6 +1,7 @@
 from uuid import uuid4
-from service import app
 from common import consumer_key, consumer_secret
+from service.credentials import (credential_cache, get_credentials, get_token_digest,
+                                 make_session)
 
 
 def generate_random_token():
@@ -10,14 +11,36 @@ def generate_random_token():
     return str(uuid4())
 
 
-def get_auth_object(data):
+def get_legacy_credentials(claims):
     """
-    Generates an authentication object from the provided data.
+    The credentials of the tokens issued before they were stored server
+    side, which carry the access token in their claims.
     """
+    access_token = claims.get('access_token')
+    if not access_token:
+        return None
+    digest = get_token_digest(claims['token'])
+    session = make_session(access_token['key'], access_token['secret'])
+    credential_cache.set(digest, access_token['key'], access_token['secret'], session)
+    return access_token['key'], access_token['secret'], session
+
+
+def get_auth_object(claims):
+    """
+    Generates the authentication object of the user of the token claims,
+    with the session signed with its access token, or None when its
+    credentials are not known.
+    """
+    credentials = get_credentials(claims['token']) or get_legacy_credentials(claims)
+    if credentials is None:
+        return None
+
+    access_token, access_secret, session = credentials
     auth_obj = {
         "consumer_key": consumer_key,
         "consumer_secret": consumer_secret,
-        "access_token": data.get('access_token')['key'],
-        "access_secret": data.get('access_token')['secret'],
+        "access_token": access_token,
+        "access_secret": access_secret,
+        "session": session,
     }
     return auth_obj
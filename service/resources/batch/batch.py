@@ -0,0 +1,40 @@
+from flask import abort, current_app, request
+from flask_restful import Resource
+from service.require_token import TokenError, get_request_token, resolve_principal
+from common import batch_max_requests
+
+from .utils import (FORWARDED_HEADERS, get_subrequest_path, get_view_class,
+                    is_valid_subrequest, run_batch)
+
+
+class BatchPost(Resource):
+    def post(self):
+        subrequests = request.get_json(silent=True)
+        if not subrequests:
+            abort(400, 'Request body is empty')
+        if type(subrequests) is not list or not all(map(is_valid_subrequest, subrequests)):
+            abort(400, 'Invalid request body')
+        if len(subrequests) > batch_max_requests:
+            abort(400, f'At most {batch_max_requests} requests per batch')
+
+        subrequests = [dict(subrequest, path=get_subrequest_path(subrequest['path']))
+                       for subrequest in subrequests]
+        app = current_app._get_current_object()
+        if any(get_view_class(app, subrequest['path'], subrequest['method']) is BatchPost
+               for subrequest in subrequests):
+            abort(400, 'Batches cannot be nested')
+
+        # The token is verified once for all the sub-requests
+        principal = None
+        token = get_request_token()
+        if token:
+            try:
+                claims, user = resolve_principal(token)
+            except TokenError as e:
+                abort(e.status_code, description=str(e))
+            principal = (token, claims, user.id)
+
+        headers = {name: request.headers[name] for name in FORWARDED_HEADERS
+                   if name in request.headers}
+        responses = run_batch(app, subrequests, headers, request.remote_addr, principal)
+        return {'responses': responses}, 200
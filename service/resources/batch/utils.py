@@ -0,0 +1,106 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+from werkzeug.exceptions import HTTPException
+from common import prefix, batch_workers
+from service.require_token import BATCH_PRINCIPAL
+
+logger = logging.getLogger('agpb.batch')
+
+executor = ThreadPoolExecutor(max_workers=batch_workers, thread_name_prefix='agpb-batch')
+
+METHODS = ('GET', 'POST', 'PATCH', 'DELETE')
+# Headers of the batch request passed on to its sub-requests
+FORWARDED_HEADERS = ('Authorization', 'x-access-tokens', 'User-Agent')
+# Headers of the sub-responses kept in the batch response
+RESPONSE_HEADERS = ('Retry-After', 'Warning', 'X-Next-Page')
+
+
+def is_valid_subrequest(subrequest):
+    return (isinstance(subrequest, dict)
+            and subrequest.get('method') in METHODS
+            and isinstance(subrequest.get('path'), str)
+            and subrequest['path'].startswith('/'))
+
+
+def get_subrequest_path(path):
+    """
+    The path of a sub-request under the API prefix, which the client may
+    leave out.
+    """
+    if not prefix or path == prefix or path.startswith(prefix + '/'):
+        return path
+    return prefix + path
+
+
+def get_view_class(app, path, method):
+    try:
+        endpoint, _ = app.url_map.bind('localhost').match(urlsplit(path).path, method=method)
+    except HTTPException:
+        return None
+    return getattr(app.view_functions.get(endpoint), 'view_class', None)
+
+
+def make_subresponse(response):
+    body = response.get_json(silent=True) if response.is_json else None
+    if body is None and response.get_data():
+        body = response.get_data(as_text=True)
+    return {
+        'status': response.status_code,
+        'headers': {name: response.headers[name] for name in RESPONSE_HEADERS
+                    if name in response.headers},
+        'body': body,
+    }
+
+
+def run_subrequest(app, subrequest, headers, environ):
+    """
+    Dispatches `subrequest` through `app` in a request context of its own,
+    with the before and after request hooks of a regular request.
+    """
+    with app.test_request_context(subrequest['path'], method=subrequest['method'],
+                                  json=subrequest.get('body'), headers=headers,
+                                  environ_base=environ):
+        try:
+            response = app.full_dispatch_request()
+        except Exception as e:
+            logger.exception('Sub-request %s %s failed: %s', subrequest['method'],
+                             subrequest['path'], e)
+            return {'status': 500, 'headers': {},
+                    'body': {'message': 'Internal Server Error'}}
+        return make_subresponse(response)
+
+
+def group_subrequests(app, subrequests):
+    """
+    Splits `subrequests` into runs of consecutive ones that may run in
+    parallel: GET requests and those of `batch_parallel` resources, which
+    only read. Every other sub-request is a run of its own, so an edit sees
+    the effects of the sub-requests before it.
+    """
+    groups = []
+    for index, subrequest in enumerate(subrequests):
+        view_class = get_view_class(app, subrequest['path'], subrequest['method'])
+        parallel = subrequest['method'] == 'GET' or getattr(view_class, 'batch_parallel', False)
+        if parallel and groups and groups[-1][0]:
+            groups[-1][1].append(index)
+        else:
+            groups.append((parallel, [index]))
+    return [indexes for _, indexes in groups]
+
+
+def run_batch(app, subrequests, headers, remote_addr, principal):
+    """
+    The responses of `subrequests`, in their order. `principal` is the
+    (token, claims, user id) resolved from the batch request, if any, which
+    the sub-requests use instead of verifying the token again.
+    """
+    environ = {'REMOTE_ADDR': remote_addr, BATCH_PRINCIPAL: principal}
+    responses = [None] * len(subrequests)
+    for indexes in group_subrequests(app, subrequests):
+        futures = [(index, executor.submit(run_subrequest, app, subrequests[index], headers,
+                                           environ))
+                   for index in indexes]
+        for index, future in futures:
+            responses[index] = future.result()
+    return responses
@@ -1,6 +1,6 @@
 from flask import abort
-from flask_restful import (Resource, reqparse,
-                           fields, marshal_with)
+from flask_restful import (Resource, reqparse, fields)
+from service.serializer import marshal_with
 
 from .utils import get_media_url_by_title
 
@@ -17,6 +17,9 @@ mediaFields = {
 
 
 class CommonsFIleUrLPost(Resource):
+    rate_limit = 'read'
+    batch_parallel = True
+
     @marshal_with(mediaFields)
     def post(self, titles):
         args = media_args.parse_args()
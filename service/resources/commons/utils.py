@@ -1,20 +1,34 @@
 import io
-import requests
-from service.resources.wikidata.utils import make_api_request
-from common import commons_url, consumer_key, consumer_secret
-from service.resources.utils import generate_csrf_token, get_user_agent
+from common import commons_url, cache_commons_url_ttl
+from service.cache import cached_read
+from service.resources.utils import (make_api_request, generate_csrf_token, get_user_agent,
+                                     post_api_request)
 
 
-def get_media_url_by_title(file_titles):
-    PARAMS = {
+def get_media_url_params(file_titles):
+    return {
         "action": "query",
         "titles": file_titles,
         "prop": "imageinfo",
         "iiprop": "url",
         "format": "json"
     }
-    media_data = make_api_request(commons_url, PARAMS, get_user_agent())
 
+
+def get_media_url_cache_key(file_titles):
+    return f'media_url/{file_titles}'
+
+
+def get_media_url_by_title(file_titles):
+    media_data = cached_read(get_media_url_cache_key(file_titles), cache_commons_url_ttl,
+                             commons_url,
+                             lambda: make_api_request(commons_url,
+                                                      get_media_url_params(file_titles),
+                                                      get_user_agent()))
+    return process_media_urls(media_data)
+
+
+def process_media_urls(media_data):
     if 'status_code' in list(media_data.keys()):
         return media_data
 
@@ -39,11 +53,7 @@ def get_media_url_by_title(file_titles):
 
 
 def upload_file(file_data, username, lang_label, auth, file_name):
-    csrf_token, api_auth_token = generate_csrf_token(commons_url,
-                                                    consumer_key,
-                                                    consumer_secret,
-                                                    auth['access_token'],
-                                                    auth['access_secret'])
+    csrf_token, session = generate_csrf_token(commons_url, auth)
     params = {}
     params['action'] = 'upload'
     params['format'] = 'json'
@@ -53,10 +63,10 @@ def upload_file(file_data, username, lang_label, auth, file_name):
                      "AGPB-" + lang_label + "-Pronunciation]]"
 
     try:
-        response = requests.post(commons_url,
-                                data=params,
-                                auth=api_auth_token,
-                                files={'file': io.BytesIO(file_data)})
+        response = post_api_request(commons_url,
+                                    data=params,
+                                    session=session,
+                                    files={'file': io.BytesIO(file_data)})
     except Exception as e:
         print('Failed upload response ', str(e))
     if response.status_code != 200:
@@ -1,9 +1,14 @@
+import datetime
 from flask import abort
-from flask import request
-from flask_restful import (Resource, reqparse,
-                           fields, marshal_with)
+from flask import request, Response, stream_with_context
+from flask_restful import (Resource, reqparse, fields)
+from service.serializer import marshal_with
 from service.models import ContributionModel
 from service import db
+from .utils import (get_contribution_stats, get_contribution_leaderboard,
+                    filter_contributions, iter_contribution_rows,
+                    encode_contribution_rows, gzip_chunks, record_contribution,
+                    update_contribution, delete_contribution)
 
 # Used for validateion
 contrib_args = reqparse.RequestParser()
@@ -12,6 +17,47 @@ contrib_args.add_argument('lang_code', type=str, help="Provide contribution lang
 contrib_args.add_argument('edit_type', type=str, help="Please provide the type of edit")
 contrib_args.add_argument('data', type=str, help="Please provide the edit data")
 
+contrib_list_args = reqparse.RequestParser()
+contrib_list_args.add_argument('username', type=str, location='args', help="Filter by username")
+contrib_list_args.add_argument('lang_code', type=str, location='args', help="Filter by language")
+contrib_list_args.add_argument('edit_type', type=str, location='args', help="Filter by type of edit")
+contrib_list_args.add_argument('wd_item', type=str, location='args', help="Filter by edited item")
+contrib_list_args.add_argument('form_id', type=str, location='args', help="Filter by edited form")
+contrib_list_args.add_argument('sense_id', type=str, location='args', help="Filter by edited sense")
+contrib_list_args.add_argument('file_name', type=str, location='args', help="Filter by uploaded file")
+contrib_list_args.add_argument('start_date', type=datetime.date.fromisoformat, location='args',
+                               help="Start date should be formatted as YYYY-MM-DD")
+contrib_list_args.add_argument('end_date', type=datetime.date.fromisoformat, location='args',
+                               help="End date should be formatted as YYYY-MM-DD")
+
+contrib_export_args = contrib_list_args.copy()
+contrib_export_args.add_argument('format', type=str, location='args', default='ndjson',
+                                 choices=('ndjson', 'csv'), help="Export format: ndjson or csv")
+contrib_export_args.add_argument('after_id', type=int, location='args',
+                                 help="Resume the export after this contribution id")
+contrib_export_args.add_argument('compress', type=str, location='args',
+                                 choices=('gzip', 'none'), help="Compression: gzip or none")
+
+export_content_types = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv'
+}
+
+stats_args = reqparse.RequestParser()
+stats_args.add_argument('username', type=str, location='args', help="Filter by username")
+stats_args.add_argument('lang_code', type=str, location='args', help="Filter by language")
+stats_args.add_argument('edit_type', type=str, location='args', help="Filter by type of edit")
+stats_args.add_argument('start_date', type=datetime.date.fromisoformat, location='args',
+                        help="Start date should be formatted as YYYY-MM-DD")
+stats_args.add_argument('end_date', type=datetime.date.fromisoformat, location='args',
+                        help="End date should be formatted as YYYY-MM-DD")
+stats_args.add_argument('group_by', type=str, location='args', default='lang_code,edit_type',
+                        help="Comma separated list of username, lang_code, edit_type, day")
+stats_args.add_argument('limit', type=int, location='args', default=10,
+                        help="Number of users in the leaderboard")
+
+stats_groups = ['username', 'lang_code', 'edit_type', 'day']
+
 
 # Used for serialization
 contributionFields = {
@@ -20,30 +66,69 @@ contributionFields = {
     'username': fields.String,
     'lang_code': fields.String,
     'edit_type': fields.String,
-    'data': fields.String
+    'data': fields.String,
+    'form_id': fields.String,
+    'sense_id': fields.String,
+    'revision_id': fields.Integer(default=None),
+    'file_name': fields.String
+}
+
+contributionStatFields = {
+    'username': fields.String,
+    'lang_code': fields.String,
+    'edit_type': fields.String,
+    'day': fields.String,
+    'count': fields.Integer
+}
+
+leaderboardFields = {
+    'rank': fields.Integer,
+    'username': fields.String,
+    'count': fields.Integer
 }
 
 
 class ContributionsGet(Resource):
     @marshal_with(contributionFields)
     def get(self):
-        username = request.args.get('username')
-        if username:
-            contributions = ContributionModel.query.filter_by(username=username).all()     
-        else:
-            contributions = ContributionModel.query.all()
+        args = contrib_list_args.parse_args()
+        contributions = filter_contributions(ContributionModel.query, args).all()
         return contributions
 
 
+class ContributionsExport(Resource):
+    def get(self):
+        args = contrib_export_args.parse_args()
+        export_format = args['format']
+
+        # Without an explicit choice, compress when the client accepts it
+        compress = args['compress']
+        if compress is None:
+            compress = 'gzip' if 'gzip' in request.accept_encodings else 'none'
+
+        chunks = encode_contribution_rows(iter_contribution_rows(args, args['after_id']),
+                                          export_format)
+        headers = {
+            'Content-Disposition': f'attachment; filename=contributions.{export_format}'
+        }
+        if compress == 'gzip':
+            chunks = gzip_chunks(chunks)
+            headers['Content-Encoding'] = 'gzip'
+
+        return Response(stream_with_context(chunks),
+                        content_type=export_content_types[export_format],
+                        headers=headers)
+
+
 class ContributionPost(Resource):
     @marshal_with(contributionFields)
     def post(self):
         args = contrib_args.parse_args()
-        contribution = ContributionModel(username=args['username'],
-                                         lang_code=args['lang_code'],
-                                         edit_type=args['edit_type'],
-                                         data=['data'])
-        db.session.add(contribution)
+        record_contribution(wd_item=None,
+                            username=args['username'],
+                            lang_code=args['lang_code'],
+                            edit_type=args['edit_type'],
+                            data=args['data'])
         db.session.commit()
         contributions = ContributionModel.query.all()
         return contributions, 201
@@ -66,10 +151,11 @@ class ContributionPatch(Resource):
         if not contribution:
             abort(400, "Contribution not found")
 
-        contribution.username = args["username"]
-        contribution.lang_code = args["lang_code"]
-        contribution.edit_type = args["edit_type"]  # for the same type no update
-        contribution.data = args["data"]
+        update_contribution(contribution,
+                            username=args["username"],
+                            lang_code=args["lang_code"],
+                            edit_type=args["edit_type"],  # for the same type no update
+                            data=args["data"])
         db.session.commit()
         return contribution, 200
 
@@ -80,7 +166,28 @@ class ContributionDelete(Resource):
         contribution = ContributionModel.query.filter_by(id=id).first()
         if not contribution:
             abort(400, "User not found")
-        db.session.delete(contribution)
+        delete_contribution(contribution)
         db.session.commit()
         contributions = ContributionModel.query.all()
         return contributions, 204
+
+
+class ContributionsStatsGet(Resource):
+    @marshal_with(contributionStatFields)
+    def get(self):
+        args = stats_args.parse_args()
+        group_by = [group.strip() for group in args['group_by'].split(',') if group.strip()]
+        if any(group not in stats_groups for group in group_by):
+            abort(400, f'group_by only accepts: {", ".join(stats_groups)}')
+
+        return get_contribution_stats(args, group_by), 200
+
+
+class ContributionsLeaderboardGet(Resource):
+    @marshal_with(leaderboardFields)
+    def get(self):
+        args = stats_args.parse_args()
+        if args['limit'] < 1:
+            abort(400, 'Limit should be a positive number')
+
+        return get_contribution_leaderboard(args, args['limit']), 200
@@ -0,0 +1,301 @@
+import csv
+import datetime
+import io
+import json
+import zlib
+from sqlalchemy import delete, func, select, update
+from service import db
+from service.database import get_conflict_insert
+from service.models import ContributionModel, ContributionStatModel
+
+
+def get_contribution_day(date):
+    """
+    Returns the calendar day a contribution date belongs to.
+    """
+    if date is None:
+        return datetime.date.today()
+    if isinstance(date, datetime.datetime):
+        return date.date()
+    if isinstance(date, str):
+        return datetime.date.fromisoformat(date[:10])
+    return date
+
+
+def increment_contribution_stat(username, lang_code, edit_type, day, amount=1):
+    """
+    Adds `amount` to the rollup row of a (username, lang_code, edit_type, day)
+    group in the current session. The caller owns the commit, so the rollup
+    lands in the same transaction as the contribution it counts.
+
+    The row is upserted, so concurrent first contributions of a group add up
+    instead of failing on its unique constraint. A negative `amount` drops
+    the row once it counts nothing.
+    """
+    group = {
+        'username': username or '',
+        'lang_code': lang_code or '',
+        'edit_type': edit_type or '',
+        'day': day
+    }
+    if amount < 0:
+        db.session.execute(
+            update(ContributionStatModel)
+            .filter_by(**group)
+            .values(count=ContributionStatModel.count + amount)
+        )
+        db.session.execute(
+            delete(ContributionStatModel)
+            .filter_by(**group)
+            .where(ContributionStatModel.count <= 0)
+        )
+        return
+
+    insert = get_conflict_insert(db.engine.dialect.name)
+    db.session.execute(
+        insert(ContributionStatModel)
+        .values(count=amount, **group)
+        .on_conflict_do_update(index_elements=list(group),
+                               set_={'count': ContributionStatModel.count + amount})
+    )
+
+
+def record_contribution(wd_item, username, lang_code, edit_type, data, date=None,
+                        form_id=None, sense_id=None, revision_id=None, file_name=None):
+    """
+    Adds a contribution and updates its statistics rollup. Nothing is
+    committed here, call db.session.commit() once the caller is done.
+    """
+    date = date or datetime.datetime.now()
+    contribution = ContributionModel(wd_item=wd_item,
+                                     username=username,
+                                     lang_code=lang_code,
+                                     edit_type=edit_type,
+                                     data=data,
+                                     date=date,
+                                     form_id=form_id,
+                                     sense_id=sense_id,
+                                     revision_id=revision_id,
+                                     file_name=file_name)
+    db.session.add(contribution)
+    increment_contribution_stat(username, lang_code, edit_type,
+                                get_contribution_day(date))
+    return contribution
+
+
+def update_contribution(contribution, **columns):
+    """
+    Changes the `columns` of a contribution and moves it from the rollup
+    group it was counted in to its new one. Nothing is committed here.
+    """
+    day = get_contribution_day(contribution.date)
+    increment_contribution_stat(contribution.username, contribution.lang_code,
+                                contribution.edit_type, day, -1)
+    for column, value in columns.items():
+        setattr(contribution, column, value)
+    increment_contribution_stat(contribution.username, contribution.lang_code,
+                                contribution.edit_type, day)
+
+
+def delete_contribution(contribution):
+    """
+    Deletes a contribution and uncounts it from its rollup group. Nothing is
+    committed here.
+    """
+    increment_contribution_stat(contribution.username, contribution.lang_code,
+                                contribution.edit_type,
+                                get_contribution_day(contribution.date), -1)
+    db.session.delete(contribution)
+
+
+def rebuild_contribution_stats():
+    """
+    Recomputes the whole rollup table from the contributions table.
+    Returns the number of groups written.
+    """
+    day = func.date(ContributionModel.date)
+    groups = db.session.query(ContributionModel.username,
+                              ContributionModel.lang_code,
+                              ContributionModel.edit_type,
+                              day,
+                              func.count(ContributionModel.id)) \
+        .group_by(ContributionModel.username, ContributionModel.lang_code,
+                  ContributionModel.edit_type, day) \
+        .all()
+
+    totals = {}
+    for username, lang_code, edit_type, date, count in groups:
+        key = (username or '', lang_code or '', edit_type or '',
+               get_contribution_day(date))
+        totals[key] = totals.get(key, 0) + count
+
+    db.session.query(ContributionStatModel).delete()
+    db.session.add_all([
+        ContributionStatModel(username=username, lang_code=lang_code,
+                              edit_type=edit_type, day=day, count=count)
+        for (username, lang_code, edit_type, day), count in totals.items()
+    ])
+    db.session.commit()
+    return len(totals)
+
+
+def filter_contribution_stats(query, args):
+    """
+    Applies the optional username, lang_code, edit_type, start_date and
+    end_date filters to a query over the rollup table.
+    """
+    for column in ['username', 'lang_code', 'edit_type']:
+        if args.get(column):
+            query = query.filter(getattr(ContributionStatModel, column) == args[column])
+    if args.get('start_date'):
+        query = query.filter(ContributionStatModel.day >= args['start_date'])
+    if args.get('end_date'):
+        query = query.filter(ContributionStatModel.day <= args['end_date'])
+    return query
+
+
+def get_contribution_stats(args, group_by):
+    """
+    Sums the rollup counts per group of the requested `group_by` columns.
+    """
+    columns = [getattr(ContributionStatModel, column) for column in group_by]
+    query = db.session.query(*columns, func.sum(ContributionStatModel.count))
+    query = filter_contribution_stats(query, args)
+    if columns:
+        query = query.group_by(*columns).order_by(*columns)
+
+    stats = []
+    for row in query.all():
+        stat = dict(zip(group_by, row[:-1]))
+        stat['count'] = row[-1] or 0
+        stats.append(stat)
+    return stats
+
+
+def get_contribution_leaderboard(args, limit=10):
+    """
+    Ranks users by the number of contributions matching the filters.
+    """
+    total = func.sum(ContributionStatModel.count).label('total')
+    query = db.session.query(ContributionStatModel.username, total)
+    query = filter_contribution_stats(query, args)
+    rows = query.group_by(ContributionStatModel.username) \
+        .order_by(total.desc(), ContributionStatModel.username) \
+        .limit(limit) \
+        .all()
+
+    return [{
+        'rank': rank,
+        'username': username,
+        'count': count
+    } for rank, (username, count) in enumerate(rows, start=1)]
+
+
+def has_form_audio_contribution(form_id):
+    """
+    Tells whether an audio recording was added to `form_id` through the tool.
+    """
+    query = db.session.query(ContributionModel.id) \
+        .filter(ContributionModel.form_id == form_id,
+                ContributionModel.edit_type == 'audio')
+    return db.session.query(query.exists()).scalar()
+
+
+def get_audio_contribution_form_ids(form_ids):
+    """
+    The forms of `form_ids` that an audio recording was added to through
+    the tool.
+    """
+    if not form_ids:
+        return set()
+    return set(db.session.scalars(
+        select(ContributionModel.form_id)
+        .where(ContributionModel.form_id.in_(form_ids),
+               ContributionModel.edit_type == 'audio')
+        .distinct()))
+
+
+def get_latest_revision_id(wd_item):
+    """
+    Returns the most recent revision id the tool saved on `wd_item`.
+    """
+    return db.session.query(func.max(ContributionModel.revision_id)) \
+        .filter(ContributionModel.wd_item == wd_item) \
+        .scalar()
+
+
+export_columns = ['id', 'wd_item', 'username', 'lang_code', 'edit_type', 'data', 'date',
+                  'form_id', 'sense_id', 'revision_id', 'file_name']
+
+
+def filter_contributions(query, args):
+    """
+    Applies the optional username, lang_code, edit_type, wd_item, form_id,
+    sense_id, file_name, start_date and end_date filters shared by the
+    contribution list and export.
+    """
+    for column in ['username', 'lang_code', 'edit_type', 'wd_item',
+                   'form_id', 'sense_id', 'file_name']:
+        if args.get(column):
+            query = query.filter(getattr(ContributionModel, column) == args[column])
+    if args.get('start_date'):
+        query = query.filter(ContributionModel.date >= args['start_date'])
+    if args.get('end_date'):
+        query = query.filter(ContributionModel.date <= args['end_date'])
+    return query
+
+
+def iter_contribution_rows(args, after_id=None, batch_size=1000):
+    """
+    Yields the filtered contributions as tuples of `export_columns` in id order.
+
+    Rows are fetched `batch_size` at a time through a server side cursor, so
+    memory stays constant whatever the size of the table.
+    """
+    query = select(*[getattr(ContributionModel, column) for column in export_columns])
+    query = filter_contributions(query, args)
+    if after_id:
+        query = query.filter(ContributionModel.id > after_id)
+    query = query.order_by(ContributionModel.id) \
+        .execution_options(yield_per=batch_size)
+
+    for row in db.session.execute(query):
+        yield tuple(row)
+
+
+def encode_contribution_rows(rows, export_format, chunk_size=65536):
+    """
+    Encodes contribution rows as NDJSON or CSV and yields chunks of about
+    `chunk_size` bytes.
+    """
+    buffer = io.StringIO()
+    writer = None
+    if export_format == 'csv':
+        writer = csv.writer(buffer)
+        writer.writerow(export_columns)
+
+    for row in rows:
+        if writer:
+            writer.writerow(row)
+        else:
+            buffer.write(json.dumps(dict(zip(export_columns, row)), default=str))
+            buffer.write('\n')
+        if buffer.tell() >= chunk_size:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+
+    if buffer.tell():
+        yield buffer.getvalue().encode('utf-8')
+
+
+def gzip_chunks(chunks, level=6):
+    """
+    Compresses a stream of byte chunks into a single gzip stream on the fly.
+    """
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
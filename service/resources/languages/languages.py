@@ -1,7 +1,8 @@
 from flask import abort
-from flask_restful import (Resource, reqparse,
-                           fields, marshal_with)
+from flask_restful import (Resource, reqparse, fields)
+from service.serializer import marshal, marshal_with
 from service.utils.languages import getLanguages
+from service.utils.static_response import StaticResponse
 
 lang_args = reqparse.RequestParser()
 
@@ -21,42 +22,42 @@ SinglelanguageFields = {
 }
 
 
-class LanguagesGet(Resource):
-    @marshal_with(languageFields)
-    def map_languages(self, data):
-        lang_data = []
-        for lang in data:
-            lang_pair = {
-                'lang_code': lang[0],
-                'lang_label': lang[1],
-                'lang_wd_id': lang[2]
-            }
-            lang_data.append(lang_pair)
-        return lang_data
+def map_languages(data):
+    lang_data = []
+    for lang in data:
+        lang_pair = {
+            'lang_code': lang[0],
+            'lang_label': lang[1],
+            'lang_wd_id': lang[2]
+        }
+        lang_data.append(lang_pair)
+    return lang_data
+
+
+languages_response = StaticResponse(marshal(map_languages(getLanguages()), languageFields))
+languages_by_code = {language[0]: language for language in getLanguages()}
+
 
+class LanguagesGet(Resource):
     def get(self):
-        languages = self.map_languages(getLanguages())
-        return languages
+        return languages_response.make_response()
 
 
 class LanguageGet(Resource):
+    batch_parallel = True
+
     @marshal_with(SinglelanguageFields)
     def post(self, lang_code):
         args = lang_args.parse_args()
 
         if not args['lang_code']:
             abort(400, "Language not supported")
-        lang_pair = []
-        for language in getLanguages():
-            if language[0] == args['lang_code']:
-                lang_pair.append(list(language))
-
-        lang_pair = list(lang_pair)
-        if not lang_pair:
+        language = languages_by_code.get(args['lang_code'])
+        if not language:
             abort(400, "Language not supported")
 
         return {
-            'lang_code': lang_pair[0][0],
-            'lang_label': lang_pair[0][1],
-            'lang_wd_id': lang_pair[0][2]
+            'lang_code': language[0],
+            'lang_label': language[1],
+            'lang_wd_id': language[2]
         }, 200
@@ -0,0 +1,8 @@
+from flask import Response
+from flask_restful import Resource
+from service.metrics import registry, CONTENT_TYPE
+
+
+class MetricsGet(Resource):
+    def get(self):
+        return Response(registry.render(), content_type=CONTENT_TYPE)
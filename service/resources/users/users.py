@@ -1,6 +1,6 @@
 from flask import abort
-from flask_restful import (Resource, reqparse,
-                           fields, marshal_with)
+from flask_restful import (Resource, reqparse, fields)
+from service.serializer import marshal_with
 from service.models import UserModel
 from service.require_token import token_required
 from service import db
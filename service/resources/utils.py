@@ -1,5 +1,216 @@
+import contextvars
+import hashlib
+import math
+import os
+import re
+import sys
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import requests
-from requests_oauthlib import OAuth1
+from common import sparql_endpoint_url, upstream_timeout, sparql_timeout, upstream_workers
+from service.cache import cached_read
+from service.circuit_breaker import get_breaker, get_host
+from service.metrics import (UPSTREAM_LATENCY, UPSTREAM_ERRORS, UPSTREAM_IN_FLIGHT,
+                             UPSTREAM_BYTES, get_metrics_resource)
+from service.serializer import loads
+from service.timing import record_timing, get_upstream_category
+
+
+def get_api_action(params):
+    """
+    Returns the MediaWiki action of a call, with the query module for
+    action=query (e.g. query:imageinfo).
+    """
+    action = (params or {}).get('action', 'unknown')
+    if action == 'query':
+        module = params.get('prop') or params.get('meta') or params.get('list')
+        if module:
+            return f'query:{module}'
+    return action
+
+
+def start_upstream_call(url):
+    """
+    Raises CircuitOpenError when the breaker of the upstream is open,
+    returns the host and start time of the call otherwise.
+    """
+    host = get_host(url)
+    get_breaker(host).before_call()
+    UPSTREAM_IN_FLIGHT.inc(host)
+    return host, time.perf_counter()
+
+
+def get_response_size(response):
+    """
+    Bytes of a response body as transferred: its Content-Length, which is
+    the compressed size of a compressed body, or else the size of the body.
+    """
+    if isinstance(response, bytes):
+        return len(response)
+    length = getattr(response, 'headers', {}).get('Content-Length')
+    if isinstance(length, str) and length.isdigit():
+        return int(length)
+    content = getattr(response, 'content', None)
+    return len(content) if isinstance(content, bytes) else None
+
+
+def finish_upstream_call(host, action, start, failed, size=None):
+    duration = time.perf_counter() - start
+    UPSTREAM_LATENCY.observe(duration, host, action)
+    record_timing(get_upstream_category(host), duration)
+    UPSTREAM_IN_FLIGHT.dec(host)
+    if size is not None:
+        UPSTREAM_BYTES.inc(get_metrics_resource(), host, action, amount=size)
+    if failed:
+        UPSTREAM_ERRORS.inc(host, action)
+        get_breaker(host).record_failure()
+    else:
+        get_breaker(host).record_success()
+
+
+def is_failed_response(result):
+    return getattr(result, 'status_code', 200) >= 500
+
+
+def observe_upstream_call(url, action, call):
+    """
+    Runs `call` and records its latency, and a failure if it raises or
+    returns a 5xx response, under the host of `url` and `action`. The time
+    also counts towards the Server-Timing header of the current request.
+    Failures trip the circuit breaker of the host, `call` is not made
+    while it is open.
+    """
+    host, start = start_upstream_call(url)
+    try:
+        result = call()
+    except Exception:
+        finish_upstream_call(host, action, start, True)
+        raise
+    finish_upstream_call(host, action, start, is_failed_response(result),
+                         get_response_size(result))
+    return result
+
+
+def send_api_request(method, url, params=None, data=None, session=None, **kwargs):
+    """ Sends a request to a MediaWiki API and returns the response
+
+        Parameters:
+            method (str): The HTTP method
+            url (str): The Api url end point
+            params (obj): The query string parameters
+            data (obj): The form parameters of a POST request
+            session (requests.Session): The session of the user to send it with
+            kwargs: Passed on to requests (auth, headers, files, timeout)
+
+        Returns:
+            response (requests.Response): The response of the API.
+    """
+    kwargs.setdefault('timeout', upstream_timeout)
+    action = get_api_action(params if data is None else data)
+    return observe_upstream_call(url, action, lambda: (session or requests).request(
+        method, url, params=params, data=data, **kwargs))
+
+
+def post_api_request(url, data, **kwargs):
+    """
+    Sends an edit or upload to a MediaWiki API, see send_api_request.
+    """
+    return send_api_request('POST', url, data=data, **kwargs)
+
+
+def run_sparql_query(query):
+    """ Runs a query on the Wikidata Query Service
+
+        Parameters:
+            query (str): The SPARQL query
+
+        Returns:
+            result (obj): The JSON results of the query.
+    """
+    from SPARQLWrapper import SPARQLWrapper, JSON
+
+    user_agent = "AGPB/%s.%s" % (sys.version_info[0], sys.version_info[1])
+    sparql = SPARQLWrapper(sparql_endpoint_url, agent=user_agent)
+    sparql.setQuery(query)
+    sparql.setReturnFormat(JSON)
+    sparql.setTimeout(math.ceil(sparql_timeout))
+    # The body is read here rather than by convert() to count its bytes
+    return loads(observe_upstream_call(sparql_endpoint_url, 'sparql',
+                                       lambda: sparql.query().response.read()))
+
+
+# A string literal, kept as is, or a run of whitespace
+SPARQL_WHITESPACE = re.compile(r'("(?:[^"\\]|\\.)*")|\s+')
+
+
+def normalize_sparql_query(query):
+    """
+    The query with every run of whitespace outside of string literals
+    collapsed to one space, so that indentation does not change its key.
+    """
+    return SPARQL_WHITESPACE.sub(lambda match: match.group(1) or ' ', query).strip()
+
+
+def get_sparql_cache_key(template, query):
+    digest = hashlib.sha256(normalize_sparql_query(query).encode('utf-8')).hexdigest()
+    return f'sparql/{template}/{digest[:32]}'
+
+
+def get_column_prefix(values):
+    """
+    The prefix up to the last '/' shared by the values of a column, such as
+    http://www.wikidata.org/entity/ for entity IRIs.
+    """
+    prefix = os.path.commonprefix([value for value in values if value is not None])
+    return prefix[:prefix.rfind('/') + 1]
+
+
+def encode_sparql_result(result):
+    """
+    The bindings of a SPARQL JSON result as columns of values with their
+    common prefix: {'vars': [...], 'prefixes': [...], 'columns': [[...]]}.
+    Only the values are kept, the readers do not use the types and
+    languages of the bindings.
+    """
+    variables = result.get('head', {}).get('vars', [])
+    bindings = result.get('results', {}).get('bindings', [])
+    prefixes, columns = [], []
+    for variable in variables:
+        values = [binding[variable]['value'] if variable in binding else None
+                  for binding in bindings]
+        prefix = get_column_prefix(values)
+        prefixes.append(prefix)
+        columns.append([value[len(prefix):] if value is not None else None
+                        for value in values])
+    return {'vars': variables, 'prefixes': prefixes, 'columns': columns}
+
+
+def decode_sparql_result(data):
+    """
+    The SPARQL JSON result of encode_sparql_result, with a value per binding.
+    """
+    variables = data['vars']
+    return {
+        'head': {'vars': variables},
+        'results': {'bindings': [
+            {variable: {'value': prefix + value}
+             for variable, prefix, value in zip(variables, data['prefixes'], row)
+             if value is not None}
+            for row in zip(*data['columns'])
+        ]},
+    }
+
+
+def run_cached_sparql_query(template, query, ttl):
+    """
+    run_sparql_query with its result cached for `ttl` seconds under the hash
+    of the normalized query. `template` names the query in the key.
+    """
+    return decode_sparql_result(cached_read(
+        get_sparql_cache_key(template, query), ttl, sparql_endpoint_url,
+        lambda: encode_sparql_result(run_sparql_query(query))))
+
 
 def make_api_request(url, PARAMS, headers):
     """ Makes request to an end point to get data
@@ -13,8 +224,9 @@ def make_api_request(url, PARAMS, headers):
     """
 
     try:
-        S = requests.Session()
-        r = S.get(url=url, params=PARAMS, headers=headers)
+        r = send_api_request('GET', url, params=PARAMS, headers=headers)
+        if is_failed_response(r):
+            r.raise_for_status()
         data = r.json()
     except Exception as e:
         return {
@@ -25,26 +237,54 @@ def make_api_request(url, PARAMS, headers):
     return data
 
 
-def generate_csrf_token(url, app_key, app_secret, user_key, user_secret):
+upstream_executor = ThreadPoolExecutor(max_workers=upstream_workers,
+                                       thread_name_prefix='agpb-upstream')
+upstream_threads = threading.local()
+
+
+def run_upstream_call(call, args):
+    upstream_threads.active = True
+    try:
+        return call(*args)
+    finally:
+        upstream_threads.active = False
+
+
+def run_concurrently(*calls):
+    """
+    Runs the (function, *args) `calls` on the upstream thread pool and
+    returns their results in order. Each call sees the request context of
+    the caller, for the timings and metrics of its upstream calls. Calls
+    made from the pool itself run one after the other, so that nested
+    fan-outs cannot wait on a full pool.
+    """
+    if len(calls) <= 1 or getattr(upstream_threads, 'active', False):
+        return [call(*args) for call, *args in calls]
+    futures = [upstream_executor.submit(contextvars.copy_context().run, run_upstream_call,
+                                        call, args)
+               for call, *args in calls]
+    return [future.result() for future in futures]
+
+
+def generate_csrf_token(url, auth_object):
     '''
     Generate CSRF token for edit request
 
     Keyword arguments:
-    app_key -- The application api auth key
-    app_secret -- The application api auth secret
-    user_key -- User auth key generated at login
-    user_secret -- User secret generated at login
+    url -- The API of the wiki to edit
+    auth_object -- The authentication object of the user, see get_auth_object
+
+    Returns the token and the session signed with the user's access token,
+    to send the edit with.
     '''
+    session = auth_object['session']
     try:
-        # We authenticate the user using the keys
-        auth = OAuth1(app_key, app_secret, user_key, user_secret)
-
         # Get token
-        token_request = requests.get(url, params={
+        token_request = send_api_request('GET', url, params={
             'action': 'query',
             'meta': 'tokens',
             'format': 'json',
-        }, auth=auth, headers=get_user_agent())
+        }, session=session, headers=get_user_agent())
 
         token_request.raise_for_status()
         if 'error' in list(token_request.json().keys()):
@@ -55,7 +295,7 @@ def generate_csrf_token(url, app_key, app_secret, user_key, user_secret):
 
         # We get the CSRF token from the result to be used in editing
         CSRF_TOKEN = token_request.json()['query']['tokens']['csrftoken']
-        return CSRF_TOKEN, auth
+        return CSRF_TOKEN, session
 
     except Exception as e:
         print(str(e))
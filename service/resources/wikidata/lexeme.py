@@ -1,18 +1,19 @@
-from flask import abort, request
-import jwt
-from service.models import UserModel
-from service import db
-from flask_restful import (Resource, reqparse,
-                           fields, marshal_with)
+import re
+from flask import abort, request, g
+from flask_restful import (Resource, reqparse, fields)
+from service.serializer import marshal, marshal_with
 from service.require_token import token_required
+from service.resources.auth.utils import get_auth_object
+from service.rate_limit import get_rate_limit_key
 from .utils import (lexemes_search, get_lexeme_sense_glosses,
+                    get_lexemes_sense_glosses,
                     describe_new_lexeme, get_lexemes_lacking_audio,
-                    add_audio_to_lexeme, get_auth_object,
-                    add_gloss_to_lexeme_sense,
+                    assign_lexemes_lacking_audio, prefetch_lexemes_lacking_audio,
+                    add_audio_to_lexeme,
                     validate_request_body_schema,
                     get_lexeme_translations,
                     add_translation_to_lexeme)
-from common import consumer_key, consumer_secret, prod_fe_url
+from common import prod_fe_url, bulk_glosses_max_ids
 
 
 # Used for validateion
@@ -24,12 +25,22 @@ lex_audio_add_args = reqparse.RequestParser()
 lexeme_gloss_add_args = reqparse.RequestParser()
 lexeme_missing_audio_args = reqparse.RequestParser()
 lexeme_gloss_args = reqparse.RequestParser()
+lexemes_gloss_args = reqparse.RequestParser()
 
 lexeme_gloss_args.add_argument('src_lang', type=str, help="Source language is required")
 lexeme_gloss_args.add_argument('id', type=str, help="Lexeme ID is required")
 lexeme_gloss_args.add_argument('lang_1', type=str, help="Provide the first language")
 lexeme_gloss_args.add_argument('lang_2', type=str, help="Provide the second language")
 
+lexemes_gloss_args.add_argument('ids', type=str, action='append', location='json',
+                                help="Lexeme IDs are required")
+lexemes_gloss_args.add_argument('src_lang', type=str, location='json',
+                                help="Source language is required")
+lexemes_gloss_args.add_argument('lang_1', type=str, location='json',
+                                help="Provide the first language")
+lexemes_gloss_args.add_argument('lang_2', type=str, location='json',
+                                help="Provide the second language")
+
 lexeme_args.add_argument('search', type=str, help="Please provide a search term")
 lexeme_args.add_argument('src_lang', type=str, help="Source language is required")
 lexeme_args.add_argument('id', type=str, help="Lexeme ID is required")
@@ -38,6 +49,10 @@ lexeme_args.add_argument('lang_1', type=str, help="Provide the first language")
 lexeme_args.add_argument('lang_2', type=str, help="Provide the second language")
 lexeme_args.add_argument('ismatch', type=str, help="Match lexeme in language")
 lexeme_args.add_argument('with_sense', type=bool, help="Include lexeme senses")
+lexeme_args.add_argument('languages', type=str, action='append',
+                         help="Provide the target languages")
+lexeme_args.add_argument('suggestions', type=int,
+                         help="Include the translations of the translations")
 
 description_schema = {
     "type": "array",
@@ -155,8 +170,10 @@ lexeme_gloss_add_args.add_argument('username', type=str, help="User Name of edit
 
 lexeme_missing_audio_args.add_argument('lang_wdqid', type=str, help="Wikidata language Qid")
 lexeme_missing_audio_args.add_argument('lang_code', type=str, help="The language code is required")
-lexeme_missing_audio_args.add_argument('page_size', type=int, help="You may need to provide a page size")
-lexeme_missing_audio_args.add_argument('page', type=int, help="You may need to provide a page number")
+lexeme_missing_audio_args.add_argument('page_size', type=int, default=15,
+                                       help="You may need to provide a page size")
+lexeme_missing_audio_args.add_argument('page', type=int, default=1,
+                                       help="You may need to provide a page number")
 
 lexeme_response_fields = {
     'lexeme': fields.Nested({
@@ -208,6 +225,8 @@ lexeMissingAudioFields = {
     "categoryLabel": fields.String,
     "formId": fields.String
 }
+# The page to ask for after a page of lexemes missing audio, absent after the last one
+NEXT_PAGE_HEADER = 'X-Next-Page'
 
 lexemeNoAudioFields = {
     'forms': fields.List(fields.Nested({
@@ -219,6 +238,9 @@ lexemeNoAudioFields = {
 
 
 class LexemesGet(Resource):
+    rate_limit = 'search'
+    batch_parallel = True
+
     @marshal_with(lexemeSearcFields)
     def post(self):
         args = lexeme_args.parse_args()
@@ -236,6 +258,8 @@ class LexemesGet(Resource):
 
 
 class LexemesDescriptionAdd(Resource):
+    rate_limit = 'edit'
+
     @token_required
     @marshal_with(lexeme_response_fields)
     def post(self, current_user):
@@ -246,22 +270,14 @@ class LexemesDescriptionAdd(Resource):
         if not validate_request_body_schema(request_body, description_schema):
             abort(400, 'Invalid request body')
 
-        # get request header token_required info
-        token = request.headers.get('x-access-tokens')
-
-        decoded_token = jwt.decode(token, consumer_secret, algorithms=["HS256"])
-        if 'access_token' not in decoded_token:
+        # token_required has already decoded the token
+        auth_obj = get_auth_object(g.token_claims)
+        if auth_obj is None:
             return {
-                'message': 'Access token is missing in the decoded token'
+                'message': 'Access token is missing, please log in again'
             }, 400
-        auth_obj = get_auth_object(consumer_key, consumer_secret, decoded_token)
-
-        # Fetch the user whose temp token is the same as the decoded token
-        user = UserModel.query.filter_by(temp_token=decoded_token['token']).first()
-        if not user:
-            abort(401, 'User not found')
 
-        result = describe_new_lexeme(request_body, user.username, auth_obj)
+        result = describe_new_lexeme(request_body, current_user.username, auth_obj)
 
         if 'status_code' in result and result['status_code'] == 503:
             return result, result['status_code']
@@ -270,6 +286,9 @@ class LexemesDescriptionAdd(Resource):
 
 
 class LexemeGlossesGet(Resource):
+    rate_limit = 'read'
+    batch_parallel = True
+
     @marshal_with(lexeme_response_fields)
     def post(self, id):
         args = lexeme_gloss_args.parse_args()
@@ -289,7 +308,37 @@ class LexemeGlossesGet(Resource):
         return lexeme_glosses, 200
 
 
+class LexemesGlossesGet(Resource):
+    rate_limit = 'read'
+    batch_parallel = True
+
+    def post(self):
+        args = lexemes_gloss_args.parse_args()
+        if args['lang_1'] == args['lang_2']:
+            abort(401, f'Target languages should not be the same')
+        if not args['ids'] or (args['lang_1'] is None and args['lang_2'] is None) or \
+                args['src_lang'] is None:
+            keys = ', '.join(list(args.keys()))
+            abort(400, f'Please provide required parameters: {keys}')
+        if len(args['ids']) > bulk_glosses_max_ids:
+            abort(400, f'Please provide at most {bulk_glosses_max_ids} lexeme IDs')
+        if not all(re.fullmatch(r'L\d+', lexeme_id or '') for lexeme_id in args['ids']):
+            abort(400, 'Invalid lexeme ID')
+
+        lexemes_glosses = get_lexemes_sense_glosses(args['ids'], args['src_lang'],
+                                                    args['lang_1'], args['lang_2'])
+        if 'error' in lexemes_glosses:
+            abort(lexemes_glosses['status_code'], lexemes_glosses)
+
+        return {lexeme_id: glosses if 'error' in glosses
+                else marshal(glosses, lexeme_response_fields)
+                for lexeme_id, glosses in lexemes_glosses.items()}, 200
+
+
 class LexemeFormsAudiosLackGet(Resource):
+    rate_limit = 'read'
+    batch_parallel = True
+
     @marshal_with(lexemeNoAudioFields)
     def post(self):
         args = lex_form_without_audio_args.parse_args()
@@ -306,6 +355,8 @@ class LexemeFormsAudiosLackGet(Resource):
 
 
 class LexemeAudioAdd(Resource):
+    rate_limit = 'edit'
+
     @token_required
     @marshal_with(LexemeAudioAddFields)
     def post(self, current_user):
@@ -319,27 +370,14 @@ class LexemeAudioAdd(Resource):
         if not validate_request_body_schema(request_body, add_audio_schema):
             abort(400, 'Invalid request body')
 
-        # get request header token_required info
-        token = request.headers.get('x-access-tokens')
-
-        try:
-            decoded_token = jwt.decode(token, consumer_secret, algorithms=["HS256"])
-            if 'access_token' not in decoded_token:
-                return {
-                    'message': 'Access token is missing in the decoded token'
-                }, 400
-            
-        except Exception as e:
-            abort(401, 'User may not be authenticated')
-
-        auth_obj = get_auth_object(consumer_key, consumer_secret, decoded_token)
-
-        # Fetch the user whose temp token is the same as the decoded token
-        user = UserModel.query.filter_by(temp_token=decoded_token['token']).first()
-        if not user:
-            abort(401, 'User not found')
+        # token_required has already decoded the token
+        auth_obj = get_auth_object(g.token_claims)
+        if auth_obj is None:
+            return {
+                'message': 'Access token is missing, please log in again'
+            }, 400
 
-        results = add_audio_to_lexeme(user.username, auth_obj, request_body)
+        results = add_audio_to_lexeme(current_user.username, auth_obj, request_body)
 
         if 'error' in results:
             abort(503, results)
@@ -348,6 +386,8 @@ class LexemeAudioAdd(Resource):
 
 
 class LexemeGlossAdd(Resource):
+    rate_limit = 'edit'
+
     @token_required
     @marshal_with(LexemeGlossAddFields)
     def post(self, current_user):
@@ -357,48 +397,65 @@ class LexemeGlossAdd(Resource):
            args['gloss_language'] is None or args['gloss_value'] is None:
             abort(400, f'Please provide required parameters {str(list(args.keys()))}')
 
-        # get request header token_required info
-        token = request.headers.get('x-access-tokens')
-
-        decoded_token = jwt.decode(token, consumer_secret, algorithms=["HS256"])
-        if 'access_token' not in decoded_token:
+        # token_required has already decoded the token
+        auth_obj = get_auth_object(g.token_claims)
+        if auth_obj is None:
             return {
-                'message': 'Access token is missing in the decoded token'
+                'message': 'Access token is missing, please log in again'
             }, 400
-
-        auth_obj = get_auth_object(consumer_key, consumer_secret, decoded_token)
-        results = add_gloss_to_lexeme_sense(args['lexeme_id'], args['sense_id'],
-                                            args['gloss_language'],
-                                            args['gloss_value'], auth_obj)
+        results = describe_new_lexeme([{'lexeme_id': args['lexeme_id'],
+                                        'sense_id': args['sense_id'],
+                                        'language': args['gloss_language'],
+                                        'value': args['gloss_value']}],
+                                      current_user.username, auth_obj)
         if 'error' in results:
             abort(results['status_code'], results)
         return results, 200
 
 
 class LexemesMissingAudioGet(Resource):
+    rate_limit = 'missing_audio'
+    batch_parallel = True
+
     @marshal_with(lexeMissingAudioFields)
     def post(self):
         args = lexeme_missing_audio_args.parse_args()
         if args['lang_wdqid'] is None or args['lang_code'] is None:
             abort(400, f'Please provide required parameters {str(list(args.keys()))}')
-
-        results = get_lexemes_lacking_audio(args['lang_wdqid'], args['lang_code'],
-                                            args['page_size'], args['page'])
+        if args['page_size'] is None or args['page_size'] < 1 or \
+                args['page'] is None or args['page'] < 1:
+            abort(400, 'Page size and page should be at least 1')
+
+        # The forms are leased to the user, or client address, so that
+        # concurrent users get different ones
+        holder = get_rate_limit_key()
+        results, next_page = assign_lexemes_lacking_audio(
+            args['lang_wdqid'], args['lang_code'], args['page_size'], args['page'], holder)
         if 'error' in results:
             abort(results['status_code'], results)
 
-        return results, 200
+        # Users page through the results: the next page is fetched while
+        # they record this one. The page may have been completed from the
+        # following ones, so the client asks for the page it is told next.
+        if next_page is None:
+            return results, 200
+        prefetch_lexemes_lacking_audio(args['lang_wdqid'], args['lang_code'],
+                                       args['page_size'], next_page, holder)
+        return results, 200, {NEXT_PAGE_HEADER: str(next_page)}
 
 
 class LexemeTranslateGet(Resource):
+    rate_limit = 'read'
+    batch_parallel = True
+
     def post(self, id):
         args = lexeme_args.parse_args()
         if args['id'] is None or args['src_lang'] is None:
             abort(400, f'Please provide required parameters {str(list(args.keys()))}')
 
-        lexeme_translations = get_lexeme_translations(args['id'],
-                                                      args['src_lang'], args['lang_1'],
-                                                      args['lang_2'])
+        languages = args['languages'] or [args['lang_1'], args['lang_2']]
+        lexeme_translations = get_lexeme_translations(
+            args['id'], args['src_lang'], languages, suggestions=bool(args['suggestions']))
         if type(lexeme_translations) is not list:
             abort(lexeme_translations['status_code'], lexeme_translations)
 
@@ -406,9 +463,11 @@ class LexemeTranslateGet(Resource):
 
 
 class LexemeTranslateAdd(Resource):
-    # @token_required
+    rate_limit = 'edit'
+
+    @token_required
     @marshal_with(LexemeAudioAddFields)
-    def post(self):
+    def post(self, current_user):
         request_body = request.get_json()
         if not request_body:
             abort(400, 'Request body is empty')
@@ -416,27 +475,14 @@ class LexemeTranslateAdd(Resource):
         if not validate_request_body_schema(request_body, add_translation_schema):
             abort(400, 'Invalid request body')
 
-        # get request header token_required info
-        token = request.headers.get('x-access-tokens')
-
-        try:
-            decoded_token = jwt.decode(token, consumer_secret, algorithms=["HS256"])
-            if 'access_token' not in decoded_token:
-                return {
-                    'message': 'Access token is missing in the decoded token'
-                }, 400
-            
-        except Exception as e:
-            abort(401, 'User may not be authenticated')
-
-        auth_obj = get_auth_object(consumer_key, consumer_secret, decoded_token)
-
-        # Fetch the user whose temp token is the same as the decoded token
-        user = UserModel.query.filter_by(temp_token=decoded_token['token']).first()
-        if not user:
-            abort(401, 'User not found')
+        # token_required has already decoded the token
+        auth_obj = get_auth_object(g.token_claims)
+        if auth_obj is None:
+            return {
+                'message': 'Access token is missing, please log in again'
+            }, 400
 
-        results = add_translation_to_lexeme(user.username, auth_obj, request_body[0])
+        results = add_translation_to_lexeme(current_user.username, auth_obj, request_body[0])
 
         if 'error' in results:
             abort(503, results['error'])
@@ -1,26 +1,48 @@
+import datetime
+import functools
 import re
 import json
 import urllib.parse
-import sys
 import base64
-import datetime
 import requests
-from wikidata.client import Client
-from common import (base_url, consumer_key, wm_commons_image_base_url,
-                    consumer_secret, app_version, wm_commons_audio_base_url,
-                    sparql_endpoint_url, commons_url)
+from common import (base_url, wm_commons_image_base_url,
+                    app_version, wm_commons_audio_base_url,
+                    commons_url, cache_entity_ttl, cache_label_ttl, cache_search_ttl,
+                    cache_commons_url_ttl, cache_missing_audio_ttl, sparql_endpoint_url,
+                    warmup_pages, form_lease_ttl, form_lease_scan_pages,
+                    translation_graph_max_overlay)
 from difflib import get_close_matches
-from jsonschema import validate, ValidationError
+from sqlalchemy import delete, select, update
 from service import db
-from service.models import ContributionModel
+from service.background import submit_background, submit_prefetch
+from service.cache import (MISS, cache, cached_read, cached_read_many, get_cached_entries,
+                           serve_stale)
+from service.circuit_breaker import is_upstream_available
+from service.database import get_conflict_insert
+from service.models import FormLeaseModel
+from service.resources.contributions.utils import (record_contribution,
+                                                   get_audio_contribution_form_ids)
+from service.translation_graph import graph as translation_graph, get_sense_translations
 from service.utils.languages import getLanguages
-from service.resources.utils import make_api_request, get_user_agent
-from service.resources.commons.utils import upload_file
+from service.resources.utils import (make_api_request, get_user_agent, send_api_request,
+                                     post_api_request, run_sparql_query, run_concurrently,
+                                     run_cached_sparql_query, get_sparql_cache_key)
+from service.resources.commons.utils import upload_file, get_media_url_cache_key
 from service.resources.utils import generate_csrf_token
-from SPARQLWrapper import SPARQLWrapper, JSON
 
+# wbgetentities accepts up to 50 ids per request, the query action 50 titles
+MAX_ENTITY_IDS = 50
+MAX_TITLES = 50
+# The claims the API reads: images and translations of senses, audio of forms
+SENSE_CLAIMS = ('P18', 'P5972')
+FORM_CLAIMS = ('P443',)
+# The lexical categories of most lexemes, whose labels are warmed up at login
+LEXICAL_CATEGORIES = ('Q1084', 'Q24905', 'Q34698', 'Q380057', 'Q147276', 'Q36224',
+                      'Q4833830', 'Q36484', 'Q83034', 'Q63116', 'Q103184', 'Q576271',
+                      'Q184943', 'Q161873', 'Q187931', 'Q184511', 'Q102047', 'Q134830')
 
-def get_lexemes_lacking_audio(lang_qid, lang_code, page_size=15, page=1):
+
+def get_lexemes_lacking_audio_query(lang_qid, lang_code, page_size=15, page=1):
     offset = (page - 1) * page_size
 
     
@@ -45,12 +67,10 @@ def get_lexemes_lacking_audio(lang_qid, lang_code, page_size=15, page=1):
     LIMIT {page_size}
     OFFSET {offset}
     """
-    
-    user_agent = "AGPB/%s.%s" % (sys.version_info[0], sys.version_info[1])
-    sparql = SPARQLWrapper(sparql_endpoint_url, agent=user_agent)
-    sparql.setQuery(query)
-    sparql.setReturnFormat(JSON)
-    result = sparql.query().convert()
+    return query
+
+
+def process_lexemes_lacking_audio(result):
     final_results = []
     # TODO: Change key:lemma to form_rep
     if 'results' in result and 'bindings' in result['results']:
@@ -71,6 +91,139 @@ def get_lexemes_lacking_audio(lang_qid, lang_code, page_size=15, page=1):
         }
 
 
+def get_missing_audio_template(lang_qid):
+    # Under sparql/missing_audio/<lang_qid>/ the pages of a language are
+    # invalidated together
+    return f'missing_audio/{lang_qid}'
+
+
+def get_lexemes_lacking_audio(lang_qid, lang_code, page_size=15, page=1):
+    query = get_lexemes_lacking_audio_query(lang_qid, lang_code, page_size, page)
+    return process_lexemes_lacking_audio(
+        run_cached_sparql_query(get_missing_audio_template(lang_qid), query,
+                                cache_missing_audio_ttl))
+
+
+def prefetch_lexemes_lacking_audio(lang_qid, lang_code, page_size, page, owner):
+    '''
+    Fetches a page of lexemes missing audio into the cache in the background,
+    unless it is cached already or WDQS is unavailable. `owner` is the user
+    or client address the page is prefetched for.
+    '''
+    query = get_lexemes_lacking_audio_query(lang_qid, lang_code, page_size, page)
+    key = get_sparql_cache_key(get_missing_audio_template(lang_qid), query)
+    if cache.get(key) is not MISS or not is_upstream_available(sparql_endpoint_url):
+        return False
+    return submit_prefetch(key, owner, lambda: run_cached_sparql_query(
+        get_missing_audio_template(lang_qid), query, cache_missing_audio_ttl))
+
+
+def insert_ignoring_conflicts(model, rows):
+    '''
+    INSERT of `rows` that skips the rows whose primary key exists already.
+    Raises NotImplementedError on databases other than SQLite and PostgreSQL.
+    '''
+    insert = get_conflict_insert(db.engine.dialect.name)
+    return insert(model).values(rows).on_conflict_do_nothing()
+
+
+def lease_forms(form_ids, holder, limit):
+    '''
+    Leases up to `limit` of the forms of `form_ids` that are not leased to
+    someone else to `holder` for FORM_LEASE_TTL seconds, renewing the
+    leases it has already. Returns the set of the forms leased.
+    '''
+    form_ids = list(dict.fromkeys(form_ids))
+    if not form_ids or limit <= 0:
+        return set()
+
+    now = datetime.datetime.utcnow()
+    expires_at = now + datetime.timedelta(seconds=form_lease_ttl)
+    db.session.execute(delete(FormLeaseModel).where(FormLeaseModel.expires_at <= now))
+    taken = set(db.session.scalars(select(FormLeaseModel.form_id).where(
+        FormLeaseModel.form_id.in_(form_ids), FormLeaseModel.holder != holder)))
+    candidates = [form_id for form_id in form_ids if form_id not in taken][:limit]
+    if not candidates:
+        db.session.commit()
+        return set()
+
+    db.session.execute(update(FormLeaseModel)
+                       .where(FormLeaseModel.form_id.in_(candidates),
+                              FormLeaseModel.holder == holder)
+                       .values(expires_at=expires_at))
+    # Another request may lease the same forms meanwhile, the first one wins
+    db.session.execute(insert_ignoring_conflicts(FormLeaseModel, [
+        {'form_id': form_id, 'holder': holder, 'expires_at': expires_at}
+        for form_id in candidates]))
+    leased = set(db.session.scalars(select(FormLeaseModel.form_id).where(
+        FormLeaseModel.form_id.in_(candidates), FormLeaseModel.holder == holder)))
+    db.session.commit()
+    return leased
+
+
+def assign_lexemes_lacking_audio(lang_qid, lang_code, page_size, page, holder):
+    '''
+    The page of lexemes missing audio without the forms leased to others,
+    completed from the following pages, FORM_LEASE_SCAN_PAGES pages in all
+    at most. The forms handed out are leased to `holder`. The forms recorded
+    through the tool are skipped too, as WDQS may list them until it
+    catches up with the edit.
+    Returns the entries and the page after the last one read, or None when
+    that was the last page.
+    '''
+    results = []
+    for scanned in range(page, page + form_lease_scan_pages):
+        entries = get_lexemes_lacking_audio(lang_qid, lang_code, page_size, scanned)
+        if 'error' in entries:
+            return (results, None) if results else (entries, None)
+
+        form_ids = [entry['formId'] for entry in entries]
+        recorded = get_audio_contribution_form_ids(form_ids)
+        leased = lease_forms([form_id for form_id in form_ids if form_id not in recorded],
+                             holder, page_size - len(results))
+        results.extend(entry for entry in entries if entry['formId'] in leased)
+        if len(entries) < page_size:
+            return results, None
+        if len(results) >= page_size:
+            break
+    return results, scanned + 1
+
+
+def is_language_warm(lang_code, lang_qid):
+    '''
+    Whether the category labels and the first pages of lexemes missing
+    audio of a language are cached
+    '''
+    _, missing, _ = get_cached_entries(get_label_cache_keys(LEXICAL_CATEGORIES, lang_code))
+    if missing:
+        return False
+    return all(cache.get(get_sparql_cache_key(
+        get_missing_audio_template(lang_qid),
+        get_lexemes_lacking_audio_query(lang_qid, lang_code, page=page)))
+        is not MISS for page in range(1, warmup_pages + 1))
+
+
+def warm_up_language(lang_code, lang_qid):
+    get_item_labels(LEXICAL_CATEGORIES, lang_code)
+    for page in range(1, warmup_pages + 1):
+        get_lexemes_lacking_audio(lang_qid, lang_code, page=page)
+
+
+def warm_up_languages(lang_codes, owner):
+    '''
+    Fills the cache with the labels of the lexical categories and the first
+    WARMUP_PAGES pages of lexemes missing audio of the languages a user
+    logged in with, in the background. The warmups are prefetches of
+    `owner`, one per language that is not cached yet.
+    '''
+    if not is_upstream_available(sparql_endpoint_url):
+        return
+    for lang_code, lang_qid in get_language_qids(lang_codes).items():
+        if not is_language_warm(lang_code, lang_qid):
+            submit_prefetch(f'warmup/{lang_code}', owner,
+                            functools.partial(warm_up_language, lang_code, lang_qid))
+
+
 def process_search_results(search_results, search,
                            src_lang, ismatch_search, with_sense):
     '''
@@ -102,10 +255,8 @@ def process_search_results(search_results, search,
     return lexeme_result
 
 
-def lexemes_search(search, src_lang, ismatch, with_sense):
-    '''
-    '''
-    PARAMS = {
+def get_lexemes_search_params(search, src_lang):
+    return {
         'action': 'wbsearchentities',
         'format': 'json',
         'language': src_lang,
@@ -115,7 +266,8 @@ def lexemes_search(search, src_lang, ismatch, with_sense):
         'limit': 15
     }
 
-    wd_search_results = make_api_request(base_url, PARAMS, get_user_agent())
+
+def process_lexemes_search(wd_search_results, search, src_lang, ismatch, with_sense):
     if 'status_code' in list(wd_search_results.keys()):
         return wd_search_results
 
@@ -128,6 +280,20 @@ def lexemes_search(search, src_lang, ismatch, with_sense):
     return search_result_data
 
 
+def get_search_cache_key(search, src_lang):
+    return f'search/{src_lang}/{search}'
+
+
+def lexemes_search(search, src_lang, ismatch, with_sense):
+    '''
+    '''
+    PARAMS = get_lexemes_search_params(search, src_lang)
+    wd_search_results = cached_read(get_search_cache_key(search, src_lang), cache_search_ttl,
+                                    base_url,
+                                    lambda: make_api_request(base_url, PARAMS, get_user_agent()))
+    return process_lexemes_search(wd_search_results, search, src_lang, ismatch, with_sense)
+
+
 def get_language_label(languages, code):
     """
     Finds the language label from a list of tuples based on a given language code.
@@ -157,19 +323,27 @@ def get_item_label(item_id, lang_code="en"):
     Returns:
         str or None: The label if found, otherwise None.
     """
-    query = f"""
+    # Wikidata Query Service API endpoint
+    query = get_item_label_query(item_id, lang_code)
+    return cached_read(get_label_cache_key(item_id, lang_code), cache_label_ttl,
+                       sparql_endpoint_url,
+                       lambda: process_item_label(run_sparql_query(query)))
+
+
+def get_label_cache_key(item_id, lang_code):
+    return f'label/{item_id}/{lang_code}'
+
+
+def get_item_label_query(item_id, lang_code):
+    return f"""
     SELECT ?item ?itemLabel WHERE {{
       VALUES ?item {{ wd:{item_id} }}
       SERVICE wikibase:label {{ bd:serviceParam wikibase:language "{lang_code}". }}
     }}
     """
-    
-    # Wikidata Query Service API endpoint
-    user_agent = "AGPB/%s.%s" % (sys.version_info[0], sys.version_info[1])
-    sparql = SPARQLWrapper(sparql_endpoint_url, agent=user_agent)
-    sparql.setQuery(query)
-    sparql.setReturnFormat(JSON)
-    result = sparql.query().convert()
+
+
+def process_item_label(result):
     try:
         bindings = result.get("results", {}).get("bindings", [])
 
@@ -183,6 +357,41 @@ def get_item_label(item_id, lang_code="en"):
     return None
 
 
+def get_item_labels_query(item_ids, lang_code):
+    values = ' '.join(f'wd:{item_id}' for item_id in item_ids)
+    return f"""
+    SELECT ?item ?itemLabel WHERE {{
+      VALUES ?item {{ {values} }}
+      SERVICE wikibase:label {{ bd:serviceParam wikibase:language "{lang_code}". }}
+    }}
+    """
+
+
+def process_item_labels(result, item_ids):
+    labels = dict.fromkeys(item_ids)
+    for binding in result.get("results", {}).get("bindings", []):
+        item_id = binding['item']['value'].split('/')[-1]
+        labels[item_id] = binding.get("itemLabel", {}).get("value")
+    return labels
+
+
+def get_label_cache_keys(item_ids, lang_code):
+    return {item_id: get_label_cache_key(item_id, lang_code) for item_id in item_ids}
+
+
+def get_item_labels(item_ids, lang_code="en"):
+    """
+    {item ID: label} of several items, with one query for the labels
+    that are not cached.
+    """
+    def fetch(missing):
+        return process_item_labels(run_sparql_query(get_item_labels_query(missing, lang_code)),
+                                   missing)
+
+    return cached_read_many(get_label_cache_keys(item_ids, lang_code), cache_label_ttl,
+                            sparql_endpoint_url, fetch)
+
+
 def get_image_url(file_name):
     '''
     Returns the image url from the image file name.
@@ -206,7 +415,22 @@ def get_wikimedia_commons_url(file_name, api_url):
     """
     Get the URL of an audio file in Wikimedia Commons given the file name.
     """
-    params = {
+    def fetch():
+        response = send_api_request('GET', api_url, params=get_commons_url_params(file_name),
+                                    headers=get_user_agent())
+        response.raise_for_status()
+        return process_commons_url(response.json())
+
+    return cached_read(get_commons_url_cache_key(file_name), cache_commons_url_ttl,
+                       api_url, fetch)
+
+
+def get_commons_url_cache_key(file_name):
+    return f'commons_url/{file_name}'
+
+
+def get_commons_url_params(file_name):
+    return {
         "action": "query",
         "titles": f"File:{file_name}",
         "prop": "imageinfo",
@@ -214,9 +438,8 @@ def get_wikimedia_commons_url(file_name, api_url):
         "format": "json"
     }
 
-    response = requests.get(api_url, params=params, headers=get_user_agent())
-    data = response.json()
 
+def process_commons_url(data):
     pages = data.get("query", {}).get("pages", {})
     if pages:
         page_id = next(iter(pages))
@@ -226,6 +449,59 @@ def get_wikimedia_commons_url(file_name, api_url):
     return None
 
 
+def get_commons_urls_params(file_names):
+    return {
+        "action": "query",
+        "titles": '|'.join(f"File:{file_name}" for file_name in file_names),
+        "prop": "imageinfo",
+        "iiprop": "url",
+        "format": "json"
+    }
+
+
+def process_commons_urls(data, file_names):
+    """
+    {file name: URL} of a query of several files. The titles of the pages
+    are the normalized ones of the query.
+    """
+    query = data.get("query", {})
+    normalized = {entry['from']: entry['to'] for entry in query.get("normalized", [])}
+    urls = {page.get('title'): page['imageinfo'][0].get('url')
+            for page in query.get("pages", {}).values() if page.get('imageinfo')}
+    return {file_name: urls.get(normalized.get(f"File:{file_name}", f"File:{file_name}"))
+            for file_name in file_names}
+
+
+def get_title_batches(file_names):
+    return [file_names[i:i + MAX_TITLES] for i in range(0, len(file_names), MAX_TITLES)]
+
+
+def get_commons_url_cache_keys(file_names):
+    return {file_name: get_commons_url_cache_key(file_name) for file_name in file_names}
+
+
+def get_wikimedia_commons_urls(file_names, api_url):
+    """
+    {file name: URL} of several audio files, with one query per 50 files
+    that are not cached.
+    """
+    def fetch_batch(batch):
+        response = send_api_request('GET', api_url, params=get_commons_urls_params(batch),
+                                    headers=get_user_agent())
+        response.raise_for_status()
+        return process_commons_urls(response.json(), batch)
+
+    def fetch(missing):
+        urls = {}
+        for batch_urls in run_concurrently(*[(fetch_batch, batch)
+                                             for batch in get_title_batches(missing)]):
+            urls.update(batch_urls)
+        return urls
+
+    return cached_read_many(get_commons_url_cache_keys(file_names), cache_commons_url_ttl,
+                            api_url, fetch)
+
+
 def get_matching_form_id(lexeme_value, src_lang, forms):
     """
     Returns the sense ID matching lexeme value in source language.
@@ -252,19 +528,57 @@ def get_matching_sense_id(src_lang, senses):
                  if sense.get('glosses', {}).get(src_lang)), None)
 
 
+def get_lemma_not_found_error(src_lang):
+    language_name = next((name for code, name, _ in getLanguages() if code == src_lang), "Unknown Language")
+    return {'error': f'Word not found in source language: {language_name}', 'status_code': 404}
+
+
+def get_form_audio_files(lexeme_data):
+    """
+    Returns {language QID: audio file name} of the P443 claims of the
+    lexeme forms.
+    """
+    form_audio_files = {}
+    for form in lexeme_data.get('forms', []):
+        claims = form.get('claims')
+        if claims and 'P443' in claims:
+            for audio_claim in claims['P443']:
+                qal = audio_claim['qualifiers'] if 'qualifiers' in audio_claim else None
+                lang_qid = None
+                if qal and 'P407' in qal:
+                    lang_qid = qal['P407'][0]['datavalue']['value']['id']
+                # The assumption is that one form has one audio file.
+                if lang_qid:
+                    form_audio_files[lang_qid] = audio_claim['mainsnak']['datavalue']['value']
+    return form_audio_files
+
+
 def process_lexeme_sense_data(lexeme_data, src_lang, lang_1, lang_2, image):
     """
     Processes lexeme and sense data, handling glosses and audio.
-    This function has been refactored to be more efficient by using a dictionary
-    for faster audio lookups and streamlining the main processing loop.
+    The category label and the audio URLs are fetched concurrently.
+    """
+    if not lexeme_data['lemmas'].get(src_lang, {}).get('value'):
+        return get_lemma_not_found_error(src_lang)
+
+    audio_files = get_form_audio_files(lexeme_data)
+    category_label, *audio_urls = run_concurrently(
+        (get_item_label, lexeme_data['lexicalCategory'], src_lang),
+        *[(get_wikimedia_commons_url, file_name, commons_url)
+          for file_name in audio_files.values()])
+    return build_lexeme_sense_data(lexeme_data, src_lang, lang_1, lang_2, image,
+                                   category_label, dict(zip(audio_files, audio_urls)))
+
+
+def build_lexeme_sense_data(lexeme_data, src_lang, lang_1, lang_2, image,
+                            category_label, form_audio_map):
+    """
+    Builds the glosses of a lexeme from the already fetched label of its
+    lexical category and {language QID: audio URL} of its forms.
     """
     processed_data = {}
     media = get_image_url(image[0]['mainsnak']['datavalue']['value']) if image else None
-
-    lemma_value = lexeme_data['lemmas'].get(src_lang, {}).get('value')
-    if not lemma_value:
-        language_name = next((name for code, name, _ in getLanguages() if code == src_lang), "Unknown Language")
-        return {'error': f'Word not found in source language: {language_name}', 'status_code': 404}
+    lemma_value = lexeme_data['lemmas'][src_lang]['value']
 
     matched_sense_id = get_matching_sense_id(src_lang, lexeme_data.get('senses', []))
     matched_form_id = get_matching_form_id(lemma_value, src_lang, lexeme_data.get('forms', []))
@@ -272,7 +586,7 @@ def process_lexeme_sense_data(lexeme_data, src_lang, lang_1, lang_2, image):
     processed_data['lexeme'] = {
         'id': lexeme_data['id'],
         'lexicalCategoryId': lexeme_data['lexicalCategory'],
-        'lexicalCategoryLabel': get_item_label(lexeme_data['lexicalCategory'], src_lang),
+        'lexicalCategoryLabel': category_label,
         'image': media
     }
 
@@ -287,22 +601,6 @@ def process_lexeme_sense_data(lexeme_data, src_lang, lang_1, lang_2, image):
         }
     })
 
-    # Use a dictionary for fast form-to-audio lookups
-    form_audio_map = {}
-    for form in lexeme_data.get('forms', []):
-        claims = form.get('claims')
-        if claims and 'P443' in claims:
-            for audio_claim in claims['P443']:
-                qal = audio_claim['qualifiers'] if 'qualifiers' in audio_claim else None
-                form_id = form['id']
-                lang_qid = None
-                if qal and 'P407' in qal:
-                    lang_qid = qal['P407'][0]['datavalue']['value']['id']
-                audio_value = audio_claim['mainsnak']['datavalue']['value']
-                # The assumption is that one form has one audio file.
-                if lang_qid:
-                    form_audio_map[lang_qid] = get_wikimedia_commons_url(audio_value, commons_url)
-
     # Add other entries for senses
     senses = lexeme_data.get('senses', [])
     if len(senses) == 0:
@@ -383,42 +681,231 @@ def process_lexeme_form_data(search_term, data, src_lang, lang_1, lang_2):
     return [processed_data]
 
 
-def get_lexeme_sense_glosses(lexeme_id, src_lang, lang_1, lang_2):
+def get_lexeme_cache_prefix(lexeme_id):
     '''
-    Gloses for a particular lexeme
+    Prefix of the cache keys of a lexeme, invalidated after edits of it
+    '''
+    return f'lexeme/{lexeme_id}/'
+
+
+def get_entity_languages(languages):
     '''
-    PARAMS = {
+    The sorted languages of a projected fetch, or None for all of them
+    '''
+    if languages is None:
+        return None
+    return sorted(set(filter(None, languages)))
+
+
+def get_entity_cache_key(entity_id, languages=None):
+    key = get_lexeme_cache_prefix(entity_id) + 'entity'
+    return f"{key}/{'|'.join(languages)}" if languages else key
+
+
+def get_entities_params(ids, languages=None):
+    params = {
         'action': 'wbgetentities',
         'format': 'json',
-        'languages': src_lang,
-        'ids': lexeme_id
+        'ids': '|'.join(ids)
     }
+    if languages:
+        params['languages'] = '|'.join(languages)
+    return params
+
+
+def strip_claims(claims, properties):
+    return {prop: claims[prop] for prop in properties if prop in claims}
+
+
+def project_entity(entity):
+    '''
+    The lexeme without the claims the API does not read: the images and
+    translations of its senses and the audio of its forms are kept
+    '''
+    if 'senses' not in entity and 'forms' not in entity:
+        return entity
+    return dict(entity, claims={},
+                senses=[dict(sense, claims=strip_claims(sense.get('claims', {}), SENSE_CLAIMS))
+                        for sense in entity.get('senses', [])],
+                forms=[dict(form, claims=strip_claims(form.get('claims', {}), FORM_CLAIMS))
+                       for form in entity.get('forms', [])])
+
+
+def get_cached_entities(ids, languages=None):
+    '''
+    The cached {id: entity} of `ids`, the list of the ids to fetch and the
+    {id: entity} of the expired ones among them
+    '''
+    return get_cached_entries({entity_id: get_entity_cache_key(entity_id, languages)
+                               for entity_id in ids})
+
+
+def get_entity_batches(ids):
+    return [ids[i:i + MAX_ENTITY_IDS] for i in range(0, len(ids), MAX_ENTITY_IDS)]
+
+
+def process_entities(result, entities, languages=None):
+    '''
+    Projects and caches the entities of a wbgetentities result and adds them
+    to `entities`. Returns the result when it is an error, None otherwise.
+    '''
+    if 'status_code' in result:
+        return result
+
+    for entity_id, entity in result['entities'].items():
+        if 'missing' not in entity:
+            entity = project_entity(entity)
+            cache.set(get_entity_cache_key(entity_id, languages), entity, cache_entity_ttl)
+            translation_graph.add_lexeme(entity)
+        entities[entity_id] = entity
+    compact_translation_graph()
+    return None
+
+
+def fetch_entities(ids, languages=None):
+    entities = {}
+    results = run_concurrently(*[
+        (make_api_request, base_url, get_entities_params(batch, languages), get_user_agent())
+        for batch in get_entity_batches(ids)])
+    for result in results:
+        error = process_entities(result, entities, languages)
+        if error is not None:
+            return error
+    return {'entities': entities}
+
+
+def can_serve_stale_entities(missing, stale):
+    return len(stale) == len(missing)
+
+
+def merge_entities(entities, missing, stale, result, languages=None):
+    '''
+    Adds fetched entities to the cached ones. When the fetch failed and all
+    the missing entities have expired copies, these are served stale.
+    '''
+    if 'entities' in result:
+        entities.update(result['entities'])
+        return {'entities': entities}
+    if can_serve_stale_entities(missing, stale):
+        return serve_stale_entities(entities, missing, stale, languages)
+    return result
+
+
+def serve_stale_entities(entities, missing, stale, languages=None):
+    serve_stale(f"entities/{'|'.join(languages or [])}/{'|'.join(missing)}",
+                lambda: fetch_entities(missing, languages))
+    entities.update(stale)
+    return {'entities': entities}
+
+
+def get_entities(ids, languages=None):
+    '''
+    wbgetentities result of the entities `ids` with the terms of `languages`
+    only (all of them when None) and the claims the API reads. Cached
+    entities are not fetched again, the others are fetched 50 at a time.
+    While Wikidata is unavailable, expired entities are served stale.
+    '''
+    languages = get_entity_languages(languages)
+    entities, missing, stale = get_cached_entities(ids, languages)
+    if not missing:
+        return {'entities': entities}
+    if can_serve_stale_entities(missing, stale) and not is_upstream_available(base_url):
+        return serve_stale_entities(entities, missing, stale, languages)
+    return merge_entities(entities, missing, stale, fetch_entities(missing, languages),
+                          languages)
+
+
+def invalidate_lexeme(lexeme_id):
+    '''
+    Drops what is cached about a lexeme, after an edit of it
+    '''
+    cache.invalidate(get_lexeme_cache_prefix(lexeme_id))
+
+
+def get_lexeme_image(lexeme_data):
+    '''
+    The P18 claims of the first sense of a lexeme, if any
+    '''
+    senses = lexeme_data['senses']
+    if len(senses) > 0 and 'P18' in senses[0]['claims']:
+        return senses[0]['claims']['P18']
+    return None
 
-    lexeme_senses_data = make_api_request(base_url, PARAMS, get_user_agent())
+
+def get_lexeme_sense_glosses(lexeme_id, src_lang, lang_1, lang_2):
+    '''
+    Gloses for a particular lexeme
+    '''
+    lexeme_senses_data = get_entities([lexeme_id], [src_lang, lang_1, lang_2])
 
     if 'status_code' in list(lexeme_senses_data.keys()):
         return lexeme_senses_data
 
-    image = None
-    if len(lexeme_senses_data['entities'][lexeme_id]['senses']) > 0:
-        if 'P18' in lexeme_senses_data['entities'][lexeme_id]['senses'][0]['claims']:
-            image = lexeme_senses_data['entities'][lexeme_id]['senses'][0]['claims']['P18']
-
-    glosses_data = process_lexeme_sense_data(lexeme_senses_data['entities'][lexeme_id],
-                                             src_lang, lang_1, lang_2, image)
+    lexeme_data = lexeme_senses_data['entities'][lexeme_id]
+    glosses_data = process_lexeme_sense_data(lexeme_data, src_lang, lang_1, lang_2,
+                                             get_lexeme_image(lexeme_data))
     return glosses_data
 
 
-def get_lexeme_forms_audio(search_term, lexeme_id, src_lang, lang_1, lang_2):
-    PARAMS = {
-        'action': 'wbgetentities',
-        'format': 'json',
-        'languages': src_lang,
-        'strictlanguage': True,
-        'ids': lexeme_id
-    }
+def get_lexemes_glosses_lookups(lexeme_ids, entities, src_lang):
+    '''
+    The lexemes of `lexeme_ids` that have a lemma in src_lang, the ids of
+    their lexical categories and {lexeme ID: {language QID: audio file}}
+    '''
+    lexemes = [entities[lexeme_id] for lexeme_id in dict.fromkeys(lexeme_ids)
+               if lexeme_id in entities and 'missing' not in entities[lexeme_id]
+               and entities[lexeme_id]['lemmas'].get(src_lang, {}).get('value')]
+    category_ids = list(dict.fromkeys(lexeme['lexicalCategory'] for lexeme in lexemes))
+    audio_files = {lexeme['id']: get_form_audio_files(lexeme) for lexeme in lexemes}
+    return category_ids, audio_files
+
+
+def get_audio_file_names(audio_files):
+    return list(dict.fromkeys(file_name for files in audio_files.values()
+                              for file_name in files.values()))
+
+
+def build_lexemes_sense_data(lexeme_ids, entities, src_lang, lang_1, lang_2,
+                             category_labels, audio_files, audio_urls):
+    '''
+    {lexeme ID: glosses as process_lexeme_sense_data builds them, or an error}
+    '''
+    glosses = {}
+    for lexeme_id in lexeme_ids:
+        lexeme_data = entities.get(lexeme_id)
+        if lexeme_data is None or 'missing' in lexeme_data:
+            glosses[lexeme_id] = {'error': f'Lexeme not found: {lexeme_id}', 'status_code': 404}
+        elif lexeme_id not in audio_files:
+            glosses[lexeme_id] = get_lemma_not_found_error(src_lang)
+        else:
+            form_audio_map = {lang_qid: audio_urls.get(file_name)
+                              for lang_qid, file_name in audio_files[lexeme_id].items()}
+            glosses[lexeme_id] = build_lexeme_sense_data(
+                lexeme_data, src_lang, lang_1, lang_2, get_lexeme_image(lexeme_data),
+                category_labels.get(lexeme_data['lexicalCategory']), form_audio_map)
+    return glosses
+
+
+def get_lexemes_sense_glosses(lexeme_ids, src_lang, lang_1, lang_2):
+    '''
+    Glosses of several lexemes: their entities are fetched 50 at a time and
+    the category labels and audio URLs of all of them in shared lookups
+    '''
+    result = get_entities(lexeme_ids, [src_lang, lang_1, lang_2])
+    if 'status_code' in result:
+        return result
+
+    entities = result['entities']
+    category_ids, audio_files = get_lexemes_glosses_lookups(lexeme_ids, entities, src_lang)
+    category_labels, audio_urls = run_concurrently(
+        (get_item_labels, category_ids, src_lang),
+        (get_wikimedia_commons_urls, get_audio_file_names(audio_files), commons_url))
+    return build_lexemes_sense_data(lexeme_ids, entities, src_lang, lang_1, lang_2,
+                                    category_labels, audio_files, audio_urls)
 
-    lexeme_data = make_api_request(base_url, PARAMS, get_user_agent())
+
+def get_lexeme_forms_audio(search_term, lexeme_id, src_lang, lang_1, lang_2):
+    lexeme_data = get_entities([lexeme_id], [src_lang, lang_1, lang_2])
 
     if 'status_code' in list(lexeme_data.keys()):
         return lexeme_data
@@ -447,17 +934,14 @@ def describe_new_lexeme(description_data, username, auth_obj):
         username (str): The username of the person creating the lexeme
         token (str): The crsf token for the request
     '''
-    csrf_token, auth = generate_csrf_token(base_url, consumer_key,
-                                           consumer_secret,
-                                           auth_obj['access_token'],
-                                           auth_obj['access_secret'])
+    csrf_token, session = generate_csrf_token(base_url, auth_obj)
     result_object = {}
     for desc_data in description_data:
         return add_gloss_to_lexeme_sense(desc_data['lexeme_id'],
                                          desc_data['sense_id'],
                                          desc_data['language'],
                                          desc_data['value'], username,
-                                         csrf_token, auth, result_object)
+                                         csrf_token, session, result_object)
     return {
         'error': 'No edit was made please check the data',
         'status_code': 503
@@ -465,21 +949,17 @@ def describe_new_lexeme(description_data, username, auth_obj):
 
 
 def add_gloss_to_lexeme_sense(lexeme_id, sense_id, gloss_language, gloss_value,
-                              username, csrf_token, auth, result_obj):
+                              username, csrf_token, session, result_obj):
     """
     Adds a new gloss to an existing lexeme sense in Wikidata.
 
     This function correctly implements the logic for editing a lexeme.
     Adding a gloss is an *edit* to an existing lexeme, not the creation of a new one.
     """
-    # We get the current lexeme
-    # Then get its avoid edit conflicts
-    get_params = {
-        'action': 'wbgetentities',
-        'ids': lexeme_id,
-        'format': 'json'
-    }
-    get_response = requests.get(base_url, params=get_params)
+    # We get the current revision of the lexeme to avoid edit conflicts,
+    # with the glosses of the edited language only
+    get_params = get_entities_params([lexeme_id], [gloss_language])
+    get_response = send_api_request('GET', base_url, params=get_params)
     
     if get_response.status_code != 200:
         return {
@@ -499,28 +979,23 @@ def add_gloss_to_lexeme_sense(lexeme_id, sense_id, gloss_language, gloss_value,
     if not base_revid:
         return {'info': f'Could not find base revision ID for lexeme {lexeme_id}.', 'status_code': 404}
 
-    # Step 3: Find the target sense and add/update the gloss.
-    # We must submit the entire 'senses' array back, so we modify it in place.
-    sense_found = False
-    for sense in senses:
-        if sense['id'] == sense_id:
-            # Add the new gloss to the existing glosses dictionary
-            if 'glosses' not in sense:
-                sense['glosses'] = {}
-            sense['glosses'][gloss_language] = {
-                'language': gloss_language,
-                'value': gloss_value
-            }
-            sense_found = True
-            break
-
-    if not sense_found:
+    # Step 3: Check the target sense exists
+    if not any(sense['id'] == sense_id for sense in senses):
         return {'info': f'Sense {sense_id} not found in lexeme {lexeme_id}', 'status_code': 404}
 
     # Step 4: Prepare the data for the wbeditentity API call.
-    # The 'data' payload contains the modified 'senses' array.
+    # Only the edited gloss of the target sense is submitted, the other
+    # senses and glosses are left as they are.
     edit_payload = {
-        'senses': senses
+        'senses': [{
+            'id': sense_id,
+            'glosses': {
+                gloss_language: {
+                    'language': gloss_language,
+                    'value': gloss_value
+                }
+            }
+        }]
     }
 
     post_params = {
@@ -534,7 +1009,8 @@ def add_gloss_to_lexeme_sense(lexeme_id, sense_id, gloss_language, gloss_value,
 
     try:
         # Step 5: Make the API call to edit the entity
-        response = requests.post(base_url, data=post_params, auth=auth, headers=get_user_agent()).json()
+        response = post_api_request(base_url, data=post_params, session=session,
+                                    headers=get_user_agent()).json()
         
         if 'error' in response:
             error_info = response['error'].get('info', 'Unknown error')
@@ -542,13 +1018,14 @@ def add_gloss_to_lexeme_sense(lexeme_id, sense_id, gloss_language, gloss_value,
                 'error': f'Unable to edit. Wikidata API error: {error_info}',
                 'status_code': 503
             }
-        contribution = ContributionModel(wd_item=lexeme_id,
-                                                username=username,
-                                                lang_code=gloss_language,
-                                                edit_type='audio',
-                                                data="Added: " + gloss_value,
-                                                date=datetime.datetime.now())
-        db.session.add(contribution)
+        invalidate_lexeme(lexeme_id)
+        record_contribution(wd_item=lexeme_id,
+                            username=username,
+                            lang_code=gloss_language,
+                            edit_type='gloss',
+                            data="Added: " + gloss_value,
+                            sense_id=sense_id,
+                            revision_id=response.get('entity', {}).get('lastrevid'))
         db.session.commit()
 
     except Exception as e:
@@ -561,11 +1038,7 @@ def add_gloss_to_lexeme_sense(lexeme_id, sense_id, gloss_language, gloss_value,
 
 def add_audio_to_lexeme(username, auth_object, audio_data):
 
-    csrf_token, api_auth_token = generate_csrf_token(base_url,
-                                                     consumer_key,
-                                                     consumer_secret,
-                                                     auth_object['access_token'],
-                                                     auth_object['access_secret'])
+    csrf_token, session = generate_csrf_token(base_url, auth_object)
     results = []
     for data in audio_data:  
         revision_id = None
@@ -593,8 +1066,8 @@ def add_audio_to_lexeme(username, auth_object, audio_data):
             }
 
         try:
-            claim_response = requests.post(base_url, data=params,
-                                           auth=api_auth_token,
+            claim_response = post_api_request(base_url, data=params,
+                                              session=session,
                                            headers=get_user_agent())
         except Exception as e:
             return {
@@ -609,6 +1082,10 @@ def add_audio_to_lexeme(username, auth_object, audio_data):
             }
 
         claim_result = claim_response.json()
+        invalidate_lexeme(data['formid'].split('-')[0])
+        cache.invalidate(get_commons_url_cache_key(file_name))
+        cache.invalidate(get_media_url_cache_key(f'File:{file_name}'))
+        cache.invalidate(f"sparql/{get_missing_audio_template(data['lang_wdqid'])}/")
 
         # get language item here from lang_code
         qualifier_value = data['lang_wdqid']
@@ -622,8 +1099,8 @@ def add_audio_to_lexeme(username, auth_object, audio_data):
         qualifier_params['token'] = csrf_token
 
         try:
-            qual_response = requests.post(base_url, data=qualifier_params,
-                                        auth=api_auth_token)
+            qual_response = post_api_request(base_url, data=qualifier_params,
+                                             session=session)
             qualifier_params = qual_response.json()
             
             if qual_response.status_code != 200:
@@ -636,13 +1113,16 @@ def add_audio_to_lexeme(username, auth_object, audio_data):
             })
 
             # Record contribution on tool
-            contribution = ContributionModel(wd_item=data['formid'].split('-')[0],
-                                             username=username,
-                                             lang_code=data['lang_label'],
-                                             edit_type='audio',
-                                             data=data['formid'] + '-' + file_name,
-                                             date=datetime.datetime.now())
-            db.session.add(contribution)
+            record_contribution(wd_item=data['formid'].split('-')[0],
+                                username=username,
+                                lang_code=data['lang_label'],
+                                edit_type='audio',
+                                data=data['formid'] + '-' + file_name,
+                                form_id=data['formid'],
+                                revision_id=revision_id,
+                                file_name=file_name)
+            # The lease of the form is kept until it expires: WDQS lists
+            # the form as missing audio until it catches up with the edit
             db.session.commit()
 
         except Exception as e:
@@ -668,11 +1148,7 @@ def add_translation_to_lexeme(username, auth_object, data):
     Returns:
         dict: A dictionary containing the results of the operation
     """
-    csrf_token, api_auth = generate_csrf_token(base_url,
-                                               consumer_key,
-                                               consumer_secret,
-                                               auth_object['access_token'],
-                                               auth_object['access_secret'])
+    csrf_token, session = generate_csrf_token(base_url, auth_object)
     result_object = {}
     lastrev_id = None
     if bool(data['is_new']) is True:
@@ -698,7 +1174,8 @@ def add_translation_to_lexeme(username, auth_object, data):
         data['format'] = 'json'
         data['data'] = json.dumps(lexeme_entry)
 
-        response = requests.post(base_url, data=data, auth=api_auth, headers=get_user_agent()).json()
+        response = post_api_request(base_url, data=data, session=session,
+                                    headers=get_user_agent()).json()
 
         if 'error' in response:
             return {
@@ -726,7 +1203,8 @@ def add_translation_to_lexeme(username, auth_object, data):
         }
 
         try:
-            claim_response = requests.post(base_url, data=params, auth=api_auth, headers=get_user_agent())
+            claim_response = post_api_request(base_url, data=params, session=session,
+                                              headers=get_user_agent())
         except Exception as e:
             return {
                 'error': 'Something went wrong!',
@@ -740,6 +1218,9 @@ def add_translation_to_lexeme(username, auth_object, data):
                             .capitalize())
             }
 
+        invalidate_lexeme(data['base_lexeme'].split('-')[0])
+        translation_graph.add_translation(data['base_lexeme'], data['translation_sense_id'])
+        compact_translation_graph()
         results = []
         revision_id = claim_response.json().get('pageinfo').get('lastrevid', None)
         results.append({
@@ -748,29 +1229,23 @@ def add_translation_to_lexeme(username, auth_object, data):
         })
 
         # Record contribution on tool
-        contribution = ContributionModel(wd_item=data['base_lexeme'],
-                                            username=username,
-                                            lang_code=data['translation_language'],
-                                            edit_type='translation',
-                                            data=data['base_lexeme'] + '- P5927 -' + \
-                                                data['translation_sense_id'] ,
-                                            date=datetime.datetime.now())
-        db.session.add(contribution)
+        record_contribution(wd_item=data['base_lexeme'].split('-')[0],
+                            username=username,
+                            lang_code=data['translation_language'],
+                            edit_type='translation',
+                            data=data['base_lexeme'] + '- P5927 -' + \
+                                data['translation_sense_id'],
+                            sense_id=data['base_lexeme'],
+                            revision_id=revision_id)
         db.session.commit()
 
         return {'results': results}
 
 
-def get_auth_object(consumer_key, consumer_secret, decoded_token):
-    return {
-        "consumer_key": consumer_key,
-        "consumer_secret": consumer_secret,
-        "access_token": decoded_token.get('access_token')['key'],
-        "access_secret": decoded_token.get('access_token')['secret'],
-    }
-
-
 def validate_request_body_schema(request_body, schema):
+    # jsonschema is slow to import and only needed by the edit endpoints
+    from jsonschema import validate, ValidationError
+
     try:
         validate(instance=request_body, schema=schema)
         return True
@@ -793,99 +1268,256 @@ def check_exact_match_in_url(word, url):
     return False
 
 
-def get_lexeme_translations(lexeme_id, src_lang, lang_1, lang_2):
-    PARAMS = {
-        'action': 'wbgetentities',
-        'format': 'json',
-        'languages': src_lang,
-        'ids': lexeme_id
-    }
-    result = make_api_request(base_url, PARAMS, get_user_agent())
-    if 'status_code' in list(result.keys()):
+class UpstreamError(Exception):
+    '''
+    Raised by the fetch of a cached read with the error result of a call
+    '''
+
+    def __init__(self, result):
+        super().__init__(result.get('error'))
+        self.result = result
+
+
+def compact_translation_graph():
+    '''
+    Merges the overlay of the translation graph into its rows in the
+    background once it holds TRANSLATION_GRAPH_MAX_OVERLAY entries
+    '''
+    if translation_graph.overlay_size >= translation_graph_max_overlay:
+        submit_background('translation_graph/compact', translation_graph.compact)
+
+
+def get_translation_edges_cache_key(lexeme_id, src_lang):
+    return get_lexeme_cache_prefix(lexeme_id) + f'translations/{src_lang}'
+
+
+def process_translation_edges(lexeme_data):
+    '''
+    The senses of a lexeme as [{'id', 'glosses', 'translations'}]: the
+    languages of their glosses and their P5972 sense ids
+    '''
+    return [{
+        'id': sense['id'],
+        'glosses': list(sense.get('glosses', {})),
+        'translations': get_sense_translations(sense)
+    } for sense in lexeme_data.get('senses', [])]
+
+
+def process_translation_edges_result(result, lexeme_id, src_lang):
+    if 'status_code' in result:
         return result
+    lexeme_data = result['entities'].get(lexeme_id)
+    if lexeme_data is None or 'missing' in lexeme_data:
+        return {'error': f'Lexeme not found: {lexeme_id}', 'status_code': 404}
 
-    lexeme_data = result.get('entities', {}).get(lexeme_id)
-    matching_sense =  next((sense for sense in lexeme_data.get('senses', [])
-                 if sense.get('glosses', {}).get(src_lang)), None)
+    edges = process_translation_edges(lexeme_data)
+    cache.set(get_translation_edges_cache_key(lexeme_id, src_lang), edges, cache_entity_ttl)
+    return edges
 
-    claims = matching_sense.get('claims', {}) if matching_sense else {}
 
-    ids = None
-    if 'P5972' in claims:
-        ids = [entry['mainsnak']['datavalue']['value']['id'] for \
-               entry in claims['P5972']]
+def add_translation_edges_to_graph(edges):
+    '''
+    Feeds cached edges to the translation graph of this worker, which may
+    not have seen the entity they were derived from
+    '''
+    for sense in edges:
+        translation_graph.set_sense(sense['id'], sense['translations'])
+    compact_translation_graph()
+    return edges
 
-    translation_data = get_multiple_lexemes_data(ids, src_lang,
-                                                 lang_1, lang_2,
-                                                 matching_sense['id'] if matching_sense else lexeme_id + '-S1')
-    return translation_data
 
+def get_translation_edges(lexeme_id, src_lang):
+    '''
+    The translation edges of the senses of a lexeme, from the cache or from
+    its entity
+    '''
+    edges = cache.get(get_translation_edges_cache_key(lexeme_id, src_lang))
+    if edges is not MISS:
+        return add_translation_edges_to_graph(edges)
+    return process_translation_edges_result(get_entities([lexeme_id], [src_lang]), lexeme_id,
+                                            src_lang)
 
-def get_multiple_lexemes_data(lexemes_ids, src_lang,
-                              lang_1, lang_2, matching_sense):
-    final_results = []
-    if lexemes_ids is None:
-        for lang in [src_lang, lang_1, lang_2]:
-            final_results.append({
-                'base_lexeme': matching_sense,
-                'lexeme_id': None,
-                'trans_sense_id': None,
-                'trans_language': lang,
-                'value': None
-            })
-        return final_results
 
-    PARAMS = {
-        'action': 'wbgetentities',
-        'format': 'json',
-        'languages': ','.join([src_lang, lang_1, lang_2]),
-        'ids': '|'.join([id.split('-')[0] for id in lexemes_ids])
-    }
+def get_matching_sense_edges(edges, lexeme_id, src_lang):
+    '''
+    The id and P5972 sense ids of the first sense glossed in src_lang. The
+    translations come from the translation graph when it has the sense, as
+    it also holds the translations added since the edges were cached.
+    '''
+    sense = next((sense for sense in edges if src_lang in sense['glosses']), None)
+    if sense is None:
+        return lexeme_id + '-S1', []
+    translations = translation_graph.get_translation_ids(sense['id'])
+    if translations is None:
+        return sense['id'], sense['translations']
+    return sense['id'], translations
 
-    result = make_api_request(base_url, PARAMS, get_user_agent())
-    for lang in [src_lang, lang_1, lang_2]:
-        match_struc = {}
-        for id in lexemes_ids:
-            lexeme_id = id.split('-')[0]
-            lemmas = result['entities'][lexeme_id]['lemmas']
-            if lang in lemmas.keys():
-                match_struc['base_lexeme'] = matching_sense
-                match_struc['trans_lexeme_id'] = lexeme_id
-                match_struc['trans_sense_id'] = id
-                match_struc['trans_language'] = lang
-                match_struc['value'] = lemmas[lang]['value']
-                final_results.append(match_struc)
-                break
-            else:
-                final_results.append({
+
+def get_translation_languages(src_lang, languages):
+    return list(dict.fromkeys([src_lang] + [lang for lang in languages if lang]))
+
+
+def get_lemma_cache_key(lexeme_id, lang):
+    return get_lexeme_cache_prefix(lexeme_id) + f'lemma/{lang}'
+
+
+def get_lemmas_params(lexeme_ids, languages):
+    return dict(get_entities_params(lexeme_ids), languages='|'.join(languages))
+
+
+def get_lemma_batches(pairs):
+    '''
+    wbgetentities (ids, languages) batches of (lexeme ID, language) pairs
+    '''
+    lexeme_ids = list(dict.fromkeys(lexeme_id for lexeme_id, _ in pairs))
+    languages = list(dict.fromkeys(lang for _, lang in pairs))
+    return [(batch, languages) for batch in get_entity_batches(lexeme_ids)]
+
+
+def process_lemmas(result, pairs):
+    '''
+    {(lexeme ID, language): lemma or None} of a wbgetentities result
+    '''
+    if 'status_code' in result:
+        raise UpstreamError(result)
+    entities = result['entities']
+    for entity in entities.values():
+        if 'missing' not in entity:
+            translation_graph.add_lexeme(entity)
+    compact_translation_graph()
+    return {(lexeme_id, lang): entities.get(lexeme_id, {}).get('lemmas', {})
+            .get(lang, {}).get('value')
+            for lexeme_id, lang in pairs if lexeme_id in entities}
+
+
+def get_lemma_cache_keys(pairs):
+    return {pair: get_lemma_cache_key(*pair) for pair in pairs}
+
+
+def get_lemmas(pairs):
+    '''
+    {(lexeme ID, language): lemma or None} of (lexeme ID, language) pairs.
+    The lemmas that are not cached are fetched restricted to their
+    languages, 50 lexemes at a time.
+    '''
+    def fetch_batch(batch, languages, missing):
+        result = make_api_request(base_url, get_lemmas_params(batch, languages),
+                                  get_user_agent())
+        return process_lemmas(result, missing)
+
+    def fetch(missing):
+        lemmas = {}
+        for batch_lemmas in run_concurrently(*[(fetch_batch, batch, languages, missing)
+                                               for batch, languages
+                                               in get_lemma_batches(missing)]):
+            lemmas.update(batch_lemmas)
+        return lemmas
+
+    try:
+        return cached_read_many(get_lemma_cache_keys(pairs), cache_entity_ttl, base_url, fetch)
+    except UpstreamError as error:
+        return error.result
+
+
+def get_translation_pairs(translations, languages):
+    return [(sense_id.split('-')[0], lang) for sense_id in translations for lang in languages]
+
+
+def build_translations(matching_sense, translations, languages, lemmas):
+    '''
+    The translation of each language: the lemma in that language of the
+    first translation lexeme that has one
+    '''
+    found = {}
+    for sense_id in translations:
+        lexeme_id = sense_id.split('-')[0]
+        for lang in languages:
+            value = lemmas.get((lexeme_id, lang))
+            if value is not None and lang not in found:
+                found[lang] = {
                     'base_lexeme': matching_sense,
-                    'lexeme_id': None,
-                    'trans_sense_id': None,
+                    'trans_lexeme_id': lexeme_id,
+                    'trans_sense_id': sense_id,
                     'trans_language': lang,
-                    'value': None
-                })
+                    'value': value
+                }
+    return [found.get(lang) or {
+        'base_lexeme': matching_sense,
+        'lexeme_id': None,
+        'trans_sense_id': None,
+        'trans_language': lang,
+        'value': None
+    } for lang in languages]
 
-    return remove_duplicates_with_priority(final_results)
 
+def get_language_qids(languages):
+    language_qids = {code: qid for code, _, qid in getLanguages()}
+    return {lang: language_qids[lang] for lang in languages if lang in language_qids}
 
-def remove_duplicates_with_priority(data):
-    """
-    Removes duplicate dictionaries from a list based on 'language',
-    prioritizing entries where 'value' is not None.
 
-    Args:
-        data (list): A list of dictionaries with 'id', 'language', and 'value' keys.
+def get_translation_suggestions(matching_sense, language_qids):
+    '''
+    {language QID: sense ids} one translation away from the translations
+    of matching_sense in the translation graph, and the senses whose
+    language the graph does not know yet
+    '''
+    found = translation_graph.get_translations(matching_sense, list(language_qids.values()),
+                                               suggestions=True)
+    return found['suggestions'], found['unknown'][:MAX_ENTITY_IDS]
 
-    Returns:
-        list: A new list with duplicate entries removed.
-    """
-    unique_entries = {}
-    for item in data:
-        key = (item['trans_language'])
 
-        # Add the item if the key is new or if the current item has a value
-        # and the stored one does not.
-        if key not in unique_entries or (item['value'] is not None and unique_entries[key]['value'] is None):
-            unique_entries[key] = item
+def get_suggestion_pairs(suggestions, unknown, language_qids):
+    pairs = [(sense_id.split('-')[0], lang) for lang, qid in language_qids.items()
+             for sense_id in suggestions[qid]]
+    return pairs + get_translation_pairs(unknown, list(language_qids))
+
+
+def build_suggestions(matching_sense, suggestions, language_qids, lemmas):
+    return [{
+        'base_lexeme': matching_sense,
+        'trans_lexeme_id': sense_id.split('-')[0],
+        'trans_sense_id': sense_id,
+        'trans_language': lang,
+        'value': lemmas[(sense_id.split('-')[0], lang)],
+        'suggested': True
+    } for lang, qid in language_qids.items() for sense_id in suggestions[qid]
+        if lemmas.get((sense_id.split('-')[0], lang)) is not None]
+
+
+def add_translation_suggestions(translations, matching_sense, languages):
+    '''
+    Adds to `translations` the senses one translation away, in the language
+    of their lexeme. The lemmas of the translations and suggestions whose
+    language is not known are fetched first, which tells the graph their
+    language.
+    '''
+    language_qids = get_language_qids(languages)
+    suggestions, unknown = get_translation_suggestions(matching_sense, language_qids)
+    lemmas = get_lemmas(get_suggestion_pairs(suggestions, unknown, language_qids))
+    if 'status_code' in lemmas:
+        return lemmas
+    if unknown:
+        suggestions, _ = get_translation_suggestions(matching_sense, language_qids)
+    return translations + build_suggestions(matching_sense, suggestions, language_qids, lemmas)
+
+
+def get_lexeme_translations(lexeme_id, src_lang, languages, suggestions=False):
+    '''
+    Translations of the sense of a lexeme glossed in src_lang in src_lang
+    and each of `languages`, with `suggestions` also the translations of its
+    translations
+    '''
+    edges = get_translation_edges(lexeme_id, src_lang)
+    if 'status_code' in edges:
+        return edges
+
+    languages = get_translation_languages(src_lang, languages)
+    matching_sense, translations = get_matching_sense_edges(edges, lexeme_id, src_lang)
+    lemmas = get_lemmas(get_translation_pairs(translations, languages))
+    if 'status_code' in lemmas:
+        return lemmas
+    result = build_translations(matching_sense, translations, languages, lemmas)
+    if suggestions:
+        return add_translation_suggestions(result, matching_sense, languages)
+    return result
 
-    return list(unique_entries.values())
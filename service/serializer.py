@@ -0,0 +1,164 @@
+import functools
+import json
+from flask import make_response
+from flask_restful import fields
+from flask_restful.utils import unpack
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - depends on the deployment
+    orjson = None
+
+
+def dumps(data):
+    """
+    Encodes `data` as UTF-8 JSON bytes with orjson when it is installed.
+    """
+    if orjson is not None:
+        return orjson.dumps(data, default=str, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(data, default=str, ensure_ascii=False,
+                      separators=(',', ':')).encode('utf-8')
+
+
+def loads(data):
+    """
+    Decodes JSON `data` (bytes or str) with orjson when it is installed.
+    """
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def output_json(data, code, headers=None):
+    """
+    flask_restful representation for application/json using dumps.
+    """
+    response = make_response(dumps(data) + b'\n', code)
+    response.headers['Content-Type'] = 'application/json'
+    response.headers.extend(headers or {})
+    return response
+
+
+def make_getter(key):
+    def get(obj):
+        if obj is None:
+            return None
+        if isinstance(obj, dict):
+            return obj.get(key)
+        return getattr(obj, key, None)
+
+    if not isinstance(key, str) or '.' in key:
+        return lambda obj: fields.get_value(key, obj)
+    return get
+
+
+def compile_field(key, field):
+    """
+    Returns a function that renders `field` of an object the way
+    field.output(key, obj) does, without the per call dispatch.
+    """
+    if isinstance(field, type):
+        field = field()
+
+    get = make_getter(field.attribute or key)
+    default = field.default
+    field_type = type(field)
+
+    if field_type is fields.String:
+        return lambda obj: default if (value := get(obj)) is None else str(value)
+
+    if field_type is fields.Integer:
+        return lambda obj: default if (value := get(obj)) is None else int(value)
+
+    if field_type is fields.Boolean:
+        return lambda obj: default if (value := get(obj)) is None else bool(value)
+
+    if field_type is fields.Float:
+        return lambda obj: default if (value := get(obj)) is None else float(value)
+
+    if field_type is fields.Raw:
+        return lambda obj: default if (value := get(obj)) is None else value
+
+    if field_type is fields.Nested:
+        plan = compile_fields(field.nested)
+        allow_null = field.allow_null
+
+        def nested(obj):
+            value = get(obj)
+            if value is None:
+                if allow_null:
+                    return None
+                if default is not None:
+                    return default
+            return plan(value)
+        return nested
+
+    if field_type is fields.List and type(field.container) is fields.Nested \
+            and not field.container.attribute:
+        render_item = compile_fields(field.container.nested)
+
+        def list_field(obj):
+            value = get(obj)
+            if value is None:
+                return default
+            return [render_item(item) for item in value]
+        return list_field
+
+    # Any other field type keeps its own output()
+    return lambda obj: field.output(key, obj)
+
+
+plans = {}
+
+
+def compile_fields(fields_dict):
+    """
+    Returns the marshaling plan of a flask_restful `fields` dict: a function
+    that turns one object into its serialized dict. Plans are built once per
+    fields dict.
+    """
+    entry = plans.get(id(fields_dict))
+    if entry is not None and entry[0] is fields_dict:
+        return entry[1]
+
+    renderers = [(key, compile_field(key, field)) for key, field in fields_dict.items()]
+
+    def plan(obj):
+        return {key: render(obj) for key, render in renderers}
+
+    # Keep a reference so the id is not reused by another dict
+    plans[id(fields_dict)] = (fields_dict, plan)
+    return plan
+
+
+def marshal(data, fields_dict, envelope=None):
+    """
+    Drop-in replacement of flask_restful.marshal using compiled plans.
+    """
+    plan = compile_fields(fields_dict)
+    if isinstance(data, (list, tuple)):
+        result = [plan(item) for item in data]
+    else:
+        result = plan(data)
+    return {envelope: result} if envelope else result
+
+
+def marshal_result(result, fields_dict, envelope):
+    if isinstance(result, tuple):
+        data, code, headers = unpack(result)
+        return marshal(data, fields_dict, envelope), code, headers
+    return marshal(result, fields_dict, envelope)
+
+
+def marshal_with(fields_dict, envelope=None):
+    """
+    Drop-in replacement of flask_restful.marshal_with using compiled plans.
+    """
+    compile_fields(fields_dict)
+
+    def decorator(f):
+        @functools.wraps(f)
+        def wrapper(*args, **kwargs):
+            return marshal_result(f(*args, **kwargs), fields_dict, envelope)
+        return wrapper
+    return decorator
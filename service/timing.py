@@ -0,0 +1,115 @@
+import json
+import logging
+import threading
+import time
+from urllib.parse import urlparse
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from common import base_url, commons_url, sparql_endpoint_url, slow_request_threshold_ms
+
+logger = logging.getLogger('agpb.slow_requests')
+
+upstream_categories = {
+    urlparse(url).netloc: category
+    for url, category in [(base_url, 'wikidata'), (commons_url, 'commons'),
+                          (sparql_endpoint_url, 'wdqs')]
+    if url
+}
+
+
+def get_upstream_category(host):
+    return upstream_categories.get(host, host)
+
+
+class RequestTimings:
+    """
+    Time and number of calls per category (wikidata, commons, wdqs, db)
+    spent by one request. Calls may come from worker threads of the request.
+    """
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.categories = {}
+        self.lock = threading.Lock()
+
+    def add(self, category, duration):
+        with self.lock:
+            total, count = self.categories.get(category, (0.0, 0))
+            self.categories[category] = (total + duration, count + 1)
+
+    def elapsed_ms(self):
+        return (time.perf_counter() - self.start) * 1000
+
+    def server_timing(self, total_ms):
+        with self.lock:
+            categories = list(self.categories.items())
+        metrics = [f'{category};dur={total * 1000:.1f};desc="{count} calls"'
+                   for category, (total, count) in categories]
+        metrics.append(f'total;dur={total_ms:.1f}')
+        return ', '.join(metrics)
+
+    def as_dict(self):
+        with self.lock:
+            return {category: {'ms': round(total * 1000, 1), 'calls': count}
+                    for category, (total, count) in self.categories.items()}
+
+
+def get_request_timings():
+    if has_request_context():
+        return g.get('request_timings')
+    return None
+
+
+def record_timing(category, duration):
+    """
+    Adds `duration` seconds to `category` of the current request, if any.
+    """
+    timings = get_request_timings()
+    if timings is not None:
+        timings.add(category, duration)
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def start_query_timer(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def stop_query_timer(conn, cursor, statement, parameters, context, executemany):
+    start = conn.info['query_start'].pop()
+    record_timing('db', time.perf_counter() - start)
+
+
+def start_request_timings():
+    g.request_timings = RequestTimings()
+
+
+def add_server_timing(response):
+    """
+    Adds the Server-Timing header and logs requests slower than
+    slow_request_threshold_ms as one JSON line.
+    """
+    timings = g.pop('request_timings', None)
+    if timings is None:
+        return response
+
+    total_ms = timings.elapsed_ms()
+    response.headers['Server-Timing'] = timings.server_timing(total_ms)
+
+    if total_ms >= slow_request_threshold_ms:
+        logger.warning(json.dumps({
+            'event': 'slow_request',
+            'method': request.method,
+            'path': request.path,
+            'endpoint': request.endpoint,
+            'status': response.status_code,
+            'duration_ms': round(total_ms, 1),
+            'upstream': timings.as_dict(),
+        }))
+    return response
+
+
+def init_timing(app):
+    app.before_request(start_request_timings)
+    app.after_request(add_server_timing)
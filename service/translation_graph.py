@@ -0,0 +1,407 @@
+"""
+Local graph of the P5972 (translation) claims between lexeme senses.
+
+Senses are stored as 64-bit keys (lexeme number << 16 | sense number). The
+edges loaded from a lexemes dump are kept in compressed sparse rows: the
+sorted source keys, the offset of each source in the targets array and the
+language of each source. Edges learned afterwards, from live fetches and
+from our own edits, go to an overlay that takes precedence over the rows
+of the same sense until the next compaction, which the API runs in the
+background once the overlay holds TRANSLATION_GRAPH_MAX_OVERLAY entries.
+
+    python -m service.translation_graph latest-lexemes.json.gz graph.bin
+
+builds the graph file that TRANSLATION_GRAPH_PATH points the API at.
+"""
+import argparse
+import bz2
+import gzip
+import json
+import os
+import re
+import threading
+from array import array
+from bisect import bisect_left
+from common import translation_graph_path
+
+SENSE_ID = re.compile(r'L(\d+)-S(\d+)')
+SENSE_BITS = 16
+NO_LANGUAGE = 0
+FILE_MAGIC = b'AGPBTG1\n'
+
+
+def encode_sense_id(sense_id):
+    """
+    The key of a sense id such as 'L3625-S1', or None for other ids.
+    """
+    match = SENSE_ID.fullmatch(sense_id)
+    if match is None or int(match.group(2)) >> SENSE_BITS:
+        return None
+    return int(match.group(1)) << SENSE_BITS | int(match.group(2))
+
+
+def decode_sense_id(key):
+    return f'L{key >> SENSE_BITS}-S{key & ((1 << SENSE_BITS) - 1)}'
+
+
+def get_sense_translations(sense):
+    return [claim['mainsnak']['datavalue']['value']['id']
+            for claim in sense.get('claims', {}).get('P5972', [])
+            if 'datavalue' in claim['mainsnak']]
+
+
+def get_row(keys, key):
+    row = bisect_left(keys, key)
+    return row if row < len(keys) and keys[row] == key else None
+
+
+def build_rows(edges, languages):
+    """
+    The (keys, offsets, targets, languages) rows of `edges`, {source key:
+    target keys}, and `languages`, {key: language index}.
+    """
+    keys = sorted(set(edges) | set(languages))
+    offsets, targets = array('q', [0]), array('q')
+    for key in keys:
+        targets.extend(edges.get(key, ()))
+        offsets.append(len(targets))
+    node_languages = array('H', (languages.get(key, NO_LANGUAGE) for key in keys))
+    return array('q', keys), offsets, targets, node_languages
+
+
+def merge_rows(rows, edges, languages):
+    """
+    The rows of `rows` with the entries of `edges` and `languages` in place
+    of those of the same keys, merged in a single pass over the sorted keys.
+    The runs of rows between two keys of `edges` or `languages` are copied
+    as slices.
+    """
+    keys, offsets, targets, node_languages = rows
+    merged_keys, merged_offsets = array('q'), array('q', [0])
+    merged_targets, merged_languages = array('q'), array('H')
+
+    def copy_rows(start, end):
+        shift = len(merged_targets) - offsets[start]
+        merged_keys.extend(keys[start:end])
+        merged_offsets.extend(offset + shift for offset in offsets[start + 1:end + 1])
+        merged_targets.extend(targets[offsets[start]:offsets[end]])
+        merged_languages.extend(node_languages[start:end])
+
+    row = 0
+    for key in sorted(set(edges) | set(languages)):
+        end = bisect_left(keys, key, row)
+        copy_rows(row, end)
+        row = end
+        if row < len(keys) and keys[row] == key:
+            key_targets = edges.get(key, targets[offsets[row]:offsets[row + 1]])
+            language = languages.get(key, node_languages[row])
+            row += 1
+        else:
+            key_targets = edges.get(key, ())
+            language = languages.get(key, NO_LANGUAGE)
+        merged_keys.append(key)
+        merged_targets.extend(key_targets)
+        merged_offsets.append(len(merged_targets))
+        merged_languages.append(language)
+    copy_rows(row, len(keys))
+    return merged_keys, merged_offsets, merged_targets, merged_languages
+
+
+class TranslationGraph:
+    """
+    Translations between senses with the language of each sense. Reads take
+    no lock: writers replace the overlay entries and the rows as a whole.
+    """
+
+    def __init__(self):
+        # (keys, offsets, targets, languages)
+        self.rows = (array('q'), array('q', [0]), array('q'), array('H'))
+        # Index 0 is NO_LANGUAGE
+        self.language_names = [None]
+        self.language_indexes = {}
+        self.overlay = {}
+        self.overlay_languages = {}
+        self.lock = threading.RLock()
+
+    # languages #
+
+    def get_language_index(self, language):
+        if language is None:
+            return NO_LANGUAGE
+        index = self.language_indexes.get(language)
+        if index is None:
+            with self.lock:
+                index = self.language_indexes.get(language)
+                if index is None:
+                    index = len(self.language_names)
+                    self.language_names.append(language)
+                    self.language_indexes[language] = index
+        return index
+
+    def has_key(self, key):
+        keys = self.rows[0]
+        return (key in self.overlay or key in self.overlay_languages
+                or get_row(keys, key) is not None)
+
+    def get_language_of_key(self, key):
+        index = self.overlay_languages.get(key)
+        if index is None:
+            keys, _, _, languages = self.rows
+            row = get_row(keys, key)
+            index = languages[row] if row is not None else NO_LANGUAGE
+        return index
+
+    def get_language(self, sense_id):
+        key = encode_sense_id(sense_id)
+        return self.language_names[self.get_language_of_key(key)] if key is not None else None
+
+    # edges #
+
+    def get_edges(self, key):
+        edges = self.overlay.get(key)
+        if edges is not None:
+            return edges
+        keys, offsets, targets, _ = self.rows
+        row = get_row(keys, key)
+        if row is None:
+            return ()
+        return targets[offsets[row]:offsets[row + 1]]
+
+    @property
+    def sense_count(self):
+        return len(self.rows[0])
+
+    @property
+    def edge_count(self):
+        return len(self.rows[2])
+
+    @property
+    def overlay_size(self):
+        return len(self.overlay) + len(self.overlay_languages)
+
+    def has_sense(self, sense_id):
+        key = encode_sense_id(sense_id)
+        return key is not None and self.has_key(key)
+
+    def set_sense(self, sense_id, translations, language=None):
+        """
+        Replaces the translations of a sense, as its P5972 claims are now.
+        """
+        key = encode_sense_id(sense_id)
+        if key is None:
+            return
+        targets = tuple(target for target in map(encode_sense_id, translations)
+                        if target is not None)
+        index = self.get_language_index(language) if language is not None else None
+        with self.lock:
+            # Senses fed again as they are do not grow the overlay
+            if (self.has_key(key) and tuple(self.get_edges(key)) == targets
+                    and index in (None, self.get_language_of_key(key))):
+                return
+            self.overlay[key] = targets
+            if index is not None:
+                self.overlay_languages[key] = index
+
+    def set_language(self, sense_id, language):
+        key = encode_sense_id(sense_id)
+        if key is not None:
+            with self.lock:
+                self.overlay_languages[key] = self.get_language_index(language)
+
+    def add_translation(self, sense_id, translation_sense_id):
+        key = encode_sense_id(sense_id)
+        target = encode_sense_id(translation_sense_id)
+        if key is None or target is None:
+            return
+        with self.lock:
+            edges = tuple(self.get_edges(key))
+            if target not in edges:
+                self.overlay[key] = edges + (target,)
+
+    def add_lexeme(self, lexeme_data):
+        """
+        Records the translations of the senses of a wbgetentities lexeme and
+        the language item of the lexeme as their language.
+        """
+        for sense in lexeme_data.get('senses', []):
+            self.set_sense(sense['id'], get_sense_translations(sense),
+                           lexeme_data.get('language'))
+
+    # queries #
+
+    def get_translation_ids(self, sense_id):
+        """
+        The sense ids of the translations of a sense, or None when the graph
+        does not have the sense.
+        """
+        key = encode_sense_id(sense_id)
+        if key is None or not self.has_key(key):
+            return None
+        return [decode_sense_id(target) for target in self.get_edges(key)]
+
+    def get_translations(self, sense_id, languages, suggestions=False):
+        """
+        {'translations': {language: [sense ids]}} of a sense in `languages`
+        and under 'unknown' the translations whose language is not known
+        yet. With `suggestions`, also the senses one more translation away
+        that are not translations already, those of unknown language under
+        'unknown' too.
+        """
+        key = encode_sense_id(sense_id)
+        wanted = {self.language_indexes[language]: language for language in languages
+                  if language in self.language_indexes}
+        result = {'translations': {language: [] for language in languages}, 'unknown': []}
+        if key is None:
+            return result
+
+        direct = self.get_edges(key)
+        for target in direct:
+            index = self.get_language_of_key(target)
+            if index == NO_LANGUAGE:
+                result['unknown'].append(decode_sense_id(target))
+            elif index in wanted:
+                result['translations'][wanted[index]].append(decode_sense_id(target))
+        if not suggestions:
+            return result
+
+        result['suggestions'] = {language: [] for language in languages}
+        seen = set(direct)
+        seen.add(key)
+        for target in direct:
+            for suggestion in self.get_edges(target):
+                if suggestion in seen:
+                    continue
+                seen.add(suggestion)
+                index = self.get_language_of_key(suggestion)
+                if index == NO_LANGUAGE:
+                    result['unknown'].append(decode_sense_id(suggestion))
+                elif index in wanted:
+                    result['suggestions'][wanted[index]].append(decode_sense_id(suggestion))
+        return result
+
+    # building #
+
+    def build(self, edges, languages):
+        """
+        Replaces the rows with `edges`, {source key: target keys}, and
+        `languages`, {key: language index}, and empties the overlay.
+        """
+        rows = build_rows(edges, languages)
+        with self.lock:
+            self.rows = rows
+            self.overlay, self.overlay_languages = {}, {}
+
+    def compact(self):
+        """
+        Merges the overlay into the rows. The rows are built without the
+        lock, from a snapshot of the overlay: the entries written meanwhile
+        stay in the overlay.
+        """
+        with self.lock:
+            rows = self.rows
+            overlay, overlay_languages = dict(self.overlay), dict(self.overlay_languages)
+        rows = merge_rows(rows, overlay, overlay_languages)
+        with self.lock:
+            self.rows = rows
+            self.overlay = {key: value for key, value in self.overlay.items()
+                            if overlay.get(key) is not value}
+            self.overlay_languages = {key: index
+                                      for key, index in self.overlay_languages.items()
+                                      if overlay_languages.get(key) != index}
+
+    # storage #
+
+    def save(self, path):
+        if self.overlay or self.overlay_languages:
+            self.compact()
+        keys, offsets, targets, languages = self.rows
+        header = json.dumps({'languages': self.language_names[1:], 'keys': len(keys),
+                             'targets': len(targets)})
+        with open(path, 'wb') as graph_file:
+            graph_file.write(FILE_MAGIC)
+            graph_file.write(header.encode('utf-8') + b'\n')
+            for values in [keys, offsets, targets, languages]:
+                values.tofile(graph_file)
+
+    @classmethod
+    def load(cls, path):
+        graph = cls()
+        keys, offsets, targets, languages = array('q'), array('q'), array('q'), array('H')
+        with open(path, 'rb') as graph_file:
+            if graph_file.readline() != FILE_MAGIC:
+                raise ValueError(f'{path} is not a translation graph file')
+            header = json.loads(graph_file.readline())
+            keys.fromfile(graph_file, header['keys'])
+            offsets.fromfile(graph_file, header['keys'] + 1)
+            targets.fromfile(graph_file, header['targets'])
+            languages.fromfile(graph_file, header['keys'])
+        for language in header['languages']:
+            graph.get_language_index(language)
+        graph.rows = (keys, offsets, targets, languages)
+        return graph
+
+
+def read_dump(path):
+    """
+    The entities of a Wikidata JSON dump: one entity per line of a JSON
+    array, optionally gzip or bzip2 compressed.
+    """
+    opener = gzip.open if path.endswith('.gz') else bz2.open if path.endswith('.bz2') else open
+    with opener(path, 'rt', encoding='utf-8') as dump:
+        for line in dump:
+            line = line.strip().rstrip(',')
+            if line and line not in ('[', ']'):
+                yield json.loads(line)
+
+
+def ingest_entities(graph, entities):
+    """
+    Builds the rows of `graph` from lexeme entities. The language of a sense
+    is the language item of its lexeme.
+    """
+    edges, languages = {}, {}
+    for entity in entities:
+        if entity.get('type') != 'lexeme':
+            continue
+        language = graph.get_language_index(entity.get('language'))
+        for sense in entity.get('senses', []):
+            key = encode_sense_id(sense['id'])
+            if key is None:
+                continue
+            languages[key] = language
+            targets = array('q', (target for target in map(encode_sense_id,
+                                                            get_sense_translations(sense))
+                                  if target is not None))
+            if targets:
+                edges[key] = targets
+    # Only the senses with translations or that are translations are kept
+    endpoints = set(edges)
+    for targets in edges.values():
+        endpoints.update(targets)
+    graph.build(edges, {key: languages[key] for key in endpoints if key in languages})
+    return graph
+
+
+def load_graph(path):
+    if path and os.path.exists(path):
+        return TranslationGraph.load(path)
+    return TranslationGraph()
+
+
+graph = load_graph(translation_graph_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('dump', help='Wikidata lexemes JSON dump (.json, .json.gz, .json.bz2)')
+    parser.add_argument('output', help='Graph file to write')
+    args = parser.parse_args()
+
+    graph = ingest_entities(TranslationGraph(), read_dump(args.dump))
+    graph.save(args.output)
+    print(f'{graph.sense_count} senses, {graph.edge_count} translations')
+
+
+if __name__ == '__main__':
+    main()
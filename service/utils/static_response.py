@@ -0,0 +1,33 @@
+import hashlib
+from flask import Response, request
+from service.serializer import dumps
+
+
+class StaticResponse:
+    """
+    A JSON response that never changes while the worker runs.
+
+    The body is encoded once and served with a strong ETag, so clients that
+    already have it get an empty 304 instead. Tags of the compressed variants
+    (see service.compression) are recognised as well.
+    """
+
+    def __init__(self, data, max_age=3600):
+        self.body = dumps(data)
+        self.etag = hashlib.sha256(self.body).hexdigest()[:32]
+        self.max_age = max_age
+
+    def make_response(self):
+        etag = self.etag
+        for variant in [self.etag, self.etag + '-gzip', self.etag + '-br']:
+            if request.if_none_match.contains(variant):
+                etag = variant
+                response = Response(status=304)
+                break
+        else:
+            response = Response(self.body, mimetype='application/json')
+
+        response.set_etag(etag)
+        response.cache_control.public = True
+        response.cache_control.max_age = self.max_age
+        return response
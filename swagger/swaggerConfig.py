@@ -1,11 +1,10 @@
-import os
 from flask_restful import Resource
-from flask import jsonify
-import json
+from common import build_swagger_config
+from service.utils.static_response import StaticResponse
+
+swagger_config_response = StaticResponse(build_swagger_config())
 
 
 class SwaggerConfig(Resource):
     def get(self):
-        with open(os.path.dirname(__file__) + '/' + 'config.json', 'r') as config_file:
-            config_data = json.load(config_file)
-        return jsonify(config_data)
+        return swagger_config_response.make_response()
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+
+# Unit tests for the token verification in require_token
+
+import base64
+import time
+import unittest
+from unittest import mock
+import jwt
+from flask import g
+from flask_restful import Resource
+from service import app, api, db
+from service.credentials import get_credentials, delete_credentials
+from service.models import UserModel
+from service.require_token import (token_required, principal_cache,
+                                   invalidate_user_tokens)
+from service.resources.auth.auth import AuthCallBackPost
+from common import prefix
+
+TEST_SECRET = 'test-consumer-secret'
+TEST_KEY = base64.urlsafe_b64encode(b'k' * 32).decode()
+
+
+class WhoAmI(Resource):
+    @token_required
+    def get(self, current_user):
+        return {'username': current_user.username,
+                'token': g.token_claims['token']}, 200
+
+
+api.add_resource(WhoAmI, '/test/whoami')
+api.add_resource(AuthCallBackPost, '/oauth-callback')
+
+
+class TestTokenRequired(unittest.TestCase):
+
+    # setup and teardown #
+
+    # executed prior to each test
+    def setUp(self):
+        app.config['TESTING'] = True
+        app.config['DEBUG'] = False
+        self.app = app.test_client()
+        self.url = (prefix or '') + '/test/whoami'
+        self.secret = mock.patch('service.require_token.consumer_secret', TEST_SECRET)
+        self.secret.start()
+
+        db.create_all()
+        UserModel.query.filter_by(username='token-test-user').delete()
+        self.user = UserModel(username='token-test-user', pref_langs='de,en',
+                              temp_token='temp-token-1')
+        db.session.add(self.user)
+        db.session.commit()
+        self.token = self.make_token('temp-token-1')
+
+    # executed after each test
+    def tearDown(self):
+        self.secret.stop()
+        invalidate_user_tokens(self.user)
+        db.session.delete(self.user)
+        db.session.commit()
+
+    def make_token(self, temp_token, expires_in=3600):
+        return jwt.encode({'token': temp_token, 'exp': int(time.time()) + expires_in},
+                          TEST_SECRET, "HS256")
+
+    def get(self, token):
+        return self.app.get(self.url, headers={'Authorization': f'Bearer {token}'})
+
+    # tests #
+
+    def test_token_decoded_once(self):
+        with mock.patch('service.require_token.jwt.decode', wraps=jwt.decode) as decode:
+            for _ in range(3):
+                response = self.get(self.token)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.json['username'], 'token-test-user')
+        self.assertEqual(decode.call_count, 1)
+
+    def test_missing_token(self):
+        self.assertEqual(self.app.get(self.url).status_code, 401)
+
+    def test_invalidated_on_token_rotation(self):
+        self.assertEqual(self.get(self.token).status_code, 200)
+        self.user.temp_token = 'temp-token-2'
+        db.session.commit()
+        invalidate_user_tokens(self.user)
+        self.assertIsNone(principal_cache.get(self.token))
+        self.assertEqual(self.get(self.token).status_code, 401)
+        self.assertEqual(self.get(self.make_token('temp-token-2')).status_code, 200)
+
+    def test_rotation_in_other_worker(self):
+        # Another worker rotated the temp token, this cache was not told
+        self.assertEqual(self.get(self.token).status_code, 200)
+        self.user.temp_token = 'temp-token-3'
+        db.session.commit()
+        self.assertEqual(self.get(self.token).status_code, 401)
+
+    def test_cache_bounded_by_expiry(self):
+        token = self.make_token('temp-token-1', expires_in=1)
+        self.assertEqual(self.get(token).status_code, 200)
+        time.sleep(1.1)
+        self.assertIsNone(principal_cache.get(token))
+        self.assertEqual(self.get(token).status_code, 401)
+
+    @mock.patch('service.credentials.credentials_key', TEST_KEY)
+    @mock.patch('service.resources.auth.auth.consumer_secret', TEST_SECRET)
+    @mock.patch('service.resources.auth.auth.warm_up_languages')
+    @mock.patch('mwoauth.identify', return_value={'username': 'token-test-user'})
+    @mock.patch('mwoauth.complete')
+    def test_login_warms_up_languages(self, complete, identify, warm_up_languages):
+        import mwoauth
+
+        complete.return_value = mwoauth.AccessToken('key', 'secret')
+        response = self.app.post((prefix or '') + '/oauth-callback',
+                                 json={'request_token': '{"key": "a", "secret": "b"}',
+                                       'query_string': 'oauth_verifier=c'})
+        self.assertEqual(response.status_code, 200)
+        warm_up_languages.assert_called_once_with(['de', 'en'], f'user:{self.user.id}')
+
+    @mock.patch('service.credentials.credentials_key', TEST_KEY)
+    @mock.patch('service.resources.auth.auth.consumer_secret', TEST_SECRET)
+    @mock.patch('service.resources.auth.auth.warm_up_languages')
+    @mock.patch('mwoauth.identify', return_value={'username': 'token-test-user'})
+    @mock.patch('mwoauth.complete')
+    def test_login_keeps_credentials_server_side(self, complete, identify, warm_up_languages):
+        import mwoauth
+
+        complete.return_value = mwoauth.AccessToken('key', 'secret')
+        response = self.app.post((prefix or '') + '/oauth-callback',
+                                 json={'request_token': '{"key": "a", "secret": "b"}',
+                                       'query_string': 'oauth_verifier=c'})
+        claims = jwt.decode(response.json['token'], TEST_SECRET, algorithms=['HS256'])
+        self.assertNotIn('access_token', claims)
+        self.assertEqual(get_credentials(claims['token'])[:2], ('key', 'secret'))
+        delete_credentials(self.user, claims['token'])
+        db.session.commit()
+
+    @mock.patch('service.credentials.credentials_key', '')
+    @mock.patch('mwoauth.complete')
+    def test_login_refused_without_credentials_key(self, complete):
+        response = self.app.post((prefix or '') + '/oauth-callback',
+                                 json={'request_token': '{"key": "a", "secret": "b"}',
+                                       'query_string': 'oauth_verifier=c'})
+        self.assertEqual(response.status_code, 503)
+        complete.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+
+import threading
+import time
+import unittest
+from unittest import mock
+import jwt
+from flask import request
+from flask_restful import Resource
+from service import app, api, db
+from service.models import UserModel
+from service.require_token import (PrincipalCache, invalidate_user_tokens, token_required)
+from service.resources.batch.batch import BatchPost
+from common import prefix
+
+TEST_SECRET = 'batch-test-secret-of-32-bytes-long'
+
+events = []
+events_lock = threading.Lock()
+
+
+def record(event):
+    with events_lock:
+        events.append(event)
+
+
+class BatchRead(Resource):
+    batch_parallel = True
+
+    def post(self, name):
+        record(f'start {name}')
+        time.sleep((request.get_json(silent=True) or {}).get('sleep', 0))
+        record(f'end {name}')
+        return {'name': name}, 200
+
+
+class BatchEdit(Resource):
+    @token_required
+    def post(self, current_user):
+        record('edit')
+        return {'username': current_user.username}, 200
+
+
+api.add_resource(BatchPost, '/batch')
+api.add_resource(BatchRead, '/test/batch/read/<string:name>')
+api.add_resource(BatchEdit, '/test/batch/edit')
+
+
+class TestBatch(unittest.TestCase):
+
+    # setup and teardown #
+
+    # executed prior to each test
+    def setUp(self):
+        app.config['TESTING'] = True
+        app.config['DEBUG'] = False
+        self.app = app.test_client()
+        self.url = (prefix or '') + '/batch'
+        self.secret = mock.patch('service.require_token.consumer_secret', TEST_SECRET)
+        self.secret.start()
+        events.clear()
+
+        db.create_all()
+        UserModel.query.filter_by(username='batch-test-user').delete()
+        self.user = UserModel(username='batch-test-user', pref_langs='de',
+                              temp_token='batch-temp-token')
+        db.session.add(self.user)
+        db.session.commit()
+        token = jwt.encode({'token': 'batch-temp-token', 'exp': int(time.time()) + 3600},
+                           TEST_SECRET, 'HS256')
+        self.auth = {'Authorization': f'Bearer {token}'}
+
+    # executed after each test
+    def tearDown(self):
+        self.secret.stop()
+        invalidate_user_tokens(self.user)
+        db.session.delete(self.user)
+        db.session.commit()
+
+    def read(self, name, sleep=0):
+        return {'method': 'POST', 'path': f'/test/batch/read/{name}', 'body': {'sleep': sleep}}
+
+    # tests #
+
+    def test_responses_in_order(self):
+        response = self.app.post(self.url, json=[
+            self.read('a'),
+            {'method': 'GET', 'path': '/test/batch/missing'},
+            self.read('b'),
+        ])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([(item['status'], item['body'].get('name'))
+                          for item in response.json['responses']],
+                         [(200, 'a'), (404, None), (200, 'b')])
+
+    def test_reads_run_in_parallel(self):
+        start = time.perf_counter()
+        response = self.app.post(self.url, json=[self.read(name, 0.2) for name in 'abc'])
+        self.assertEqual(response.status_code, 200)
+        self.assertLess(time.perf_counter() - start, 0.5)
+
+    def test_edits_run_in_order(self):
+        response = self.app.post(self.url, headers=self.auth, json=[
+            self.read('a', 0.1),
+            {'method': 'POST', 'path': '/test/batch/edit'},
+            self.read('b'),
+        ])
+        self.assertEqual(response.json['responses'][1]['body'],
+                         {'username': 'batch-test-user'})
+        self.assertEqual(events, ['start a', 'end a', 'edit', 'start b', 'end b'])
+
+    def test_token_verified_once(self):
+        # No cache: every resolution but the one of the batch would decode it
+        with mock.patch('service.require_token.principal_cache', PrincipalCache(0, 0)), \
+                mock.patch('service.require_token.jwt.decode', wraps=jwt.decode) as decode:
+            response = self.app.post(self.url, headers=self.auth, json=[
+                {'method': 'POST', 'path': '/test/batch/edit'},
+                {'method': 'POST', 'path': '/test/batch/edit'},
+            ])
+        self.assertEqual([item['status'] for item in response.json['responses']], [200, 200])
+        self.assertEqual(decode.call_count, 1)
+
+    def test_invalid_token(self):
+        response = self.app.post(self.url, headers={'Authorization': 'Bearer invalid'},
+                                 json=[self.read('a')])
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(events, [])
+
+    def test_invalid_batches(self):
+        self.assertEqual(self.app.post(self.url, json=[]).status_code, 400)
+        self.assertEqual(self.app.post(self.url, json=[{'path': '/test/batch/read/a'}])
+                         .status_code, 400)
+        self.assertEqual(self.app.post(self.url, json=[{'method': 'POST', 'path': '/batch'}])
+                         .status_code, 400)
+        with mock.patch('service.resources.batch.batch.batch_max_requests', 2):
+            response = self.app.post(self.url, json=[self.read(name) for name in 'abc'])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(events, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
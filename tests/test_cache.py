@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+
+import os
+import tempfile
+import time
+import unittest
+from unittest import mock
+from service.cache import (Cache, LocalCache, SharedStore, MISS, encode_value,
+                           decode_value)
+
+
+class TestCache(unittest.TestCase):
+
+    # setup and teardown #
+
+    # executed prior to each test
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'cache.sqlite')
+        self.cache = self.make_worker()
+
+    # executed after each test
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def make_worker(self, local_size=100):
+        return Cache(LocalCache(local_size), SharedStore(self.path), sync_interval=0)
+
+    # tests #
+
+    def test_encoding(self):
+        small = {'id': 'L1'}
+        large = {'id': 'L1', 'senses': ['sense'] * 1000}
+        self.assertEqual(decode_value(encode_value(small)), small)
+        self.assertEqual(encode_value(large)[:1], b'z')
+        self.assertEqual(decode_value(encode_value(large)), large)
+
+    def test_get_and_set(self):
+        self.assertIs(self.cache.get('lexeme/L1/entity'), MISS)
+        self.cache.set('lexeme/L1/entity', {'id': 'L1'}, 60)
+        self.assertEqual(self.cache.get('lexeme/L1/entity'), {'id': 'L1'})
+
+    def test_none_is_a_value(self):
+        self.cache.set('label/Q1/de', None, 60)
+        self.assertIsNone(self.cache.get('label/Q1/de'))
+
+    def test_callers_get_copies(self):
+        self.cache.set('lexeme/L1/entity', {'senses': []}, 60)
+        self.cache.get('lexeme/L1/entity')['senses'].append('changed')
+        self.assertEqual(self.cache.get('lexeme/L1/entity'), {'senses': []})
+
+    def test_expiry(self):
+        self.cache.set('label/Q1/de', 'Nomen', 60)
+        with mock.patch('service.cache.time.time', return_value=time.time() + 61):
+            self.assertIs(self.cache.get('label/Q1/de'), MISS)
+
+    def test_stale_entries(self):
+        self.cache.stale_ttl = 60
+        self.cache.set('label/Q1/de', 'Nomen', 60)
+        with mock.patch('service.cache.time.time', return_value=time.time() + 61):
+            self.assertEqual(self.cache.get_entry('label/Q1/de'), ('Nomen', False))
+        with mock.patch('service.cache.time.time', return_value=time.time() + 121):
+            self.assertIsNone(self.cache.get_entry('label/Q1/de'))
+
+    def test_shared_between_workers(self):
+        other = self.make_worker()
+        self.cache.set('label/Q1/de', 'Nomen', 60)
+        self.assertEqual(other.get('label/Q1/de'), 'Nomen')
+
+    def test_invalidate_prefix(self):
+        other = self.make_worker()
+        other.get('lexeme/L1/entity')
+        self.cache.set('lexeme/L1/entity', {'id': 'L1'}, 60)
+        self.cache.set('lexeme/L12/entity', {'id': 'L12'}, 60)
+        self.assertEqual(other.get('lexeme/L1/entity'), {'id': 'L1'})
+
+        self.cache.invalidate('lexeme/L1/')
+        self.assertIs(self.cache.get('lexeme/L1/entity'), MISS)
+        # Dropped from the local cache of the other worker at its next sync
+        self.assertIs(other.get('lexeme/L1/entity'), MISS)
+        self.assertEqual(other.get('lexeme/L12/entity'), {'id': 'L12'})
+
+    def test_local_cache_is_bounded(self):
+        local = LocalCache(2)
+        for key in ['a', 'b', 'c']:
+            local.set(key, b'j1', time.time() + 60)
+        self.assertEqual(list(local.entries), ['b', 'c'])
+
+    def test_shared_store_is_bounded(self):
+        store = SharedStore(self.path, max_size=20)
+        now = time.time()
+        for key, expires_at in [('a', now + 30), ('b', now + 60), ('c', now + 90)]:
+            store.set(key, b'j' + b'1' * 9, expires_at)
+        store.purge(now)
+        # The entry that expires first is evicted
+        self.assertIsNone(store.get('a'))
+        self.assertIsNotNone(store.get('b'))
+        self.assertIsNotNone(store.get('c'))
+
+    def test_local_only(self):
+        cache = Cache(LocalCache(10))
+        cache.set('search/de/Mutter', {'search': []}, 60)
+        self.assertEqual(cache.get('search/de/Mutter'), {'search': []})
+        cache.invalidate('search/')
+        self.assertIs(cache.get('search/de/Mutter'), MISS)
+
+
+if __name__ == '__main__':
+    unittest.main()
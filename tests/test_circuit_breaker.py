@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+
+import unittest
+from unittest import mock
+from service.circuit_breaker import (CircuitBreaker, CircuitOpenError, CLOSED, HALF_OPEN,
+                                     OPEN)
+
+
+class TestCircuitBreaker(unittest.TestCase):
+
+    # setup and teardown #
+
+    # executed prior to each test
+    def setUp(self):
+        self.breaker = CircuitBreaker('wikidata.test', failure_threshold=2, reset_timeout=30)
+
+    # tests #
+
+    def test_opens_after_failures_in_a_row(self):
+        self.breaker.record_failure()
+        self.breaker.record_success()
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, CLOSED)
+
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, OPEN)
+        with self.assertRaises(CircuitOpenError) as raised:
+            self.breaker.before_call()
+        self.assertEqual(raised.exception.code, 503)
+        self.assertEqual(raised.exception.get_headers()[-1], ('Retry-After', '30'))
+
+    def test_single_trial_after_reset_timeout(self):
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+
+        with mock.patch('service.circuit_breaker.time.monotonic',
+                        return_value=self.breaker.opened_at + 31):
+            self.breaker.before_call()
+            self.assertEqual(self.breaker.state, HALF_OPEN)
+            with self.assertRaises(CircuitOpenError):
+                self.breaker.before_call()
+
+        self.breaker.record_success()
+        self.assertEqual(self.breaker.state, CLOSED)
+        self.breaker.before_call()
+
+    def test_failed_trial_opens_again(self):
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+        with mock.patch('service.circuit_breaker.time.monotonic',
+                        return_value=self.breaker.opened_at + 31):
+            self.breaker.before_call()
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, OPEN)
+        with self.assertRaises(CircuitOpenError):
+            self.breaker.before_call()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+
+# Tests of the Commons endpoint and helpers against the local Commons
+# stand-in of benchmarks/standin.py
+
+import os
+import tempfile
+import unittest
+from unittest import mock
+from service import app, api
+from service.cache import SharedStore, cache
+from service.credentials import make_session
+from service.resources.commons.commons import CommonsFIleUrLPost
+from service.resources.commons.utils import get_media_url_by_title, upload_file
+from benchmarks.standin import StandIn
+from common import prefix
+
+api.add_resource(CommonsFIleUrLPost, '/file/url/<string:titles>')
+
+
+def setUpModule():
+    # The tests clear and fill a cache file of their own, not the one of
+    # CACHE_PATH that the workers of this host share
+    global cache_directory, cache_patches
+    cache_directory = tempfile.TemporaryDirectory()
+    cache_patches = [
+        mock.patch.object(cache, 'shared',
+                          SharedStore(os.path.join(cache_directory.name, 'cache.sqlite'))),
+        mock.patch.object(cache, 'last_invalidation', None),
+    ]
+    for patch in cache_patches:
+        patch.start()
+
+
+def tearDownModule():
+    for patch in cache_patches:
+        patch.stop()
+    cache.local.clear()
+    cache_directory.cleanup()
+
+
+class TestCommons(unittest.TestCase):
+
+    # setup and teardown #
+
+    @classmethod
+    def setUpClass(cls):
+        cls.standin = StandIn('commons').start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.standin.stop()
+
+    # executed prior to each test
+    def setUp(self):
+        app.config['TESTING'] = True
+        app.config['DEBUG'] = False
+        self.app = app.test_client()
+        cache.clear()
+        self.patches = [
+            mock.patch('service.resources.commons.utils.commons_url', self.standin.url),
+            mock.patch('service.credentials.consumer_key', 'consumer'),
+            mock.patch('service.credentials.consumer_secret', 'secret'),
+        ]
+        for patch in self.patches:
+            patch.start()
+        self.standin.reset()
+
+    # executed after each test
+    def tearDown(self):
+        for patch in self.patches:
+            patch.stop()
+
+    # tests #
+
+    def test_file_url(self):
+        title = 'File:L3625-de-Mutter.ogg'
+        response = self.app.post((prefix or '') + f'/file/url/{title}', json={'titles': title})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json, [{
+            'title': title,
+            'url': 'https://upload.wikimedia.org/wikipedia/commons/a/ab/L3625-de-Mutter.ogg'
+        }])
+        self.assertEqual(self.standin.reset(), {'query': 1})
+
+    def test_file_url_without_titles(self):
+        response = self.app.post((prefix or '') + '/file/url/x', json={})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.standin.reset(), {})
+
+    def test_media_url_by_title(self):
+        results = get_media_url_by_title('File:a.ogg')
+        self.assertEqual(results[0]['title'], 'File:a.ogg')
+        self.assertTrue(results[0]['url'].endswith('/a.ogg'))
+
+    def test_upload_file(self):
+        response = upload_file(b'OggS', 'user', 'German',
+                               {'access_token': 'key', 'access_secret': 'secret',
+                                'session': make_session('key', 'secret')},
+                               'L3625-de-Mutter.ogg')
+        self.assertEqual(response.json()['upload'],
+                         {'result': 'Success', 'filename': 'L3625-de-Mutter.ogg'})
+        self.assertEqual(self.standin.reset(), {'query': 1, 'upload': 1})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+
+# Unit tests for the contribution statistics
+
+import datetime
+import gzip
+import json
+import unittest
+from service import app, api, db
+from service.models import ContributionModel, ContributionStatModel
+from service.resources.contributions.contribution import (ContributionsStatsGet,
+                                                          ContributionsLeaderboardGet,
+                                                          ContributionsExport,
+                                                          ContributionPost,
+                                                          ContributionPatch,
+                                                          ContributionDelete)
+from service.resources.contributions.utils import (record_contribution,
+                                                   rebuild_contribution_stats,
+                                                   has_form_audio_contribution,
+                                                   get_latest_revision_id)
+from common import prefix
+
+api.add_resource(ContributionsStatsGet, '/contributions/stats')
+api.add_resource(ContributionsLeaderboardGet, '/contributions/leaderboard')
+api.add_resource(ContributionsExport, '/contributions/export')
+api.add_resource(ContributionPost, '/contributions')
+api.add_resource(ContributionPatch, '/contribution/<int:id>')
+api.add_resource(ContributionDelete, '/contribution/<int:id>')
+
+STATS_USERS = ['stats-test-user-1', 'stats-test-user-2']
+
+
+class TestContributionStats(unittest.TestCase):
+
+    # setup and teardown #
+
+    # executed prior to each test
+    def setUp(self):
+        app.config['TESTING'] = True
+        app.config['DEBUG'] = False
+        self.app = app.test_client()
+        self.prefix = prefix or ''
+        db.create_all()
+        self.clean_up()
+        day = datetime.datetime(2025, 3, 1, 10, 30)
+        record_contribution('L1', STATS_USERS[0], 'de', 'audio', 'L1-F1-a.ogg', day)
+        record_contribution('L2', STATS_USERS[0], 'de', 'audio', 'L2-F1-b.ogg', day)
+        record_contribution('L3', STATS_USERS[0], 'ig', 'translation', 'L3-S1', day)
+        record_contribution('L4', STATS_USERS[1], 'de', 'audio', 'L4-F1-c.ogg',
+                            day + datetime.timedelta(days=1))
+        db.session.commit()
+
+    # executed after each test
+    def tearDown(self):
+        self.clean_up()
+
+    def clean_up(self):
+        for model in [ContributionModel, ContributionStatModel]:
+            model.query.filter(model.username.in_(STATS_USERS)).delete()
+        db.session.commit()
+
+    # tests #
+
+    def test_record_contribution_updates_rollup(self):
+        stat = ContributionStatModel.query.filter_by(username=STATS_USERS[0],
+                                                     lang_code='de',
+                                                     edit_type='audio').one()
+        self.assertEqual(stat.count, 2)
+        self.assertEqual(stat.day, datetime.date(2025, 3, 1))
+
+    def test_rebuild_matches_incremental_rollup(self):
+        before = sorted((s.username, s.lang_code, s.edit_type, s.day, s.count)
+                        for s in ContributionStatModel.query.filter(
+                            ContributionStatModel.username.in_(STATS_USERS)))
+        rebuild_contribution_stats()
+        after = sorted((s.username, s.lang_code, s.edit_type, s.day, s.count)
+                       for s in ContributionStatModel.query.filter(
+                           ContributionStatModel.username.in_(STATS_USERS)))
+        self.assertEqual(before, after)
+
+    def get_rollup(self):
+        return sorted((s.username, s.lang_code, s.edit_type, s.day, s.count)
+                      for s in ContributionStatModel.query.filter(
+                          ContributionStatModel.username.in_(STATS_USERS)))
+
+    def test_first_contribution_of_a_group_twice(self):
+        # A group without a row yet, as two requests would record it
+        record_contribution('L5', STATS_USERS[1], 'yo', 'audio', 'L5-F1-d.ogg')
+        record_contribution('L6', STATS_USERS[1], 'yo', 'audio', 'L6-F1-e.ogg')
+        db.session.commit()
+        stat = ContributionStatModel.query.filter_by(username=STATS_USERS[1],
+                                                     lang_code='yo').one()
+        self.assertEqual(stat.count, 2)
+
+    def test_contribution_endpoints_update_rollup(self):
+        response = self.app.post(self.prefix + '/contributions',
+                                 json={'username': STATS_USERS[1], 'lang_code': 'ig',
+                                       'edit_type': 'gloss', 'data': 'Added: x'})
+        self.assertEqual(response.status_code, 201)
+        contribution = ContributionModel.query.filter_by(username=STATS_USERS[0],
+                                                         wd_item='L3').one()
+        response = self.app.patch(self.prefix + f'/contribution/{contribution.id}',
+                                  json={'username': STATS_USERS[1], 'lang_code': 'ig',
+                                        'edit_type': 'gloss', 'data': 'L3-S1'})
+        self.assertEqual(response.status_code, 200)
+        contribution = ContributionModel.query.filter_by(username=STATS_USERS[0],
+                                                         wd_item='L1').one()
+        self.app.delete(self.prefix + f'/contribution/{contribution.id}')
+
+        incremental = self.get_rollup()
+        rebuild_contribution_stats()
+        self.assertEqual(incremental, self.get_rollup())
+        self.assertIn((STATS_USERS[0], 'de', 'audio', datetime.date(2025, 3, 1), 1),
+                      incremental)
+        # The translation was moved, its group is dropped
+        self.assertNotIn('translation', [stat[2] for stat in incremental])
+
+    def test_structured_lookups(self):
+        record_contribution('L9001', STATS_USERS[0], 'de', 'audio', 'L9001-F1-x.ogg',
+                            form_id='L9001-F1', revision_id=10, file_name='x.ogg')
+        record_contribution('L9001', STATS_USERS[0], 'de', 'gloss', 'Added: x',
+                            sense_id='L9001-S1', revision_id=12)
+        db.session.commit()
+        self.assertTrue(has_form_audio_contribution('L9001-F1'))
+        self.assertFalse(has_form_audio_contribution('L9001-F2'))
+        self.assertEqual(get_latest_revision_id('L9001'), 12)
+
+    def test_get_stats(self):
+        response = self.app.get(self.prefix + '/contributions/stats?group_by=username,day'
+                                f'&username={STATS_USERS[0]}')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json, [{
+            'username': STATS_USERS[0],
+            'lang_code': None,
+            'edit_type': None,
+            'day': '2025-03-01',
+            'count': 3
+        }])
+
+    def test_get_stats_invalid_group(self):
+        response = self.app.get(self.prefix + '/contributions/stats?group_by=data')
+        self.assertEqual(response.status_code, 400)
+
+    def test_get_leaderboard(self):
+        response = self.app.get(self.prefix + '/contributions/leaderboard?lang_code=de'
+                                '&start_date=2025-03-01&end_date=2025-03-02&limit=100')
+        self.assertEqual(response.status_code, 200)
+        ranking = [entry for entry in response.json if entry['username'] in STATS_USERS]
+        self.assertEqual([(entry['username'], entry['count']) for entry in ranking],
+                         [(STATS_USERS[0], 2), (STATS_USERS[1], 1)])
+
+
+class TestContributionExport(unittest.TestCase):
+
+    # setup and teardown #
+
+    # executed prior to each test
+    def setUp(self):
+        app.config['TESTING'] = True
+        app.config['DEBUG'] = False
+        self.app = app.test_client()
+        self.url = (prefix or '') + '/contributions/export?username=' + STATS_USERS[0]
+        db.create_all()
+        self.clean_up()
+        for index in range(5):
+            record_contribution(f'L{index}', STATS_USERS[0], 'de', 'audio',
+                                f'L{index}-F1-file,{index}.ogg')
+        db.session.commit()
+
+    # executed after each test
+    def tearDown(self):
+        self.clean_up()
+
+    def clean_up(self):
+        for model in [ContributionModel, ContributionStatModel]:
+            model.query.filter(model.username.in_(STATS_USERS)).delete()
+        db.session.commit()
+
+    # tests #
+
+    def test_export_ndjson(self):
+        response = self.app.get(self.url, headers={'Accept-Encoding': 'identity'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, 'application/x-ndjson')
+        rows = [json.loads(line) for line in response.data.decode().splitlines()]
+        self.assertEqual([row['wd_item'] for row in rows], ['L0', 'L1', 'L2', 'L3', 'L4'])
+        self.assertEqual(rows, sorted(rows, key=lambda row: row['id']))
+
+    def test_export_resumes_after_id(self):
+        first = [json.loads(line) for line in
+                 self.app.get(self.url + '&compress=none').data.decode().splitlines()]
+        response = self.app.get(self.url + f'&compress=none&after_id={first[2]["id"]}')
+        rows = [json.loads(line) for line in response.data.decode().splitlines()]
+        self.assertEqual(rows, first[3:])
+
+    def test_export_csv_gzip(self):
+        response = self.app.get(self.url + '&format=csv', headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        lines = gzip.decompress(response.data).decode().splitlines()
+        self.assertEqual(lines[0], 'id,wd_item,username,lang_code,edit_type,data,date,'
+                         'form_id,sense_id,revision_id,file_name')
+        self.assertEqual(len(lines), 6)
+        self.assertIn('"L0-F1-file,0.ogg"', lines[1])
+
+    def test_export_invalid_format(self):
+        response = self.app.get(self.url + '&format=xml')
+        self.assertEqual(response.status_code, 400)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+
+import base64
+import unittest
+from unittest import mock
+from service import db
+from service.credentials import (CredentialCache, CredentialsError, credential_cache, decrypt,
+                                 delete_credentials, encrypt, get_credentials,
+                                 get_credentials_key_error, get_token_digest,
+                                 store_credentials)
+from service.models import CredentialModel, UserModel
+from service.resources.auth.utils import get_auth_object
+
+TEST_KEY = base64.urlsafe_b64encode(b'k' * 32).decode()
+
+
+class TestCredentials(unittest.TestCase):
+
+    # setup and teardown #
+
+    # executed prior to each test
+    def setUp(self):
+        self.key = mock.patch('service.credentials.credentials_key', TEST_KEY)
+        self.key.start()
+        db.create_all()
+        UserModel.query.filter_by(username='credentials-test-user').delete()
+        self.user = UserModel(username='credentials-test-user', pref_langs='de',
+                              temp_token='credentials-temp-token')
+        db.session.add(self.user)
+        db.session.flush()
+        store_credentials(self.user, 'credentials-temp-token', 'key', 'secret')
+        db.session.commit()
+
+    # executed after each test
+    def tearDown(self):
+        delete_credentials(self.user, 'credentials-temp-token')
+        db.session.delete(self.user)
+        db.session.commit()
+        self.key.stop()
+
+    # tests #
+
+    def test_encryption(self):
+        data = encrypt(b'access token', b'digest')
+        self.assertNotIn(b'access token', data)
+        self.assertEqual(decrypt(data, b'digest'), b'access token')
+        # Another nonce each time
+        self.assertNotEqual(encrypt(b'access token', b'digest'), data)
+
+    def test_tampering_detected(self):
+        data = encrypt(b'access token', b'digest')
+        tampered = data[:20] + bytes([data[20] ^ 1]) + data[21:]
+        with self.assertRaises(CredentialsError):
+            decrypt(tampered, b'digest')
+        with self.assertRaises(CredentialsError):
+            decrypt(data, b'other digest')
+        other_key = base64.urlsafe_b64encode(b'o' * 32).decode()
+        with mock.patch('service.credentials.credentials_key', other_key):
+            with self.assertRaises(CredentialsError):
+                decrypt(data, b'digest')
+
+    def test_no_key(self):
+        for key in ['', 'too-short']:
+            with mock.patch('service.credentials.credentials_key', key):
+                self.assertIsNotNone(get_credentials_key_error())
+                with self.assertRaises(CredentialsError):
+                    store_credentials(self.user, 'credentials-temp-token-2', 'key', 'secret')
+                credential_cache.invalidate(get_token_digest('credentials-temp-token'))
+                self.assertIsNone(get_credentials('credentials-temp-token'))
+        # The stored credentials are left as they were
+        self.assertEqual(get_credentials('credentials-temp-token')[:2], ('key', 'secret'))
+
+    def test_stored_encrypted(self):
+        record = db.session.get(CredentialModel, get_token_digest('credentials-temp-token'))
+        self.assertEqual(record.user_id, self.user.id)
+        self.assertNotIn(b'secret', record.data)
+
+    def test_session_reused(self):
+        key, secret, session = get_credentials('credentials-temp-token')
+        self.assertEqual((key, secret), ('key', 'secret'))
+        self.assertIs(get_credentials('credentials-temp-token')[2], session)
+        self.assertIs(get_auth_object({'token': 'credentials-temp-token'})['session'], session)
+
+    def test_read_from_database_by_other_worker(self):
+        get_credentials('credentials-temp-token')
+        credential_cache.invalidate(get_token_digest('credentials-temp-token'))
+        self.assertEqual(get_credentials('credentials-temp-token')[:2], ('key', 'secret'))
+
+    def test_login_replaces_credentials(self):
+        store_credentials(self.user, 'credentials-temp-token-2', 'key-2', 'secret-2')
+        db.session.commit()
+        credential_cache.invalidate(get_token_digest('credentials-temp-token'))
+        self.assertIsNone(get_credentials('credentials-temp-token'))
+        self.assertEqual(get_credentials('credentials-temp-token-2')[:2], ('key-2', 'secret-2'))
+
+    def test_legacy_token(self):
+        delete_credentials(self.user, 'credentials-temp-token')
+        db.session.commit()
+        self.assertIsNone(get_auth_object({'token': 'credentials-temp-token'}))
+        auth_obj = get_auth_object({'token': 'credentials-temp-token',
+                                    'access_token': {'key': 'key', 'secret': 'secret'}})
+        self.assertEqual(auth_obj['access_secret'], 'secret')
+
+    def test_cache_bounded(self):
+        cache = CredentialCache(2, 60)
+        for digest in ['a', 'b', 'c']:
+            cache.set(digest, 'key', 'secret', None)
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(cache.get('c'), ('key', 'secret', None))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+
+# Unit tests for the language routes and the swagger config
+
+import os
+import unittest
+from service import app, api
+from service.resources.languages.languages import LanguagesGet, LanguageGet
+from swagger.swaggerConfig import SwaggerConfig
+from service.utils.languages import getLanguages
+from common import prefix
+
+api.add_resource(LanguagesGet, '/languages')
+api.add_resource(LanguageGet, '/languages/<string:lang_code>')
+api.add_resource(SwaggerConfig, '/swagger-config')
+
+SWAGGER_CONFIG_PATH = os.path.join(os.path.dirname(__file__), '..', 'swagger', 'config.json')
+
+
+class TestLanguages(unittest.TestCase):
+
+    # setup and teardown #
+
+    # executed prior to each test
+    def setUp(self):
+        app.config['TESTING'] = True
+        app.config['DEBUG'] = False
+        self.app = app.test_client()
+        self.prefix = prefix or ''
+
+    # tests #
+
+    def test_get_languages(self):
+        response = self.app.get(self.prefix + '/languages')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json), len(getLanguages()))
+        self.assertEqual(response.json[0], {'lang_code': 'aa', 'lang_label': 'Afaraf',
+                                            'lang_wd_id': 'Q36279'})
+        self.assertIsNotNone(response.headers.get('ETag'))
+        self.assertIn('max-age', response.headers['Cache-Control'])
+
+    def test_get_languages_not_modified(self):
+        etag = self.app.get(self.prefix + '/languages').headers['ETag']
+        response = self.app.get(self.prefix + '/languages', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.data, b'')
+
+    def test_get_language(self):
+        response = self.app.post(self.prefix + '/languages/ig', json={'lang_code': 'ig'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json['lang_wd_id'], 'Q33578')
+
+    def test_get_language_not_supported(self):
+        response = self.app.post(self.prefix + '/languages/xx', json={'lang_code': 'xx'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_swagger_config_not_written(self):
+        with open(SWAGGER_CONFIG_PATH, 'rb') as config_file:
+            before = config_file.read()
+        response = self.app.get(self.prefix + '/swagger-config')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('servers', response.json)
+        with open(SWAGGER_CONFIG_PATH, 'rb') as config_file:
+            self.assertEqual(config_file.read(), before)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+
+# Unit tests for the metrics registry and the /metrics endpoint
+
+import unittest
+from unittest import mock
+import requests
+from flask_restful import Resource
+from service import app, api
+from service.metrics import (Registry, Counter, Histogram, HitRatio, REQUESTS,
+                             UPSTREAM_ERRORS)
+from service.resources.metrics.metrics import MetricsGet
+from service.resources.utils import send_api_request, get_api_action
+from common import prefix
+
+
+class MetricsProbe(Resource):
+    def get(self):
+        return {'ok': True}
+
+
+api.add_resource(MetricsProbe, '/test/metrics-probe')
+api.add_resource(MetricsGet, '/metrics')
+
+
+class TestRegistry(unittest.TestCase):
+
+    # tests #
+
+    def test_histogram_buckets_are_cumulative(self):
+        registry = Registry()
+        histogram = Histogram('latency_seconds', 'Latency.', ('resource',),
+                              buckets=(0.1, 1.0), registry=registry)
+        for value in [0.05, 0.1, 0.5, 3]:
+            histogram.observe(value, 'Lexemes')
+
+        lines = registry.render().splitlines()
+        self.assertIn('latency_seconds_bucket{resource="Lexemes",le="0.1"} 2', lines)
+        self.assertIn('latency_seconds_bucket{resource="Lexemes",le="1"} 3', lines)
+        self.assertIn('latency_seconds_bucket{resource="Lexemes",le="+Inf"} 4', lines)
+        self.assertIn('latency_seconds_sum{resource="Lexemes"} 3.65', lines)
+        self.assertIn('latency_seconds_count{resource="Lexemes"} 4', lines)
+
+    def test_hit_ratio(self):
+        registry = Registry()
+        lookups = Counter('lookups_total', 'Lookups.', ('cache', 'result'), registry=registry)
+        HitRatio('hit_ratio', 'Hit ratio.', lookups, registry=registry)
+        lookups.inc('token', 'hit', amount=3)
+        lookups.inc('token', 'miss')
+
+        self.assertIn('hit_ratio{cache="token"} 0.75', registry.render().splitlines())
+
+    def test_label_values_are_escaped(self):
+        registry = Registry()
+        Counter('calls_total', 'Calls.', ('action',), registry=registry).inc('a"b\\c')
+        self.assertIn('calls_total{action="a\\"b\\\\c"} 1', registry.render())
+
+    def test_api_action(self):
+        self.assertEqual(get_api_action({'action': 'wbgetentities'}), 'wbgetentities')
+        self.assertEqual(get_api_action({'action': 'query', 'prop': 'imageinfo'}),
+                         'query:imageinfo')
+        self.assertEqual(get_api_action(None), 'unknown')
+
+
+class TestMetricsEndpoint(unittest.TestCase):
+
+    # setup and teardown #
+
+    # executed prior to each test
+    def setUp(self):
+        app.config['TESTING'] = True
+        app.config['DEBUG'] = False
+        self.app = app.test_client()
+
+    # tests #
+
+    def test_requests_are_counted_per_resource(self):
+        before = REQUESTS.get('MetricsProbe', 'GET', '200')
+        self.app.get((prefix or '') + '/test/metrics-probe')
+        self.assertEqual(REQUESTS.get('MetricsProbe', 'GET', '200'), before + 1)
+
+        response = self.app.get((prefix or '') + '/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.content_type.startswith('text/plain'))
+        body = response.get_data(as_text=True)
+        self.assertIn('agpb_http_request_duration_seconds_count'
+                      '{resource="MetricsProbe",method="GET"}', body)
+        self.assertIn('agpb_http_requests_in_flight{resource="MetricsGet"} 1', body)
+
+    def test_upstream_errors_are_counted(self):
+        before = UPSTREAM_ERRORS.get('www.wikidata.org', 'wbgetentities')
+        with mock.patch('requests.request', side_effect=requests.ConnectionError):
+            with self.assertRaises(requests.ConnectionError):
+                send_api_request('GET', 'https://www.wikidata.org/w/api.php',
+                                 params={'action': 'wbgetentities'})
+        self.assertEqual(UPSTREAM_ERRORS.get('www.wikidata.org', 'wbgetentities'),
+                         before + 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
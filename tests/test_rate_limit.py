@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+
+import os
+import tempfile
+import time
+import unittest
+from unittest import mock
+import jwt
+from flask_restful import Resource
+from service import app, api, db
+from service.cache import SharedStore
+from service.models import UserModel
+from service.rate_limit import TokenBuckets, SharedTokenBuckets, parse_rate_limits
+from service.require_token import invalidate_user_tokens
+from common import prefix
+
+TEST_SECRET = 'rate-limit-test-secret-of-32-bytes'
+
+
+class RateLimited(Resource):
+    rate_limit = 'test'
+
+    def get(self):
+        return {'ok': True}, 200
+
+
+api.add_resource(RateLimited, '/test/rate-limited')
+
+
+class TestTokenBuckets(unittest.TestCase):
+
+    # tests #
+
+    def test_parse_rate_limits(self):
+        self.assertEqual(parse_rate_limits('search=60/60, edit=30/120,'),
+                         {'search': (60, 1.0), 'edit': (30, 0.25)})
+        self.assertEqual(parse_rate_limits(''), {})
+        # No limit
+        self.assertEqual(parse_rate_limits('search=0/60,edit=30'), {'edit': (30, 30.0)})
+
+    def test_parse_invalid_rate_limits(self):
+        for value in ['search=abc', 'search=60/0', 'search=60/-1', 'search=-1/60',
+                      'search=60/x', '=60/60', 'search']:
+            with self.assertRaisesRegex(ValueError, 'RATE_LIMITS item'):
+                parse_rate_limits(f'edit=30/60,{value}')
+
+    def test_burst_then_refill(self):
+        buckets = TokenBuckets(10)
+        self.assertEqual([buckets.take('a', 2, 0.5, 100.0) for _ in range(3)], [0, 0, 2.0])
+        self.assertEqual(buckets.take('b', 2, 0.5, 100.0), 0)
+        self.assertEqual(buckets.take('a', 2, 0.5, 102.0), 0)
+
+    def test_bounded_keys(self):
+        buckets = TokenBuckets(2)
+        for key in ['a', 'b', 'c']:
+            buckets.take(key, 1, 1.0, 100.0)
+        self.assertEqual(list(buckets.buckets), ['b', 'c'])
+
+    def test_shared_between_workers(self):
+        with tempfile.TemporaryDirectory() as directory:
+            store = SharedStore(os.path.join(directory, 'cache.sqlite'))
+            worker_1 = SharedTokenBuckets(store, 60)
+            worker_2 = SharedTokenBuckets(store, 60)
+            self.assertEqual(worker_1.take('a', 2, 0.5, 100.0), 0)
+            self.assertEqual(worker_2.take('a', 2, 0.5, 100.0), 0)
+            self.assertEqual(worker_1.take('a', 2, 0.5, 100.0), 2.0)
+            self.assertEqual(worker_2.take('a', 2, 0.5, 102.0), 0)
+
+
+class TestRateLimit(unittest.TestCase):
+
+    # setup and teardown #
+
+    # executed prior to each test
+    def setUp(self):
+        app.config['TESTING'] = True
+        app.config['DEBUG'] = False
+        self.app = app.test_client()
+        self.url = (prefix or '') + '/test/rate-limited'
+        self.patches = [
+            mock.patch('service.rate_limit.limits', {'test': (2, 1 / 30)}),
+            mock.patch('service.rate_limit.buckets', TokenBuckets(100)),
+            mock.patch('service.require_token.consumer_secret', TEST_SECRET),
+        ]
+        for patch in self.patches:
+            patch.start()
+
+        db.create_all()
+        self.user = UserModel(username='rate-limit-test-user', pref_langs='de,en',
+                              temp_token='rate-limit-temp-token')
+        db.session.add(self.user)
+        db.session.commit()
+        token = jwt.encode({'token': 'rate-limit-temp-token', 'exp': int(time.time()) + 3600},
+                           TEST_SECRET, 'HS256')
+        self.auth = {'Authorization': f'Bearer {token}'}
+
+    # executed after each test
+    def tearDown(self):
+        for patch in self.patches:
+            patch.stop()
+        invalidate_user_tokens(self.user)
+        db.session.delete(self.user)
+        db.session.commit()
+
+    # tests #
+
+    def test_too_many_requests(self):
+        self.assertEqual([self.app.get(self.url).status_code for _ in range(2)], [200, 200])
+        response = self.app.get(self.url)
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response.headers['Retry-After'], '30')
+
+    def test_keyed_by_address(self):
+        for _ in range(2):
+            self.app.get(self.url)
+        other = self.app.get(self.url, environ_base={'REMOTE_ADDR': '10.0.0.2'})
+        self.assertEqual(other.status_code, 200)
+
+    def test_keyed_by_user(self):
+        for _ in range(2):
+            self.app.get(self.url)
+        self.assertEqual(self.app.get(self.url, headers=self.auth).status_code, 200)
+        # Same user from another address
+        self.assertEqual(self.app.get(self.url, headers=self.auth,
+                                      environ_base={'REMOTE_ADDR': '10.0.0.2'}).status_code, 200)
+        self.assertEqual(self.app.get(self.url, headers=self.auth,
+                                      environ_base={'REMOTE_ADDR': '10.0.0.3'}).status_code, 429)
+
+    def test_unlimited_resources(self):
+        with mock.patch('service.rate_limit.limits', {}):
+            statuses = {self.app.get(self.url).status_code for _ in range(5)}
+        self.assertEqual(statuses, {200})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+
+# Unit tests for the serializer and the response compression
+
+import gzip
+import json
+import unittest
+import flask_restful
+from flask_restful import Resource
+from service import app, api
+from service.serializer import marshal, marshal_with, dumps
+from service.models import ContributionModel
+from service.resources.wikidata.lexeme import (lexeme_response_fields,
+                                               LexemeAudioAddFields)
+from service.resources.contributions.contribution import contributionFields
+from common import prefix
+
+GLOSSES = {
+    'lexeme': {'id': 'L3625', 'lexicalCategoryId': 'Q1084',
+               'lexicalCategoryLabel': 'noun', 'image': None},
+    'glosses': [
+        {'senseId': 'L3625-S1', 'gloss': {'language': 'de', 'value': 'Mutter',
+                                          'audio': 'https://example.org/a.ogg',
+                                          'formId': 'L3625-F1'}},
+        {'senseId': None, 'gloss': {'language': 'en', 'value': None}},
+    ]
+}
+
+
+class LargeResponse(Resource):
+    def get(self):
+        return [{'id': index, 'value': 'Mutter'} for index in range(500)]
+
+
+api.add_resource(LargeResponse, '/test/large')
+
+
+class TestSerializer(unittest.TestCase):
+
+    # tests #
+
+    def test_marshal_matches_flask_restful(self):
+        contributions = [ContributionModel(id=1, wd_item='L1', username='user',
+                                           lang_code='de', edit_type='audio',
+                                           data='L1-F1-a.ogg', revision_id=None)]
+        cases = [
+            (GLOSSES, lexeme_response_fields),
+            ({'glosses': None}, lexeme_response_fields),
+            ({}, lexeme_response_fields),
+            ({'results': [{'revisionid': '12', 'lexeme_id': 'L1'}]}, LexemeAudioAddFields),
+            ({'error': 'Upload failed'}, LexemeAudioAddFields),
+            (contributions, contributionFields),
+        ]
+        for data, fields in cases:
+            self.assertEqual(json.loads(json.dumps(flask_restful.marshal(data, fields))),
+                             marshal(data, fields))
+
+    def test_marshal_with_keeps_status(self):
+        @marshal_with(LexemeAudioAddFields)
+        def handler():
+            return {'results': []}, 201
+
+        self.assertEqual(handler(), ({'results': []}, 201, {}))
+
+    def test_dumps(self):
+        self.assertEqual(json.loads(dumps({'value': 'Ìgbò', 'id': 1})),
+                         {'value': 'Ìgbò', 'id': 1})
+
+
+class TestCompression(unittest.TestCase):
+
+    # setup and teardown #
+
+    # executed prior to each test
+    def setUp(self):
+        app.config['TESTING'] = True
+        app.config['DEBUG'] = False
+        self.app = app.test_client()
+        self.url = (prefix or '') + '/test/large'
+
+    # tests #
+
+    def test_gzip_when_accepted(self):
+        response = self.app.get(self.url, headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response.headers['Vary'])
+        self.assertEqual(len(json.loads(gzip.decompress(response.data))), 500)
+
+    def test_identity_when_not_accepted(self):
+        response = self.app.get(self.url)
+        self.assertNotIn('Content-Encoding', response.headers)
+        self.assertEqual(len(response.json), 500)
+
+
+if __name__ == '__main__':
+    unittest.main()
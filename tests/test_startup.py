@@ -0,0 +1,32 @@
+#!/usr/bin/env python3
+
+# Unit tests for the worker startup
+
+import os
+import subprocess
+import sys
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class TestStartup(unittest.TestCase):
+
+    # tests #
+
+    def test_heavy_libraries_imported_lazily(self):
+        script = ('import sys, app; '
+                  'print(",".join(m for m in ["SPARQLWrapper", "wikidata", "jsonschema", '
+                  '"mwoauth", "requests_oauthlib"] if m in sys.modules))')
+        process = subprocess.run([sys.executable, '-c', script], cwd=ROOT,
+                                 capture_output=True, text=True)
+        self.assertEqual(process.returncode, 0, process.stderr)
+        self.assertEqual(process.stdout.strip(), '')
+
+    def test_environment_loaded_once(self):
+        from common import ENVIRONMENT, get_config
+        self.assertIs(get_config(), ENVIRONMENT().get_instance())
+
+
+if __name__ == '__main__':
+    unittest.main()
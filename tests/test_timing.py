@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+
+# Unit tests for the Server-Timing header and the slow request log
+
+import json
+import unittest
+from unittest import mock
+from flask_restful import Resource
+from service import app, api, db
+from service.models import UserModel
+from service.resources.utils import make_api_request
+from common import prefix
+
+WIKIDATA_API = 'https://www.wikidata.org/w/api.php'
+
+
+class TimedProbe(Resource):
+    def get(self):
+        UserModel.query.first()
+        make_api_request(WIKIDATA_API, {'action': 'wbgetentities', 'ids': 'L1'}, {})
+        return {'ok': True}
+
+
+api.add_resource(TimedProbe, '/test/timed-probe')
+
+
+class TestServerTiming(unittest.TestCase):
+
+    # setup and teardown #
+
+    # executed prior to each test
+    def setUp(self):
+        app.config['TESTING'] = True
+        app.config['DEBUG'] = False
+        self.app = app.test_client()
+        self.url = (prefix or '') + '/test/timed-probe'
+        db.create_all()
+
+        upstream_response = mock.Mock(status_code=200)
+        upstream_response.json.return_value = {'entities': {}}
+        self.upstream = mock.patch('requests.request', return_value=upstream_response)
+        self.upstream.start()
+        self.categories = mock.patch.dict('service.timing.upstream_categories',
+                                          {'www.wikidata.org': 'wikidata'})
+        self.categories.start()
+
+    # executed after each test
+    def tearDown(self):
+        self.upstream.stop()
+        self.categories.stop()
+        # The probe only reads, the tables of the configured database are kept
+        db.session.remove()
+
+    # tests #
+
+    def test_server_timing_header(self):
+        response = self.app.get(self.url)
+        metrics = {metric.split(';')[0]: metric
+                   for metric in response.headers['Server-Timing'].split(', ')}
+        self.assertIn('desc="1 calls"', metrics['wikidata'])
+        self.assertIn('db', metrics)
+        self.assertIn('total', metrics)
+
+    def test_slow_request_log(self):
+        with mock.patch('service.timing.slow_request_threshold_ms', 0):
+            with self.assertLogs('agpb.slow_requests', 'WARNING') as logs:
+                self.app.get(self.url)
+
+        entry = json.loads(logs.records[0].getMessage())
+        self.assertEqual(entry['path'], self.url)
+        self.assertEqual(entry['status'], 200)
+        self.assertEqual(entry['upstream']['wikidata']['calls'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
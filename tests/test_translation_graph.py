@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+
+import gzip
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+from service.translation_graph import (TranslationGraph, build_rows, decode_sense_id,
+                                       encode_sense_id, ingest_entities, merge_rows,
+                                       read_dump)
+
+
+def make_lexeme(lexeme_id, language, translations):
+    return {
+        'type': 'lexeme',
+        'id': lexeme_id,
+        'language': language,
+        'senses': [{
+            'id': f'{lexeme_id}-S1',
+            'claims': {'P5972': [{'mainsnak': {'datavalue': {'value': {'id': sense_id}}}}
+                                 for sense_id in translations]},
+        }],
+    }
+
+
+LEXEMES = [
+    make_lexeme('L1', 'Q188', ['L2-S1', 'L3-S1']),
+    make_lexeme('L2', 'Q1860', ['L1-S1', 'L4-S1']),
+    make_lexeme('L3', 'Q150', ['L4-S1', 'L5-S1']),
+    make_lexeme('L4', 'Q33578', []),
+    {'type': 'item', 'id': 'Q1'},
+]
+
+
+class TestTranslationGraph(unittest.TestCase):
+
+    # setup and teardown #
+
+    # executed prior to each test
+    def setUp(self):
+        self.graph = ingest_entities(TranslationGraph(), LEXEMES)
+
+    # tests #
+
+    def test_sense_keys(self):
+        self.assertEqual(decode_sense_id(encode_sense_id('L3625-S12')), 'L3625-S12')
+        self.assertIsNone(encode_sense_id('Q1'))
+        self.assertIsNone(encode_sense_id('L1-F1'))
+
+    def test_translations_in_languages(self):
+        found = self.graph.get_translations('L1-S1', ['Q1860', 'Q150', 'Q33578'])
+        self.assertEqual(found, {'translations': {'Q1860': ['L2-S1'], 'Q150': ['L3-S1'],
+                                                  'Q33578': []},
+                                 'unknown': []})
+
+    def test_unknown_translations(self):
+        # L5 is not in the dump
+        found = self.graph.get_translations('L3-S1', ['Q33578'])
+        self.assertEqual(found, {'translations': {'Q33578': ['L4-S1']}, 'unknown': ['L5-S1']})
+        # Along with the suggestions whose language is not known either
+        self.graph.set_sense('L4-S1', ['L6-S1'])
+        found = self.graph.get_translations('L3-S1', ['Q33578'], suggestions=True)
+        self.assertEqual(found['unknown'], ['L5-S1', 'L6-S1'])
+        self.graph.set_language('L5-S1', 'Q1860')
+        found = self.graph.get_translations('L3-S1', ['Q1860'])
+        self.assertEqual(found, {'translations': {'Q1860': ['L5-S1']}, 'unknown': []})
+
+    def test_suggestions(self):
+        found = self.graph.get_translations('L1-S1', ['Q33578', 'Q188'], suggestions=True)
+        # L4-S1 is reached twice, L1-S1 itself is not suggested
+        self.assertEqual(found['suggestions'], {'Q33578': ['L4-S1'], 'Q188': []})
+        # L5 is not in the dump
+        self.assertEqual(found['unknown'], ['L5-S1'])
+
+    def test_overlay_takes_precedence(self):
+        self.graph.set_sense('L1-S1', ['L4-S1'])
+        self.assertEqual(self.graph.get_translations('L1-S1', ['Q1860', 'Q33578'])['translations'],
+                         {'Q1860': [], 'Q33578': ['L4-S1']})
+
+        self.graph.add_translation('L1-S1', 'L2-S1')
+        self.graph.add_lexeme(make_lexeme('L5', 'Q1860', []))
+        self.graph.compact()
+        self.assertEqual(self.graph.overlay, {})
+        self.assertEqual(self.graph.get_translations('L3-S1', ['Q1860'])['translations'],
+                         {'Q1860': ['L5-S1']})
+        self.assertEqual(self.graph.get_translations('L1-S1', ['Q1860'])['translations'],
+                         {'Q1860': ['L2-S1']})
+
+    def test_translation_ids(self):
+        self.assertEqual(self.graph.get_translation_ids('L1-S1'), ['L2-S1', 'L3-S1'])
+        # L4-S1 has no translations, L6-S1 is not known
+        self.assertEqual(self.graph.get_translation_ids('L4-S1'), [])
+        self.assertIsNone(self.graph.get_translation_ids('L6-S1'))
+        self.graph.set_sense('L6-S1', ['L1-S1'])
+        self.assertEqual(self.graph.get_translation_ids('L6-S1'), ['L1-S1'])
+
+    def test_unchanged_senses_not_in_overlay(self):
+        self.graph.add_lexeme(LEXEMES[0])
+        self.graph.set_sense('L4-S1', [])
+        self.assertEqual(self.graph.overlay_size, 0)
+        self.graph.set_sense('L1-S1', ['L2-S1'])
+        self.assertEqual(self.graph.overlay_size, 1)
+
+    def test_writes_during_compaction_kept(self):
+        self.graph.set_sense('L1-S1', ['L4-S1'])
+
+        def merge_rows_meanwhile(rows, edges, languages):
+            self.graph.set_sense('L2-S1', ['L3-S1'])
+            return merge_rows(rows, edges, languages)
+
+        with mock.patch('service.translation_graph.merge_rows', merge_rows_meanwhile):
+            self.graph.compact()
+        self.assertEqual(list(self.graph.overlay), [encode_sense_id('L2-S1')])
+        self.assertEqual(self.graph.get_translation_ids('L1-S1'), ['L4-S1'])
+        self.assertEqual(self.graph.get_translation_ids('L2-S1'), ['L3-S1'])
+
+    def test_compaction_merges_rows(self):
+        # Before, after, between and in place of the rows of the dump
+        self.graph.set_sense('L0-S1', ['L1-S1'], 'Q188')
+        self.graph.set_sense('L2-S1', ['L3-S1'])
+        self.graph.set_language('L3-S1', 'Q1860')
+        self.graph.set_sense('L3-S2', ['L4-S1'], 'Q150')
+        self.graph.set_sense('L9-S1', [], 'Q150')
+        expected = {sense_id: (self.graph.get_translation_ids(sense_id),
+                               self.graph.get_language(sense_id))
+                    for sense_id in ['L0-S1', 'L1-S1', 'L2-S1', 'L3-S1', 'L3-S2', 'L4-S1',
+                                     'L5-S1', 'L9-S1']}
+        self.graph.compact()
+        self.assertEqual(self.graph.overlay_size, 0)
+        self.assertEqual({sense_id: (self.graph.get_translation_ids(sense_id),
+                                     self.graph.get_language(sense_id))
+                          for sense_id in expected}, expected)
+        keys, offsets, targets, languages = self.graph.rows
+        self.assertEqual(list(keys), sorted(keys))
+        self.assertEqual((len(offsets), len(languages), offsets[-1]),
+                         (len(keys) + 1, len(keys), len(targets)))
+
+    def test_merge_rows_as_build_rows(self):
+        rows = build_rows({1: [2, 3], 4: [1], 7: [4]}, {1: 1, 2: 2, 4: 1, 9: 3})
+        edges, languages = {0: (4,), 4: (), 8: (1, 9)}, {2: 3, 5: 1}
+        expected = build_rows({1: [2, 3], 4: [], 7: [4], 0: [4], 8: [1, 9]},
+                              {1: 1, 2: 3, 4: 1, 9: 3, 5: 1})
+        self.assertEqual(merge_rows(rows, edges, languages), expected)
+        self.assertEqual(merge_rows(rows, {}, {}), rows)
+
+    def test_save_and_load(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'graph.bin')
+            self.graph.save(path)
+            loaded = TranslationGraph.load(path)
+        self.assertEqual(loaded.edge_count, 6)
+        self.assertEqual(loaded.get_language('L3-S1'), 'Q150')
+        self.assertEqual(loaded.get_translations('L1-S1', ['Q33578'], suggestions=True),
+                         self.graph.get_translations('L1-S1', ['Q33578'], suggestions=True))
+
+    def test_read_dump(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'lexemes.json.gz')
+            with gzip.open(path, 'wt', encoding='utf-8') as dump:
+                dump.write('[\n' + ',\n'.join(json.dumps(entity) for entity in LEXEMES) + '\n]\n')
+            self.assertEqual([entity['id'] for entity in read_dump(path)],
+                             ['L1', 'L2', 'L3', 'L4', 'Q1'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,698 @@
+#!/usr/bin/env python3
+
+# Tests of the lexeme endpoints against the local Wikidata, Commons and
+# WDQS stand-ins of benchmarks/standin.py
+
+import base64
+import os
+import tempfile
+import time
+import unittest
+from unittest import mock
+import jwt
+from service import app, api, db
+from service import background
+from service.cache import SharedStore, cache
+from service.circuit_breaker import get_breaker, get_host
+from service.credentials import store_credentials, delete_credentials
+from service.metrics import UPSTREAM_BYTES
+from service.models import UserModel, ContributionModel, FormLeaseModel
+from service.require_token import invalidate_user_tokens
+from service.resources.utils import get_sparql_cache_key, normalize_sparql_query
+from service.resources.wikidata.utils import (get_entity_cache_key,
+                                              get_lexemes_lacking_audio_query,
+                                              get_missing_audio_template,
+                                              get_matching_sense_edges,
+                                              warm_up_languages)
+from service.translation_graph import TranslationGraph
+from service.resources.wikidata.lexeme import (LexemesGet, LexemeGlossesGet,
+                                               LexemesGlossesGet,
+                                               LexemeTranslateGet,
+                                               LexemesMissingAudioGet,
+                                               LexemeAudioAdd)
+from benchmarks.standin import start_standins
+from common import prefix
+
+TEST_SECRET = 'wikidata-test-secret-of-32-bytes!'
+
+api.add_resource(LexemesGet, '/lexemes')
+api.add_resource(LexemeGlossesGet, '/lexemes/<string:id>/descriptions')
+api.add_resource(LexemesGlossesGet, '/lexemes/descriptions')
+api.add_resource(LexemeTranslateGet, '/lexemes/<string:id>/translations')
+api.add_resource(LexemesMissingAudioGet, '/lexemes/missing/audio')
+api.add_resource(LexemeAudioAdd, '/lexeme/audio/add')
+
+
+def patch_upstreams(standins):
+    """
+    Points the API at the stand-ins, returns the started patches.
+    """
+    patches = [
+        mock.patch('service.resources.wikidata.utils.base_url', standins['wikidata'].url),
+        mock.patch('service.resources.wikidata.utils.commons_url', standins['commons'].url),
+        mock.patch('service.resources.commons.utils.commons_url', standins['commons'].url),
+        mock.patch('service.resources.utils.sparql_endpoint_url', standins['wdqs'].url),
+        mock.patch('service.resources.wikidata.utils.sparql_endpoint_url', standins['wdqs'].url),
+    ]
+    for patch in patches:
+        patch.start()
+    return patches
+
+
+def setUpModule():
+    # The tests clear and fill a cache file of their own, not the one of
+    # CACHE_PATH that the workers of this host share
+    global cache_directory, cache_patches
+    cache_directory = tempfile.TemporaryDirectory()
+    cache_patches = [
+        mock.patch.object(cache, 'shared',
+                          SharedStore(os.path.join(cache_directory.name, 'cache.sqlite'))),
+        mock.patch.object(cache, 'last_invalidation', None),
+    ]
+    for patch in cache_patches:
+        patch.start()
+
+
+def tearDownModule():
+    for patch in cache_patches:
+        patch.stop()
+    cache.local.clear()
+    cache_directory.cleanup()
+
+
+def wait_for_background_tasks():
+    deadline = time.time() + 5
+    while background.pending and time.time() < deadline:
+        time.sleep(0.01)
+
+
+class TestLexemes(unittest.TestCase):
+
+    # setup and teardown #
+
+    @classmethod
+    def setUpClass(cls):
+        cls.standins = start_standins({})
+
+    @classmethod
+    def tearDownClass(cls):
+        for standin in cls.standins.values():
+            standin.stop()
+
+    # executed prior to each test
+    def setUp(self):
+        app.config['TESTING'] = True
+        app.config['DEBUG'] = False
+        self.app = app.test_client()
+        cache.clear()
+        self.patches = patch_upstreams(self.standins)
+        for standin in self.standins.values():
+            standin.reset()
+        db.create_all()
+        FormLeaseModel.query.delete()
+        db.session.commit()
+
+    # executed after each test
+    def tearDown(self):
+        wait_for_background_tasks()
+        for patch in self.patches:
+            patch.stop()
+
+    def calls(self, service):
+        return self.standins[service].reset()
+
+    # tests #
+
+    def test_search(self):
+        response = self.app.post((prefix or '') + '/lexemes',
+                                 json={'search': 'Mutter', 'src_lang': 'de',
+                                       'ismatch': 1, 'with_sense': 1})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json[0], {'id': 'L3625', 'label': 'Mutter', 'language': 'de',
+                                            'description': 'de, noun', 'sense_id': 'L3625-S1'})
+        self.assertEqual(self.calls('wikidata'), {'wbsearchentities': 1})
+
+    def test_glosses(self):
+        response = self.app.post((prefix or '') + '/lexemes/L3625/descriptions',
+                                 json={'id': 'L3625', 'src_lang': 'de',
+                                       'lang_1': 'en', 'lang_2': 'ig'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json['lexeme']['lexicalCategoryLabel'], 'label of Q1084')
+
+        glosses = {gloss['gloss']['language']: gloss['gloss'] for gloss in response.json['glosses']}
+        self.assertEqual(glosses['de']['value'], 'de-word-3625')
+        self.assertEqual(glosses['de']['formId'], 'L3625-F1')
+        self.assertTrue(glosses['en']['audio'].endswith('L3625-en-en-word-3625.ogg'))
+        self.assertIsNone(glosses['ig']['audio'])
+
+        self.assertEqual(self.calls('wikidata'), {'wbgetentities': 1})
+        self.assertEqual(self.calls('wdqs'), {'label': 1})
+        self.assertEqual(self.calls('commons'), {'query': 2})
+
+    def test_glosses_fetch_projected_lexeme(self):
+        received = sum(UPSTREAM_BYTES.values.values())
+        self.app.post((prefix or '') + '/lexemes/L3625/descriptions',
+                      json={'id': 'L3625', 'src_lang': 'de', 'lang_1': 'en', 'lang_2': 'ig'})
+
+        entity = cache.get(get_entity_cache_key('L3625', ['de', 'en', 'ig']))
+        self.assertEqual(set(entity['lemmas']), {'de', 'en', 'ig'})
+        self.assertEqual(set(entity['senses'][0]['glosses']), {'de', 'en', 'ig'})
+        self.assertEqual(entity['claims'], {})
+        self.assertEqual(set(entity['forms'][0]['claims']), {'P443'})
+        self.assertEqual(set(entity['senses'][0]['claims']), {'P18', 'P5972'})
+        self.assertGreater(sum(UPSTREAM_BYTES.values.values()), received)
+
+    def test_glosses_from_cache(self):
+        request = {'id': 'L3625', 'src_lang': 'de', 'lang_1': 'en', 'lang_2': 'ig'}
+        first = self.app.post((prefix or '') + '/lexemes/L3625/descriptions', json=request)
+        for service in self.standins:
+            self.calls(service)
+
+        second = self.app.post((prefix or '') + '/lexemes/L3625/descriptions', json=request)
+        self.assertEqual(second.json, first.json)
+        for service in self.standins:
+            self.assertEqual(self.calls(service), {})
+
+    def test_bulk_glosses(self):
+        ids = [f'L{number}' for number in range(3625, 3645)]
+        response = self.app.post((prefix or '') + '/lexemes/descriptions',
+                                 json={'ids': ids, 'src_lang': 'de',
+                                       'lang_1': 'en', 'lang_2': 'ig'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(response.json), ids)
+
+        single = self.app.post((prefix or '') + '/lexemes/L3630/descriptions',
+                               json={'id': 'L3630', 'src_lang': 'de',
+                                     'lang_1': 'en', 'lang_2': 'ig'})
+        self.assertEqual(response.json['L3630'], single.json)
+
+        # One call per upstream for the 20 lexemes, their category and 40 audio files
+        self.assertEqual(self.calls('wikidata'), {'wbgetentities': 1})
+        self.assertEqual(self.calls('wdqs'), {'label': 1})
+        self.assertEqual(self.calls('commons'), {'query': 1})
+
+    def test_bulk_glosses_unknown_lemma(self):
+        response = self.app.post((prefix or '') + '/lexemes/descriptions',
+                                 json={'ids': ['L3625', 'L3626'], 'src_lang': 'xx',
+                                       'lang_1': 'en', 'lang_2': 'ig'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json['L3625']['status_code'], 404)
+        self.assertEqual(self.calls('commons'), {})
+
+    def test_bulk_glosses_invalid_ids(self):
+        response = self.app.post((prefix or '') + '/lexemes/descriptions',
+                                 json={'ids': ['L3625', 'Q1'], 'src_lang': 'de',
+                                       'lang_1': 'en', 'lang_2': 'ig'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.calls('wikidata'), {})
+
+    def test_translations(self):
+        response = self.app.post((prefix or '') + '/lexemes/L3625/translations',
+                                 json={'id': 'L3625', 'src_lang': 'de',
+                                       'lang_1': 'en', 'lang_2': 'fr'})
+        self.assertEqual(response.status_code, 200)
+        translations = {entry['trans_language']: entry for entry in response.json}
+        self.assertEqual(translations['en']['value'], 'en-word-103625')
+        self.assertEqual(translations['fr']['trans_sense_id'], 'L103625-S1')
+        self.assertEqual(self.calls('wikidata'), {'wbgetentities': 2})
+
+    def test_translations_in_many_languages(self):
+        response = self.app.post((prefix or '') + '/lexemes/L3625/translations',
+                                 json={'id': 'L3625', 'src_lang': 'de',
+                                       'languages': ['en', 'fr', 'ig', 'yo', 'xx']})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([entry['trans_language'] for entry in response.json],
+                         ['de', 'en', 'fr', 'ig', 'yo', 'xx'])
+        self.assertEqual(response.json[3]['value'], 'ig-word-103625')
+        self.assertIsNone(response.json[5]['value'])
+        # The base lexeme, then the lemmas of both translations in one call
+        self.assertEqual(self.calls('wikidata'), {'wbgetentities': 2})
+
+        # Only the lemmas of the new language are fetched
+        response = self.app.post((prefix or '') + '/lexemes/L3625/translations',
+                                 json={'id': 'L3625', 'src_lang': 'de',
+                                       'languages': ['en', 'sw']})
+        self.assertEqual(response.json[2]['value'], 'sw-word-103625')
+        self.assertEqual(self.calls('wikidata'), {'wbgetentities': 1})
+
+        self.app.post((prefix or '') + '/lexemes/L3625/translations',
+                      json={'id': 'L3625', 'src_lang': 'de', 'languages': ['sw', 'fr']})
+        self.assertEqual(self.calls('wikidata'), {})
+
+    def test_translation_suggestions(self):
+        with mock.patch('service.resources.wikidata.utils.translation_graph',
+                        TranslationGraph()):
+            response = self.app.post((prefix or '') + '/lexemes/L3625/translations',
+                                     json={'id': 'L3625', 'src_lang': 'de', 'suggestions': 1,
+                                           'languages': ['en', 'ig', 'yo']})
+        self.assertEqual(response.status_code, 200)
+        suggested = [(entry['trans_language'], entry['trans_sense_id'])
+                     for entry in response.json if entry.get('suggested')]
+        # L303625 and L403625 are translations of the translations of L3625
+        self.assertEqual(suggested, [('ig', 'L303625-S1'), ('yo', 'L403625-S1')])
+        # The base lexeme, the translations, then the suggestions of unknown language
+        self.assertEqual(self.calls('wikidata'), {'wbgetentities': 3})
+
+    def test_translations_from_graph(self):
+        edges = [{'id': 'L3625-S1', 'glosses': ['de'], 'translations': ['L103625-S1']}]
+        graph = TranslationGraph()
+        with mock.patch('service.resources.wikidata.utils.translation_graph', graph):
+            self.assertEqual(get_matching_sense_edges(edges, 'L3625', 'de'),
+                             ('L3625-S1', ['L103625-S1']))
+            graph.set_sense('L3625-S1', ['L103625-S1', 'L203625-S1'])
+            self.assertEqual(get_matching_sense_edges(edges, 'L3625', 'de'),
+                             ('L3625-S1', ['L103625-S1', 'L203625-S1']))
+
+    def test_translation_graph_compacted(self):
+        graph = TranslationGraph()
+        request = {'id': 'L3625', 'src_lang': 'de', 'languages': ['en', 'fr']}
+        with mock.patch('service.resources.wikidata.utils.translation_graph', graph), \
+                mock.patch('service.resources.wikidata.utils.translation_graph_max_overlay', 2):
+            first = self.app.post((prefix or '') + '/lexemes/L3625/translations', json=request)
+            wait_for_background_tasks()
+            self.assertEqual(graph.overlay_size, 0)
+            self.assertEqual(graph.sense_count, 3)
+            second = self.app.post((prefix or '') + '/lexemes/L3625/translations',
+                                   json=request)
+        self.assertEqual(second.json, first.json)
+        self.assertEqual(graph.overlay_size, 0)
+
+    def test_translations_of_unknown_lexeme(self):
+        response = self.app.post((prefix or '') + '/lexemes/Q1/translations',
+                                 json={'id': 'Q1', 'src_lang': 'de', 'languages': ['en']})
+        self.assertEqual(response.status_code, 404)
+
+    def test_missing_audio_page(self):
+        response = self.app.post((prefix or '') + '/lexemes/missing/audio',
+                                 json={'lang_wdqid': 'Q188', 'lang_code': 'de',
+                                       'page_size': 5, 'page': 2})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([entry['lexeme_id'] for entry in response.json],
+                         ['L6', 'L7', 'L8', 'L9', 'L10'])
+        self.assertEqual(response.json[0]['formId'], 'L6-F1')
+
+    def test_missing_audio_page_from_cache(self):
+        request = {'lang_wdqid': 'Q188', 'lang_code': 'de', 'page_size': 5, 'page': 2}
+        first = self.app.post((prefix or '') + '/lexemes/missing/audio', json=request)
+        second = self.app.post((prefix or '') + '/lexemes/missing/audio', json=request)
+        self.assertEqual(second.json, first.json)
+        wait_for_background_tasks()
+        # The page and the prefetched next page
+        self.assertEqual(self.calls('wdqs'), {'missing_audio': 2})
+
+        # Cached as columns under the normalized query
+        query = get_lexemes_lacking_audio_query('Q188', 'de', 5, 2)
+        template = get_missing_audio_template('Q188')
+        self.assertEqual(get_sparql_cache_key(template, query),
+                         get_sparql_cache_key(template, '  '.join(query.split())))
+        columns = cache.get(get_sparql_cache_key(template, query))
+        self.assertEqual(columns['prefixes'][columns['vars'].index('l')],
+                         'http://www.wikidata.org/entity/')
+        self.assertEqual(columns['columns'][columns['vars'].index('l')][0], 'L6')
+
+    def test_next_missing_audio_page_is_prefetched(self):
+        request = {'lang_wdqid': 'Q188', 'lang_code': 'de', 'page_size': 5, 'page': 1}
+        self.app.post((prefix or '') + '/lexemes/missing/audio', json=request)
+        wait_for_background_tasks()
+        self.assertEqual(self.calls('wdqs'), {'missing_audio': 2})
+
+        response = self.app.post((prefix or '') + '/lexemes/missing/audio',
+                                 json=dict(request, page=2))
+        self.assertEqual(response.json[0]['lexeme_id'], 'L6')
+        wait_for_background_tasks()
+        # Served from the prefetch, page 3 is prefetched in turn
+        self.assertEqual(self.calls('wdqs'), {'missing_audio': 1})
+
+    @mock.patch('service.background.prefetch_max_per_user', 0)
+    def test_prefetch_is_bounded(self):
+        self.app.post((prefix or '') + '/lexemes/missing/audio',
+                      json={'lang_wdqid': 'Q188', 'lang_code': 'de', 'page_size': 5, 'page': 1})
+        wait_for_background_tasks()
+        self.assertEqual(self.calls('wdqs'), {'missing_audio': 1})
+        self.assertEqual(background.prefetching, {})
+
+    def missing_audio_forms(self, address, page=1):
+        response = self.app.post((prefix or '') + '/lexemes/missing/audio',
+                                 json={'lang_wdqid': 'Q188', 'lang_code': 'de',
+                                       'page_size': 5, 'page': page},
+                                 environ_base={'REMOTE_ADDR': address})
+        return [entry['formId'] for entry in response.json]
+
+    def test_concurrent_users_get_different_forms(self):
+        first = self.missing_audio_forms('10.0.0.1')
+        self.assertEqual(first, ['L1-F1', 'L2-F1', 'L3-F1', 'L4-F1', 'L5-F1'])
+        self.assertEqual(self.missing_audio_forms('10.0.0.2'),
+                         ['L6-F1', 'L7-F1', 'L8-F1', 'L9-F1', 'L10-F1'])
+        # The leases are renewed for their holder
+        self.assertEqual(self.missing_audio_forms('10.0.0.1'), first)
+        self.assertEqual(FormLeaseModel.query.count(), 10)
+
+    def test_missing_audio_page_defaults(self):
+        response = self.app.post((prefix or '') + '/lexemes/missing/audio',
+                                 json={'lang_wdqid': 'Q188', 'lang_code': 'de'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json), 15)
+        self.assertEqual(response.json[0]['formId'], 'L1-F1')
+
+    def test_invalid_missing_audio_page(self):
+        for page in [{'page': 0}, {'page_size': 0}, {'page': -1}, {'page': None}]:
+            response = self.app.post((prefix or '') + '/lexemes/missing/audio',
+                                     json=dict({'lang_wdqid': 'Q188', 'lang_code': 'de'},
+                                               **page))
+            self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.calls('wdqs'), {})
+
+    def test_next_page_skips_the_pages_read(self):
+        self.missing_audio_forms('10.0.0.1')
+        response = self.app.post((prefix or '') + '/lexemes/missing/audio',
+                                 json={'lang_wdqid': 'Q188', 'lang_code': 'de',
+                                       'page_size': 5, 'page': 1},
+                                 environ_base={'REMOTE_ADDR': '10.0.0.2'})
+        # Page 1 is leased to the first user, the forms come from page 2
+        self.assertEqual(response.headers['X-Next-Page'], '3')
+        self.assertEqual(self.missing_audio_forms('10.0.0.2', page=3),
+                         ['L11-F1', 'L12-F1', 'L13-F1', 'L14-F1', 'L15-F1'])
+
+    def test_expired_leases(self):
+        with mock.patch('service.resources.wikidata.utils.form_lease_ttl', 0):
+            first = self.missing_audio_forms('10.0.0.1')
+        self.assertEqual(self.missing_audio_forms('10.0.0.2'), first)
+
+    def test_warm_up_languages(self):
+        warm_up_languages(['de', 'en', 'xx'], 'user:1')
+        wait_for_background_tasks()
+        # The category labels and first page of each language
+        self.assertEqual(self.calls('wdqs'), {'label': 2, 'missing_audio': 2})
+        self.assertEqual(cache.get('label/Q24905/de'), 'label of Q24905')
+
+        warm_up_languages(['de', 'en'], 'user:2')
+        self.assertEqual(background.pending, set())
+
+    def test_sparql_query_normalization(self):
+        self.assertEqual(normalize_sparql_query('SELECT ?l\n  WHERE {\n ?l ?p "a  b" }\n'),
+                         'SELECT ?l WHERE { ?l ?p "a  b" }')
+
+    def test_search_from_cache(self):
+        request = {'search': 'Mutter', 'src_lang': 'de', 'ismatch': 1, 'with_sense': 1}
+        first = self.app.post((prefix or '') + '/lexemes', json=request)
+        second = self.app.post((prefix or '') + '/lexemes', json=request)
+        self.assertEqual(second.json, first.json)
+        self.assertEqual(self.calls('wikidata'), {'wbsearchentities': 1})
+
+
+class TestUpstreamFanOut(unittest.TestCase):
+
+    # setup and teardown #
+
+    @classmethod
+    def setUpClass(cls):
+        cls.standins = start_standins({'commons': 0.3, 'wdqs': 0.3})
+
+    @classmethod
+    def tearDownClass(cls):
+        for standin in cls.standins.values():
+            standin.stop()
+
+    # executed prior to each test
+    def setUp(self):
+        app.config['TESTING'] = True
+        app.config['DEBUG'] = False
+        self.app = app.test_client()
+        cache.clear()
+        self.patches = patch_upstreams(self.standins)
+
+    # executed after each test
+    def tearDown(self):
+        for patch in self.patches:
+            patch.stop()
+
+    # tests #
+
+    def test_glosses_fetch_label_and_audio_concurrently(self):
+        start = time.perf_counter()
+        response = self.app.post((prefix or '') + '/lexemes/L3625/descriptions',
+                                 json={'id': 'L3625', 'src_lang': 'de',
+                                       'lang_1': 'en', 'lang_2': 'ig'})
+        elapsed = time.perf_counter() - start
+
+        self.assertEqual(response.status_code, 200)
+        # One label query and two audio URLs of 0.3s each, one after the other would be 0.9s
+        self.assertLess(elapsed, 0.75)
+
+
+class TestUpstreamOutage(unittest.TestCase):
+
+    # setup and teardown #
+
+    @classmethod
+    def setUpClass(cls):
+        cls.standins = start_standins({})
+
+    @classmethod
+    def tearDownClass(cls):
+        for standin in cls.standins.values():
+            standin.stop()
+
+    # executed prior to each test
+    def setUp(self):
+        app.config['TESTING'] = True
+        app.config['DEBUG'] = False
+        self.app = app.test_client()
+        cache.clear()
+        self.patches = patch_upstreams(self.standins) + [
+            mock.patch.dict('service.circuit_breaker.breakers', clear=True),
+            mock.patch('service.circuit_breaker.circuit_failure_threshold', 1),
+            mock.patch.object(cache, 'stale_ttl', 10 ** 6),
+        ]
+        for patch in self.patches[-3:]:
+            patch.start()
+
+    # executed after each test
+    def tearDown(self):
+        for patch in self.patches:
+            patch.stop()
+        for standin in self.standins.values():
+            standin.unavailable = False
+            standin.reset()
+
+    def glosses(self, lexeme_id='L3625'):
+        return self.app.post((prefix or '') + f'/lexemes/{lexeme_id}/descriptions',
+                             json={'id': lexeme_id, 'src_lang': 'de',
+                                   'lang_1': 'en', 'lang_2': 'ig'})
+
+    def expire_cache(self):
+        later = time.time() + 10 ** 5
+        return mock.patch('service.cache.time.time', lambda: later)
+
+    # tests #
+
+    def test_stale_glosses_while_upstreams_are_down(self):
+        fresh = self.glosses()
+        for standin in self.standins.values():
+            standin.unavailable = True
+
+        with self.expire_cache():
+            response = self.glosses()
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.json, fresh.json)
+            self.assertEqual(response.headers['Warning'], '110 - "Response is Stale"')
+
+            wait_for_background_tasks()
+            self.standins['wikidata'].reset()
+            # The breakers are open: stale again, without calling Wikidata
+            self.assertEqual(self.glosses().headers['Warning'], '110 - "Response is Stale"')
+            self.assertEqual(self.standins['wikidata'].reset(), {})
+
+    def test_uncached_lexeme_fails_fast(self):
+        self.standins['wikidata'].unavailable = True
+        self.assertEqual(self.glosses('L1').status_code, 503)
+        self.assertEqual(self.glosses('L2').status_code, 503)
+        self.assertEqual(self.standins['wikidata'].reset(), {'unavailable': 1})
+
+    def test_missing_audio_retry_after(self):
+        get_breaker(get_host(self.standins['wdqs'].url)).record_failure()
+        response = self.app.post((prefix or '') + '/lexemes/missing/audio',
+                                 json={'lang_wdqid': 'Q188', 'lang_code': 'de',
+                                       'page_size': 5, 'page': 1})
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.headers['Retry-After'], '30')
+        self.assertEqual(self.standins['wdqs'].reset(), {})
+
+    @mock.patch('service.circuit_breaker.circuit_reset_timeout', 0)
+    def test_background_refresh_after_recovery(self):
+        self.glosses()
+        self.standins['wikidata'].unavailable = True
+        with self.expire_cache():
+            self.glosses()
+            wait_for_background_tasks()
+            self.standins['wikidata'].unavailable = False
+            self.standins['wikidata'].reset()
+
+            # Served stale while the refresh probes Wikidata
+            self.assertIn('Warning', self.glosses().headers)
+            wait_for_background_tasks()
+            self.assertEqual(self.standins['wikidata'].reset(), {'wbgetentities': 1})
+            entity_key = get_entity_cache_key('L3625', ['de', 'en', 'ig'])
+            self.assertEqual(cache.get(entity_key)['id'], 'L3625')
+
+
+class TestLexemeAudioAdd(unittest.TestCase):
+
+    # setup and teardown #
+
+    @classmethod
+    def setUpClass(cls):
+        cls.standins = start_standins({})
+
+    @classmethod
+    def tearDownClass(cls):
+        for standin in cls.standins.values():
+            standin.stop()
+
+    # executed prior to each test
+    def setUp(self):
+        app.config['TESTING'] = True
+        app.config['DEBUG'] = False
+        self.app = app.test_client()
+        cache.clear()
+        credentials = [
+            mock.patch('service.require_token.consumer_secret', TEST_SECRET),
+            mock.patch('service.credentials.consumer_key', 'consumer'),
+            mock.patch('service.credentials.consumer_secret', 'secret'),
+            mock.patch('service.credentials.credentials_key',
+                       base64.urlsafe_b64encode(b'k' * 32).decode()),
+        ]
+        for patch in credentials:
+            patch.start()
+        self.patches = patch_upstreams(self.standins) + credentials
+
+        db.create_all()
+        FormLeaseModel.query.delete()
+        self.user = UserModel(username='audio-test-user', pref_langs='de,en',
+                              temp_token='audio-temp-token')
+        db.session.add(self.user)
+        db.session.flush()
+        store_credentials(self.user, 'audio-temp-token', 'key', 'secret')
+        db.session.commit()
+        self.token = jwt.encode({'token': 'audio-temp-token', 'exp': int(time.time()) + 3600},
+                                TEST_SECRET, 'HS256')
+
+    # executed after each test
+    def tearDown(self):
+        for patch in self.patches:
+            patch.stop()
+        invalidate_user_tokens(self.user)
+        delete_credentials(self.user, 'audio-temp-token')
+        ContributionModel.query.filter_by(username='audio-test-user').delete()
+        db.session.delete(self.user)
+        db.session.commit()
+
+    # tests #
+
+    def test_add_audio(self):
+        response = self.app.post((prefix or '') + '/lexeme/audio/add',
+                                 headers={'Authorization': f'Bearer {self.token}'},
+                                 json=[{'lang_wdqid': 'Q188', 'lang_label': 'German',
+                                        'formid': 'L3625-F1',
+                                        'filename': 'L3625-de-Mutter.ogg',
+                                        'file_content': base64.b64encode(b'OggS').decode()}])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json['results'][0]['lexeme_id'], 'L3625')
+
+        contribution = ContributionModel.query.filter_by(username='audio-test-user').one()
+        self.assertEqual(contribution.form_id, 'L3625-F1')
+        self.assertEqual(contribution.file_name, 'L3625-de-Mutter.ogg')
+        self.assertEqual(self.standins['commons'].reset(), {'query': 1, 'upload': 1})
+        self.assertEqual(self.standins['wikidata'].reset(),
+                         {'query': 1, 'wbcreateclaim': 1, 'wbsetqualifier': 1})
+
+    def test_add_audio_without_credentials(self):
+        delete_credentials(self.user, 'audio-temp-token')
+        db.session.commit()
+        self.standins['commons'].reset()
+        response = self.app.post((prefix or '') + '/lexeme/audio/add',
+                                 headers={'Authorization': f'Bearer {self.token}'},
+                                 json=[{'lang_wdqid': 'Q188', 'lang_label': 'German',
+                                        'formid': 'L3625-F1',
+                                        'filename': 'L3625-de-Mutter.ogg',
+                                        'file_content': base64.b64encode(b'OggS').decode()}])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.standins['commons'].reset(), {})
+
+    def test_add_audio_with_legacy_token(self):
+        # Tokens issued before the credentials were stored carry them
+        delete_credentials(self.user, 'audio-temp-token')
+        db.session.commit()
+        token = jwt.encode({'token': 'audio-temp-token',
+                            'access_token': {'key': 'key', 'secret': 'secret'},
+                            'exp': int(time.time()) + 3600}, TEST_SECRET, 'HS256')
+        response = self.app.post((prefix or '') + '/lexeme/audio/add',
+                                 headers={'Authorization': f'Bearer {token}'},
+                                 json=[{'lang_wdqid': 'Q188', 'lang_label': 'German',
+                                        'formid': 'L3625-F1',
+                                        'filename': 'L3625-de-Mutter.ogg',
+                                        'file_content': base64.b64encode(b'OggS').decode()}])
+        self.assertEqual(response.status_code, 200)
+
+    def test_add_audio_invalidates_lexeme(self):
+        glosses = {'id': 'L3625', 'src_lang': 'de', 'lang_1': 'en', 'lang_2': 'ig'}
+        self.app.post((prefix or '') + '/lexemes/L3625/descriptions', json=glosses)
+        self.app.post((prefix or '') + '/lexeme/audio/add',
+                      headers={'Authorization': f'Bearer {self.token}'},
+                      json=[{'lang_wdqid': 'Q188', 'lang_label': 'German',
+                             'formid': 'L3625-F1', 'filename': 'L3625-de-Mutter.ogg',
+                             'file_content': base64.b64encode(b'OggS').decode()}])
+        self.standins['wikidata'].reset()
+
+        self.app.post((prefix or '') + '/lexemes/L3625/descriptions', json=glosses)
+        self.assertEqual(self.standins['wikidata'].reset(), {'wbgetentities': 1})
+
+    def missing_audio_forms(self, address):
+        response = self.app.post((prefix or '') + '/lexemes/missing/audio',
+                                 json={'lang_wdqid': 'Q188', 'lang_code': 'de',
+                                       'page_size': 5, 'page': 1},
+                                 environ_base={'REMOTE_ADDR': address})
+        return [entry['formId'] for entry in response.json]
+
+    def add_audio(self, form_id):
+        self.app.post((prefix or '') + '/lexeme/audio/add',
+                      headers={'Authorization': f'Bearer {self.token}'},
+                      json=[{'lang_wdqid': 'Q188', 'lang_label': 'German',
+                             'formid': form_id, 'filename': f'{form_id}-de.ogg',
+                             'file_content': base64.b64encode(b'OggS').decode()}])
+
+    def test_add_audio_keeps_lease(self):
+        self.assertIn('L1-F1', self.missing_audio_forms('10.0.0.1'))
+        self.add_audio('L1-F1')
+        self.assertEqual(db.session.get(FormLeaseModel, 'L1-F1').holder, 'ip:10.0.0.1')
+        # WDQS still lists the form, it is not handed out again
+        self.assertNotIn('L1-F1', self.missing_audio_forms('10.0.0.2'))
+
+    def test_recorded_forms_skipped(self):
+        with mock.patch('service.resources.wikidata.utils.form_lease_ttl', 0):
+            self.assertEqual(self.missing_audio_forms('10.0.0.1')[0], 'L1-F1')
+            self.add_audio('L1-F1')
+        # The lease has expired, the contribution keeps the form out
+        self.assertEqual(self.missing_audio_forms('10.0.0.2'),
+                         ['L2-F1', 'L3-F1', 'L4-F1', 'L5-F1', 'L6-F1'])
+
+    def test_add_audio_invalidates_missing_audio_pages(self):
+        request = {'lang_wdqid': 'Q188', 'lang_code': 'de', 'page_size': 5, 'page': 2}
+        self.app.post((prefix or '') + '/lexemes/missing/audio', json=request)
+        self.app.post((prefix or '') + '/lexeme/audio/add',
+                      headers={'Authorization': f'Bearer {self.token}'},
+                      json=[{'lang_wdqid': 'Q188', 'lang_label': 'German',
+                             'formid': 'L6-F1', 'filename': 'L6-de-Mutter.ogg',
+                             'file_content': base64.b64encode(b'OggS').decode()}])
+        wait_for_background_tasks()
+        self.standins['wdqs'].reset()
+
+        self.app.post((prefix or '') + '/lexemes/missing/audio', json=request)
+        wait_for_background_tasks()
+        # The page is fetched again and completed from page 3, as the form
+        # recorded is skipped, then page 4 is prefetched
+        self.assertEqual(self.standins['wdqs'].reset(), {'missing_audio': 3})
+
+
+if __name__ == '__main__':
+    unittest.main()